@@ -0,0 +1,133 @@
+"""
+Dimensione, caricamento e scarto degli artefatti compatti
+
+Ogni artefatto pickle addestrato presente in machine_learning/weights/ viene
+riscritto in una directory temporanea nei formati pickle, mmap e compact (con le
+varianti di quantizzazione e pruning richieste). Per ogni variante:
+    - dimensione su disco e nodi degli alberi
+    - tempo mediano di caricamento (lettura dell'artefatto e ricostruzione del modello)
+    - scarto massimo e medio delle predizioni rispetto a sklearn su tutto il dataset
+      (probabilità per i classificatori) e, per i classificatori, etichette cambiate
+
+Le tolleranze di pruning sono frazioni dell'intervallo dei valori delle foglie
+di ogni modello. Le differenze delle metriche di validazione sono riportate
+dagli endpoint di training (campo artifact.compaction.metric_deltas).
+
+Uso (dalla root del progetto, dopo aver caricato un dataset e addestrato i modelli):
+    python benchmarks/artifact_compaction.py --leaf-bits 16 8 --prune 0.005 0.02
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import create_app
+from database import BikeRecord
+from database.data_loader import BikeDataLoader
+from machine_learning.compiled_models import CompiledTrees, build_compiled
+from machine_learning.model_artifacts import dump_artifact, load_artifact, restore_model
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'machine_learning', 'weights')
+
+
+def variants(compiled, leaf_bits, prune):
+    """(nome, formato, leaf_bits, prune_tolerance) da confrontare per un modello"""
+    yield 'pickle', 'pickle', None, 0.0
+    yield 'mmap', 'mmap', None, 0.0
+    if not isinstance(compiled, CompiledTrees):
+        return
+    yield 'compact', 'compact', None, 0.0
+    for bits in leaf_bits:
+        yield f'compact {bits} bit', 'compact', bits, 0.0
+
+    leaves = compiled.left == np.arange(compiled.n_nodes)
+    leaf_values = compiled.values[leaves]
+    value_range = float(leaf_values.max() - leaf_values.min())
+    for fraction in prune:
+        for bits in (None,) + tuple(leaf_bits[-1:]):
+            name = f'compact prune {fraction:g}' + (f' {bits} bit' if bits else '')
+            yield name, 'compact', bits, fraction * value_range
+
+
+def load_ms(path, repeat):
+    """Tempo mediano di caricamento di un artefatto in millisecondi"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        restore_model(load_artifact(path))
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def outputs(model, X):
+    """Uscite confrontabili: probabilità per i classificatori, predizioni per i regressori"""
+    if hasattr(model, 'predict_proba'):
+        return np.asarray(model.predict_proba(X), dtype=np.float64)
+    return np.asarray(model.predict(X), dtype=np.float64)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--leaf-bits', type=int, nargs='*', default=[16, 8], help='Quantizzazioni da provare (default 16 8)')
+    parser.add_argument('--prune', type=float, nargs='*', default=[0.005, 0.02],
+                        help="Tolleranze di pruning come frazione dell'intervallo delle foglie (default 0.005 0.02)")
+    parser.add_argument('--repeat', type=int, default=5, help='Caricamenti per misura (default 5)')
+    args = parser.parse_args()
+
+    # Modelli addestrati su DataFrame: sklearn avverte per l'input senza nomi delle features
+    warnings.simplefilter('ignore', UserWarning)
+
+    app = create_app()
+    with app.app_context():
+        if not BikeRecord.query.first():
+            print("❌ Database vuoto: caricare prima un dataset con /api/data/load")
+            return 1
+        data = BikeDataLoader.download_data_in_dataframe().dropna()
+
+    header = f"{'modello':<52}{'variante':<26}{'disco MB':>10}{'nodi':>10}{'load ms':>10}{'max |Δ|':>12}{'media |Δ|':>12}{'etichette':>11}"
+    print(header)
+    print('-' * len(header))
+
+    with tempfile.TemporaryDirectory() as target:
+        for path in sorted(glob.glob(os.path.join(WEIGHTS_DIR, '*.joblib'))):
+            model_data = load_artifact(path)
+            name = os.path.basename(path)
+            if model_data.get('artifact_format', 'pickle') != 'pickle':
+                print(f"{name:<52}già in formato {model_data['artifact_format']}: saltato (serve il modello sklearn)")
+                continue
+
+            model = model_data['model']
+            compiled = build_compiled(model)
+            if compiled is None:
+                print(f"{name:<52}modello {type(model).__name__} non supportato")
+                continue
+            features = model_data.get('weather_features') or model_data['feature_names']
+            X = data[features].to_numpy(dtype=np.float64)
+            expected = outputs(model, X)
+
+            for variant, artifact_format, leaf_bits, prune_tolerance in variants(compiled, args.leaf_bits, args.prune):
+                variant_path = os.path.join(target, f'{variant.replace(" ", "_")}_{name}')
+                dump_artifact(model_data, variant_path, artifact_format, leaf_bits, prune_tolerance)
+                restored, _ = restore_model(load_artifact(variant_path))
+
+                deviation = np.abs(outputs(restored, X) - expected)
+                nodes = getattr(restored, 'n_nodes', getattr(compiled, 'n_nodes', 0))
+                labels = ''
+                if hasattr(restored, 'predict_proba'):
+                    labels = str(int(np.sum(restored.predict(X) != model.predict(X))))
+                print(
+                    f"{name:<52}{variant:<26}{os.path.getsize(variant_path) / 1024 / 1024:>10.2f}{nodes:>10}"
+                    f"{load_ms(variant_path, args.repeat):>10.2f}{deviation.max():>12.3g}{deviation.mean():>12.3g}{labels:>11}"
+                )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Benchmark del motore di inferenza compilato contro sklearn
+
+Per ogni modello addestrato presente in machine_learning/weights/:
+    - verifica che le uscite compilate siano identiche bit per bit a sklearn
+      su tutto il dataset caricato (predict_proba per i classificatori, predict per i regressori)
+    - latenza mediana di una predizione singola (riga presa a caso dal dataset)
+    - tempo per batch di 64, 1000 righe e dell'intero dataset
+
+Uso (dalla root del progetto, dopo aver caricato un dataset e addestrato i modelli):
+    python benchmarks/compiled_inference.py --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import create_app
+from database import BikeRecord
+from database.data_loader import BikeDataLoader
+from machine_learning.compiled_models import compile_model, outputs_match
+from machine_learning.peak_demand_predictor import PeakDemandPredictor
+from machine_learning.rental_count_predictor import RentalCountPredictor
+from machine_learning.weather_impact_predictor import WeatherImpactPredictor
+
+BATCH_SIZES = (64, 1000)
+
+
+def median_ms(function, repeat):
+    """Tempo mediano per chiamata in millisecondi"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples)) * 1000
+
+
+def trained_models():
+    """(nome, predittore caricato) per ogni artefatto presente"""
+    for predictor_class in (PeakDemandPredictor, RentalCountPredictor, WeatherImpactPredictor):
+        for model_type in predictor_class.MODEL_TYPES:
+            if not os.path.exists(predictor_class.model_path(model_type)):
+                continue
+            predictor = predictor_class(model_type=model_type)
+            predictor.load_model()
+            yield f'{predictor_class.__name__}:{model_type}', predictor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=100, help='Ripetizioni per misura (default 100)')
+    args = parser.parse_args()
+
+    # Modelli addestrati su DataFrame: sklearn avverte per l'input senza nomi delle features
+    warnings.simplefilter('ignore', UserWarning)
+
+    app = create_app()
+    with app.app_context():
+        if not BikeRecord.query.first():
+            print("❌ Database vuoto: caricare prima un dataset con /api/data/load")
+            return 1
+        data = BikeDataLoader.download_data_in_dataframe().dropna()
+
+    rng = np.random.default_rng(44)
+    header = f"{'modello':<42}{'identico':>9}{'riga sk ms':>12}{'riga ms':>9}{'x':>6}"
+    for size in BATCH_SIZES + (len(data),):
+        header += f"{f'{size} sk ms':>14}{f'{size} ms':>11}{'x':>6}"
+    print(header)
+    print('-' * len(header))
+
+    for name, predictor in trained_models():
+        model = predictor.model
+        compiled = compile_model(model)
+        if compiled is model:
+            print(f"{name:<42}{'non compilato':>15}")
+            continue
+
+        features = getattr(predictor, 'weather_features', None) or predictor.feature_names
+        X = data[features].to_numpy(dtype=np.float64)
+        method = 'predict_proba' if hasattr(compiled, 'predict_proba') else 'predict'
+        sklearn_predict, compiled_predict = getattr(model, method), getattr(compiled, method)
+
+        identical = outputs_match(model, compiled, X) and all(
+            outputs_match(model, compiled, X[index:index + 1]) for index in rng.integers(0, len(X), 50)
+        )
+        rows = [X[index:index + 1] for index in rng.integers(0, len(X), args.repeat)]
+        row_iter = iter(rows * 2)
+        sklearn_row = median_ms(lambda: sklearn_predict(next(row_iter)), args.repeat)
+        compiled_row = median_ms(lambda: compiled_predict(next(row_iter)), args.repeat)
+        line = f"{name:<42}{'sì' if identical else 'NO':>9}{sklearn_row:>12.3f}{compiled_row:>9.3f}{sklearn_row / compiled_row:>6.1f}"
+
+        for size in BATCH_SIZES + (len(X),):
+            batch = X[:size]
+            repeat = max(3, args.repeat // max(1, size // 64))
+            sklearn_batch = median_ms(lambda: sklearn_predict(batch), repeat)
+            compiled_batch = median_ms(lambda: compiled_predict(batch), repeat)
+            line += f"{sklearn_batch:>14.2f}{compiled_batch:>11.2f}{sklearn_batch / compiled_batch:>6.1f}"
+        print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark serializzazione JSON e compressione delle risposte
+
+Per i payload reali delle analisi (sul database locale già caricato) misura:
+    - tempo CPU di serializzazione: json della libreria standard vs orjson
+    - byte della risposta: non compressa, gzip, brotli (se installato)
+    - tempo CPU di compressione per risposta
+
+Uso (dalla root del progetto, dopo aver caricato un dataset con /api/data/load):
+    python benchmarks/json_compression.py --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import create_app
+from database import BikeRecord
+from database.data_analytics import BikeAnalytics
+from database.analytics_cube import cube_store
+from routes.json_provider import NumpyJSONProvider, OrjsonProvider, orjson
+from routes.compression import brotli, compress
+
+
+def collect_payloads(app):
+    """Payload delle risposte principali, calcolati una volta sola"""
+    service = BikeAnalytics()
+    return {
+        'mean-rental-by-hour': service.get_hourly_rental_patterns(),
+        'mean-rental-by-hour?approx': service.get_hourly_rental_patterns(approx=True),
+        'weekday-vs-weekend': service.get_weekday_weekend_comparison(),
+        'weather-impact': service.get_weather_impact_analysis(),
+        'quantiles?by=hour': service.get_quantile_distribution('hour', BikeAnalytics.DEFAULT_QUANTILES),
+        'cube?dims=hr,weekday': {'rows': cube_store.get().rollup(['hr', 'weekday'])},
+        'dashboard': service.get_dashboard(app)
+    }
+
+
+def cpu_time_us(function, repeat):
+    """Tempo CPU medio per chiamata in microsecondi"""
+    start = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=100, help='Ripetizioni per misura (default 100)')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if not BikeRecord.query.first():
+            print("❌ Database vuoto: caricare prima un dataset con /api/data/load")
+            return 1
+
+        payloads = collect_payloads(app)
+        providers = {'json': NumpyJSONProvider(app)}
+        if orjson is not None:
+            providers['orjson'] = OrjsonProvider(app)
+        encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+        header = f"{'endpoint':<28}{'bytes':>9}"
+        header += ''.join(f"{name + ' µs':>12}" for name in providers)
+        for encoding in encodings:
+            header += f"{encoding + ' bytes':>12}{encoding + ' µs':>10}"
+        print(header)
+        print('-' * len(header))
+
+        for name, payload in payloads.items():
+            body = providers['json'].dumps(payload).encode('utf-8')
+            line = f"{name:<28}{len(body):>9}"
+            for provider in providers.values():
+                line += f"{cpu_time_us(lambda: provider.dumps(payload), args.repeat):>12.1f}"
+            for encoding in encodings:
+                compressed = compress(body, encoding, app.config)
+                elapsed = cpu_time_us(lambda: compress(body, encoding, app.config), args.repeat)
+                line += f"{len(compressed):>12}{elapsed:>10.1f}"
+            print(line)
+
+        if brotli is None:
+            print("\nℹ️  brotli non installato: misurato solo gzip (pip install brotli)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
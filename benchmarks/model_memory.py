@@ -0,0 +1,143 @@
+"""
+Memoria per worker con artefatti pickle e mmap
+
+Gli artefatti addestrati presenti in machine_learning/weights/ vengono riscritti
+nei due formati in una directory temporanea; per ogni formato vengono poi avviati
+N processi worker (come i worker WSGI) che caricano tutti i modelli ed eseguono
+una predizione batch. Quando tutti hanno caricato, ogni worker legge da
+/proc/self/smaps_rollup:
+    - RSS: memoria residente (conta per intero anche le pagine condivise)
+    - PSS: pagine condivise divise tra i processi che le mappano
+    - privata: pagine del solo processo (Private_Clean + Private_Dirty)
+Le misure sono prese con tutti i worker ancora vivi, quindi le pagine dei file
+mmap nella page cache risultano condivise tra tutti. La colonna "modelli" è la
+differenza rispetto alla misura presa prima del caricamento.
+
+Uso (Linux, dalla root del progetto, dopo aver addestrato i modelli):
+    python benchmarks/model_memory.py --workers 4
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from machine_learning.model_artifacts import ARTIFACT_FORMATS, dump_artifact, load_artifact, restore_model
+
+WEIGHTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'machine_learning', 'weights')
+
+# Righe di prova per la predizione che porta in memoria le pagine dei modelli
+TOUCH_ROWS = 4096
+
+
+def memory_mb():
+    """RSS, PSS e memoria privata del processo in MB (da /proc/self/smaps_rollup)"""
+    values = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': values['Rss'],
+        'pss': values['Pss'],
+        'private': values['Private_Clean'] + values['Private_Dirty']
+    }
+
+
+def worker(directory, barrier, results):
+    """Carica tutti i modelli della directory, predice e misura la memoria"""
+    from machine_learning.compiled_models import probe_rows
+
+    before = memory_mb()
+    models = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.joblib'))):
+        _, inference_model = restore_model(load_artifact(path))
+        inference_model.predict(probe_rows(inference_model, rows=TOUCH_ROWS))
+        models.append(inference_model)
+
+    # Misura con tutti i worker carichi: le pagine condivise risultano tali
+    barrier.wait()
+    after = memory_mb()
+    barrier.wait()
+    results.put({
+        'before': before,
+        'after': after,
+        'models': len(models)
+    })
+
+
+def convert_artifacts(target):
+    """Riscrive gli artefatti pickle in entrambi i formati sotto target/<formato>/"""
+    directories = {}
+    for artifact_format in ARTIFACT_FORMATS:
+        directories[artifact_format] = os.path.join(target, artifact_format)
+        os.makedirs(directories[artifact_format])
+
+    for path in sorted(glob.glob(os.path.join(WEIGHTS_DIR, '*.joblib'))):
+        model_data = load_artifact(path)
+        if model_data.get('artifact_format') == 'mmap':
+            print(f"ℹ️  {os.path.basename(path)} è già in formato mmap: saltato (serve il modello sklearn)")
+            continue
+        for artifact_format, directory in directories.items():
+            dump_artifact(model_data, os.path.join(directory, os.path.basename(path)), artifact_format)
+    return directories
+
+
+def run_workers(directory, workers):
+    """Avvia i worker su una directory di artefatti e restituisce le loro misure"""
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(directory, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measures = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return measures
+
+
+def directory_mb(directory):
+    """Dimensione su disco degli artefatti in MB"""
+    return sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, '*.joblib'))) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4, help='Processi worker per formato (default 4)')
+    args = parser.parse_args()
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        print("❌ Serve Linux (>= 4.14) per leggere /proc/self/smaps_rollup")
+        return 1
+
+    with tempfile.TemporaryDirectory() as target:
+        directories = convert_artifacts(target)
+        if not glob.glob(os.path.join(directories['pickle'], '*.joblib')):
+            print("❌ Nessun modello addestrato in machine_learning/weights/")
+            return 1
+
+        header = f"{'formato':<9}{'disco MB':>10}{'modelli':>9}{'RSS MB':>9}{'PSS MB':>9}{'privata MB':>12}{'modelli RSS':>13}{'modelli PSS':>13}"
+        print(f"{args.workers} worker, valori medi per worker")
+        print(header)
+        print('-' * len(header))
+        for artifact_format, directory in directories.items():
+            measures = run_workers(directory, args.workers)
+
+            def mean(stage, key):
+                return sum(measure[stage][key] for measure in measures) / len(measures)
+
+            print(
+                f"{artifact_format:<9}{directory_mb(directory):>10.1f}{measures[0]['models']:>9}"
+                f"{mean('after', 'rss'):>9.1f}{mean('after', 'pss'):>9.1f}{mean('after', 'private'):>12.1f}"
+                f"{mean('after', 'rss') - mean('before', 'rss'):>13.1f}{mean('after', 'pss') - mean('before', 'pss'):>13.1f}"
+            )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,6 +21,11 @@ def create_tables():
     """Create all database tables"""
     try:
         db.create_all()
+        
+        # create_all non aggiunge indici a tabelle già esistenti
+        for index in BikeRecord.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        
         logging.info("Database tables created successfully")
     except Exception as e:
         logging.error(f"Error creating tables: {e}")
@@ -28,6 +33,9 @@ def create_tables():
 
 # Import models after db initialization to avoid circular imports
 from .bike_record import BikeRecord
+from .quantile_sketch import QuantileSketch
+from .stratified_sample import BikeRecordSample, SampleStratum
 
 # Export what's needed
-__all__ = ['db', 'init_database', 'create_tables', 'BikeRecord', 'BikeDataLoader']
\ No newline at end of file
+__all__ = ['db', 'init_database', 'create_tables', 'BikeRecord', 'QuantileSketch',
+           'BikeRecordSample', 'SampleStratum', 'BikeDataLoader']
\ No newline at end of file
@@ -0,0 +1,270 @@
+"""
+Cubo OLAP denso sulle dimensioni categoriali di bike_records
+
+Per ogni combinazione di season × yr × mnth × hr × holiday × weekday × workingday × weathersit
+(129.024 celle) il cubo mantiene count e sum/min/max di cnt, casual e registered.
+Qualsiasi roll-up su un sottoinsieme delle dimensioni si ottiene riducendo gli assi
+degli array NumPy, senza interrogare la tabella.
+"""
+import logging
+import threading
+import numpy as np
+from sqlalchemy import func
+
+from . import db, BikeRecord
+from .dataset_version import get_dataset_version
+from .singleflight import SingleFlight
+
+
+class AnalyticsCube:
+    """Cubo denso di aggregati per cella"""
+
+    # Dimensione -> (valore minimo, numero di valori)
+    DIMENSIONS = {
+        'season': (1, 4),
+        'yr': (0, 2),
+        'mnth': (1, 12),
+        'hr': (0, 24),
+        'holiday': (0, 2),
+        'weekday': (0, 7),
+        'workingday': (0, 2),
+        'weathersit': (1, 4)
+    }
+
+    MEASURES = ('cnt', 'casual', 'registered')
+
+    def __init__(self):
+        self.shape = tuple(size for _, size in self.DIMENSIONS.values())
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.sums = {m: np.zeros(self.shape, dtype=np.int64) for m in self.MEASURES}
+        self.mins = {m: np.full(self.shape, np.iinfo(np.int64).max, dtype=np.int64) for m in self.MEASURES}
+        self.maxs = {m: np.full(self.shape, np.iinfo(np.int64).min, dtype=np.int64) for m in self.MEASURES}
+
+    @property
+    def total_records(self):
+        """Numero di record aggregati nel cubo"""
+        return int(self.count.sum())
+
+    def copy(self):
+        """Copia indipendente del cubo"""
+        cube = AnalyticsCube()
+        cube.count = self.count.copy()
+        for m in self.MEASURES:
+            cube.sums[m] = self.sums[m].copy()
+            cube.mins[m] = self.mins[m].copy()
+            cube.maxs[m] = self.maxs[m].copy()
+        return cube
+
+    def update(self, frame):
+        """
+        Aggiunge un batch di record al cubo
+
+        Args:
+            frame (pd.DataFrame): Record con colonne delle dimensioni e delle misure
+        """
+        valid = self._in_domain(frame)
+        if not valid.all():
+            logging.warning(f"Cubo OLAP: {int((~valid).sum())} record con dimensioni fuori dominio ignorati")
+            frame = frame[valid]
+
+        cells = self._cell_index(frame)
+        size = self.count.size
+
+        self.count += np.bincount(cells, minlength=size).reshape(self.shape)
+        for m in self.MEASURES:
+            values = frame[m].to_numpy().astype(np.int64)
+            self.sums[m] += np.bincount(cells, weights=values, minlength=size).astype(np.int64).reshape(self.shape)
+            np.minimum.at(self.mins[m].reshape(-1), cells, values)
+            np.maximum.at(self.maxs[m].reshape(-1), cells, values)
+
+    @classmethod
+    def from_database(cls):
+        """Costruisce il cubo con una sola query GROUP BY su tutte le dimensioni"""
+        import pandas as pd
+
+        dimensions = [getattr(BikeRecord, d) for d in cls.DIMENSIONS]
+        aggregates = [func.count(BikeRecord.id).label('n')]
+        for m in cls.MEASURES:
+            column = getattr(BikeRecord, m)
+            aggregates += [
+                func.sum(column).label(f'{m}_sum'),
+                func.min(column).label(f'{m}_min'),
+                func.max(column).label(f'{m}_max')
+            ]
+
+        rows = db.session.query(*dimensions, *aggregates).group_by(*dimensions).all()
+
+        cube = cls()
+        if not rows:
+            return cube
+
+        columns = list(cls.DIMENSIONS) + [aggregate.name for aggregate in aggregates]
+        frame = pd.DataFrame(rows, columns=columns)
+        frame = frame[cube._in_domain(frame)]
+        cells = cube._cell_index(frame)
+        cube.count.reshape(-1)[cells] = frame['n'].to_numpy()
+        for m in cls.MEASURES:
+            cube.sums[m].reshape(-1)[cells] = frame[f'{m}_sum'].to_numpy()
+            cube.mins[m].reshape(-1)[cells] = frame[f'{m}_min'].to_numpy()
+            cube.maxs[m].reshape(-1)[cells] = frame[f'{m}_max'].to_numpy()
+        return cube
+
+    def rollup(self, dims, measures=MEASURES, where=None):
+        """
+        Roll-up del cubo sulle dimensioni richieste
+
+        Args:
+            dims (list): Dimensioni da mantenere (le altre vengono aggregate)
+            measures (list): Misure da restituire
+            where (dict, optional): Slice {dimensione: [valori]} applicate prima del roll-up
+
+        Returns:
+            list: Una riga per cella non vuota con count e sum/avg/min/max per misura
+        """
+        unknown = [d for d in list(dims) + list(where or {}) if d not in self.DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Dimensioni non supportate: {unknown}")
+        if len(set(dims)) != len(dims):
+            raise ValueError("Dimensioni duplicate")
+        unknown = [m for m in measures if m not in self.MEASURES]
+        if unknown:
+            raise ValueError(f"Misure non supportate: {unknown}")
+        for dimension, values in (where or {}).items():
+            offset, size = self.DIMENSIONS[dimension]
+            if not values or any(not 0 <= v - offset < size for v in values):
+                raise ValueError(f"Valori non validi per '{dimension}': {values}")
+
+        names = list(self.DIMENSIONS)
+        keep = [names.index(d) for d in dims]
+
+        results = {'count': self._reduce(self._select(self.count, where), keep, np.sum)}
+        for m in measures:
+            results[f'{m}_sum'] = self._reduce(self._select(self.sums[m], where), keep, np.sum)
+            results[f'{m}_min'] = self._reduce(self._select(self.mins[m], where), keep, np.min)
+            results[f'{m}_max'] = self._reduce(self._select(self.maxs[m], where), keep, np.max)
+        count = results['count']
+
+        # Valore di ogni posizione lungo gli assi mantenuti (le slice riducono gli assi)
+        labels = [
+            list(where[d]) if where and d in where else list(range(self.DIMENSIONS[d][0], sum(self.DIMENSIONS[d])))
+            for d in dims
+        ]
+
+        rows = []
+        for cell in zip(*np.nonzero(count)) if count.ndim else [()]:
+            n = int(count[cell])
+            if n == 0:
+                continue
+            row = {d: labels[i][cell[i]] for i, d in enumerate(dims)}
+            row['count'] = n
+            for m in measures:
+                total = int(results[f'{m}_sum'][cell])
+                row[m] = {
+                    'sum': total,
+                    'avg': round(total / n, 2),
+                    'min': int(results[f'{m}_min'][cell]),
+                    'max': int(results[f'{m}_max'][cell])
+                }
+            rows.append(row)
+        return rows
+
+    def _select(self, array, where):
+        """Applica le slice {dimensione: [valori]} lungo gli assi corrispondenti"""
+        names = list(self.DIMENSIONS)
+        for dimension, values in (where or {}).items():
+            offset, _ = self.DIMENSIONS[dimension]
+            indices = [v - offset for v in values]
+            array = np.take(array, indices, axis=names.index(dimension))
+        return array
+
+    def _reduce(self, array, keep, reducer):
+        """
+        Aggrega tutti gli assi tranne quelli in keep
+
+        Gli assi mantenuti vengono spostati in testa (nell'ordine richiesto) e gli
+        altri appiattiti in un unico asse contiguo, più veloce da ridurre.
+        """
+        moved = np.moveaxis(array, keep, list(range(len(keep))))
+        kept_shape = moved.shape[:len(keep)]
+        return reducer(moved.reshape(kept_shape + (-1,)), axis=-1)
+
+    def _in_domain(self, frame):
+        """Maschera delle righe con tutte le dimensioni nel dominio del cubo"""
+        valid = np.ones(len(frame), dtype=bool)
+        for d, (offset, size) in self.DIMENSIONS.items():
+            values = frame[d].to_numpy().astype(np.int64)
+            valid &= (values >= offset) & (values < offset + size)
+        return valid
+
+    def _cell_index(self, frame):
+        """Indice piatto della cella per ogni riga del DataFrame"""
+        coordinates = [
+            frame[d].to_numpy().astype(np.int64) - offset
+            for d, (offset, _) in self.DIMENSIONS.items()
+        ]
+        return np.ravel_multi_index(coordinates, self.shape)
+
+
+class CubeStore:
+    """
+    Cubo condiviso dal processo, valido per una versione del dataset
+
+    Se la versione del dataset è cambiata (caricamento in un altro processo o
+    primo accesso dopo l'avvio) il cubo viene ricostruito con una query GROUP BY,
+    una sola volta anche con più richieste concorrenti.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._cube = None
+        self._version = None
+
+    def get(self):
+        """Cubo aggiornato alla versione corrente del dataset"""
+        version = get_dataset_version()
+        with self._lock:
+            if self._cube is not None and self._version == version:
+                return self._cube
+
+        def rebuild():
+            cube = AnalyticsCube.from_database()
+            self.publish(cube, version)
+            return cube
+
+        return self._flight.do(version, rebuild)
+
+    def publish(self, cube, version):
+        """Rende disponibile un cubo costruito per una versione"""
+        with self._lock:
+            self._cube = cube
+            self._version = version
+
+
+cube_store = CubeStore()
+
+
+class CubeBuilder:
+    """Aggiorna il cubo durante il caricamento dei dati (start/update/finalize)"""
+
+    def __init__(self, store=cube_store):
+        self.store = store
+        self.cube = None
+
+    def start(self, append=False):
+        """Riparte dal cubo corrente in modalità append, altrimenti da un cubo vuoto"""
+        self.cube = self.store.get().copy() if append else AnalyticsCube()
+
+    def update(self, frame):
+        """Aggiunge al cubo un batch di record salvati"""
+        self.cube.update(frame)
+
+    def finalize(self, version):
+        """
+        Pubblica il cubo per la nuova versione del dataset
+
+        Args:
+            version: Versione restituita da bump_dataset_version al termine del caricamento
+        """
+        self.store.publish(self.cube, version)
+        print(f"🧊 Cubo OLAP aggiornato: {self.cube.total_records} record")
@@ -0,0 +1,183 @@
+"""Filtri opzionali per le analisi sui noleggi"""
+
+from datetime import datetime
+import numpy as np
+from .bike_record import BikeRecord
+
+
+class InvalidFilterError(ValueError):
+    """Parametro di filtro non valido (risposta 400)"""
+
+
+class AnalyticsFilters:
+    """
+    Filtri applicabili alle query di analisi.
+
+    Ogni filtro diventa un predicato SQL sulle colonne indicizzate di bike_records
+    (dteday, season, workingday, weathersit, hr), così le slice strette vengono
+    risolte con un range scan sull'indice invece che con la scansione della tabella.
+    """
+
+    # Valori ammessi per i filtri categoriali
+    DOMAINS = {
+        'season': range(1, 5),
+        'workingday': range(0, 2),
+        'weathersit': range(1, 5)
+    }
+
+    def __init__(self, start=None, end=None, season=None, workingday=None,
+                 weathersit=None, hour_from=None, hour_to=None):
+        self.start = start
+        self.end = end
+        self.season = season
+        self.workingday = workingday
+        self.weathersit = weathersit
+        self.hour_from = hour_from
+        self.hour_to = hour_to
+
+        if self.start and self.end and self.start > self.end:
+            raise InvalidFilterError("'start' deve precedere 'end'")
+        if self.hour_from is not None and self.hour_to is not None and self.hour_from > self.hour_to:
+            raise InvalidFilterError("'hour_from' deve essere minore o uguale a 'hour_to'")
+
+    @classmethod
+    def from_args(cls, args):
+        """
+        Crea i filtri dai parametri della query string
+
+        Args:
+            args: request.args (start, end, season, workingday, weathersit, hour_from, hour_to)
+
+        Returns:
+            AnalyticsFilters: Filtri validati
+        """
+        return cls(
+            start=cls._parse_date(args, 'start'),
+            end=cls._parse_date(args, 'end'),
+            season=cls._parse_values(args, 'season'),
+            workingday=cls._parse_values(args, 'workingday'),
+            weathersit=cls._parse_values(args, 'weathersit'),
+            hour_from=cls._parse_hour(args, 'hour_from'),
+            hour_to=cls._parse_hour(args, 'hour_to')
+        )
+
+    @staticmethod
+    def _parse_date(args, name):
+        """Parsing di una data in formato YYYY-MM-DD"""
+        value = args.get(name)
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise InvalidFilterError(f"'{name}' deve essere una data nel formato YYYY-MM-DD")
+
+    @classmethod
+    def _parse_values(cls, args, name):
+        """Parsing di un filtro categoriale: valore singolo o lista separata da virgole"""
+        value = args.get(name)
+        if not value:
+            return None
+        try:
+            values = sorted({int(v) for v in value.split(',') if v.strip()})
+        except ValueError:
+            raise InvalidFilterError(f"'{name}' deve essere un intero o una lista di interi separati da virgola")
+
+        invalid = [v for v in values if v not in cls.DOMAINS[name]]
+        if invalid:
+            raise InvalidFilterError(f"Valori non validi per '{name}': {invalid}")
+        return values or None
+
+    @staticmethod
+    def _parse_hour(args, name):
+        """Parsing di un estremo del range orario (0-23)"""
+        value = args.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            hour = int(value)
+        except ValueError:
+            raise InvalidFilterError(f"'{name}' deve essere un intero tra 0 e 23")
+        if not 0 <= hour <= 23:
+            raise InvalidFilterError(f"'{name}' deve essere un intero tra 0 e 23")
+        return hour
+
+    def conditions(self, table=None):
+        """
+        Predicati SQL corrispondenti ai filtri attivi
+
+        Args:
+            table: Tabella/alias su cui costruire i predicati (default: BikeRecord)
+
+        Returns:
+            list: Espressioni SQLAlchemy da passare a filter()/where()
+        """
+        columns = table.c if table is not None else BikeRecord
+        conditions = []
+
+        if self.start:
+            conditions.append(columns.dteday >= self.start)
+        if self.end:
+            conditions.append(columns.dteday <= self.end)
+        if self.hour_from is not None:
+            conditions.append(columns.hr >= self.hour_from)
+        if self.hour_to is not None:
+            conditions.append(columns.hr <= self.hour_to)
+
+        for name in ('season', 'workingday', 'weathersit'):
+            values = getattr(self, name)
+            if values:
+                column = getattr(columns, name)
+                conditions.append(column == values[0] if len(values) == 1 else column.in_(values))
+
+        return conditions
+
+    def apply(self, query):
+        """Applica i filtri a una query ORM"""
+        conditions = self.conditions()
+        return query.filter(*conditions) if conditions else query
+
+    def mask(self, frame):
+        """
+        Maschera dei record di un DataFrame che rispettano i filtri (es. campione in memoria)
+
+        Args:
+            frame (pd.DataFrame): Record con le colonne di bike_records (dteday come datetime64)
+
+        Returns:
+            np.ndarray: Array booleano, True per i record da includere
+        """
+        mask = np.ones(len(frame), dtype=bool)
+
+        if self.start:
+            mask &= (frame['dteday'] >= np.datetime64(self.start)).to_numpy()
+        if self.end:
+            mask &= (frame['dteday'] <= np.datetime64(self.end)).to_numpy()
+        if self.hour_from is not None:
+            mask &= (frame['hr'] >= self.hour_from).to_numpy()
+        if self.hour_to is not None:
+            mask &= (frame['hr'] <= self.hour_to).to_numpy()
+
+        for name in ('season', 'workingday', 'weathersit'):
+            values = getattr(self, name)
+            if values:
+                mask &= frame[name].isin(values).to_numpy()
+
+        return mask
+
+    def is_empty(self):
+        """True se nessun filtro è attivo"""
+        return not self.to_dict()
+
+    def to_dict(self):
+        """Filtri attivi in formato serializzabile"""
+        result = {
+            'start': self.start.isoformat() if self.start else None,
+            'end': self.end.isoformat() if self.end else None,
+            'season': self.season,
+            'workingday': self.workingday,
+            'weathersit': self.weathersit,
+            'hour_from': self.hour_from,
+            'hour_to': self.hour_to
+        }
+        return {key: value for key, value in result.items() if value is not None}
@@ -0,0 +1,211 @@
+"""
+Rilevamento delle ore anomale con z-score robusti
+
+Per ogni gruppo (hr × workingday × weathersit) la baseline è la mediana di cnt e la
+MAD (mediana delle deviazioni assolute) su tutto il dataset. Lo z-score robusto di
+un record è 0.6745 · (cnt − mediana) / MAD (Iglewicz-Hoaglin): valori oltre ±3.5
+indicano ore anomale (guasti, eventi).
+
+Colonne e baseline vengono caricate in memoria una sola volta per versione del
+dataset; le richieste successive calcolano maschera dei filtri e z-score in NumPy
+vettorizzato senza accedere al database.
+"""
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import db
+from .dataset_version import get_dataset_version
+from .singleflight import SingleFlight
+
+# Colonne del gruppo e del conteggio più quelle usate da AnalyticsFilters.mask
+ANOMALY_COLUMNS = ['instant', 'dteday', 'season', 'hr', 'workingday', 'weathersit', 'cnt']
+
+# Costante di consistenza della MAD rispetto alla deviazione standard normale
+MAD_SCALE = 0.6745
+
+# Soglia consigliata da Iglewicz e Hoaglin per lo z-score modificato
+DEFAULT_THRESHOLD = 3.5
+
+# Numero di gruppi: 24 ore × 2 (workingday) × 4 (weathersit)
+GROUP_COUNT = 24 * 2 * 4
+
+
+def group_index(hr, workingday, weathersit):
+    """Indice del gruppo (hr, workingday, weathersit) in [0, GROUP_COUNT)"""
+    return (np.asarray(hr, dtype=np.int64) * 2 + workingday) * 4 + (np.asarray(weathersit, dtype=np.int64) - 1)
+
+
+def grouped_medians(groups, values, group_count=GROUP_COUNT):
+    """
+    Mediana di values per gruppo in tempo lineare
+
+    Un ordinamento stabile per gruppo (radix sort su int16) rende contigui i valori
+    di ogni gruppo; la mediana di ogni segmento si ottiene poi con np.partition,
+    senza ordinare i valori.
+
+    Args:
+        groups (np.ndarray): Indice del gruppo di ogni valore
+        values (np.ndarray): Valori
+        group_count (int): Numero di gruppi
+
+    Returns:
+        tuple: (mediane, conteggi); NaN per i gruppi vuoti
+    """
+    segments = values[np.argsort(groups.astype(np.int16), kind='stable')].astype(np.float64)
+    counts = np.bincount(groups, minlength=group_count)
+    ends = np.cumsum(counts)
+
+    medians = np.full(group_count, np.nan)
+    for group in np.nonzero(counts)[0]:
+        segment = segments[ends[group] - counts[group]:ends[group]]
+        lower, upper = (counts[group] - 1) // 2, counts[group] // 2
+        segment.partition((lower, upper))
+        medians[group] = (segment[lower] + segment[upper]) / 2
+    return medians, counts
+
+
+class AnomalyBaseline:
+    """Colonne del dataset in memoria con mediana e MAD di ogni gruppo"""
+
+    def __init__(self, records):
+        self.records = records
+        self.groups = group_index(
+            records['hr'].to_numpy(), records['workingday'].to_numpy(), records['weathersit'].to_numpy()
+        )
+        self.cnt = records['cnt'].to_numpy(dtype=np.float64)
+
+        self.medians, self.counts = grouped_medians(self.groups, self.cnt)
+        deviations = np.abs(self.cnt - self.medians[self.groups])
+        self.mads, _ = grouped_medians(self.groups, deviations)
+
+        # Con MAD nulla (più di metà dei valori uguali alla mediana) si usa la
+        # deviazione assoluta media scalata, come nello z-score modificato di IBM
+        mean_deviations = np.bincount(self.groups, weights=deviations, minlength=GROUP_COUNT)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_deviations /= self.counts
+        self.scales = np.where(self.mads > 0, self.mads / MAD_SCALE, mean_deviations * 1.253314)
+
+    @property
+    def total_records(self):
+        return int(len(self.records))
+
+    def z_scores(self, mask=None):
+        """
+        Z-score robusti dei record selezionati
+
+        Args:
+            mask (np.ndarray, optional): Record da includere (es. maschera dei filtri)
+
+        Returns:
+            tuple: (indici dei record, z-score); z = 0 se il gruppo non ha dispersione
+        """
+        indices = np.nonzero(mask)[0] if mask is not None else np.arange(self.total_records)
+        groups = self.groups[indices]
+        scales = self.scales[groups]
+        residuals = self.cnt[indices] - self.medians[groups]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            z = np.where(scales > 0, residuals / scales, 0.0)
+        return indices, z
+
+    def detect(self, mask=None, threshold=DEFAULT_THRESHOLD, direction='both', limit=100):
+        """
+        Ore anomale tra i record selezionati, ordinate per |z| decrescente
+
+        Args:
+            mask (np.ndarray, optional): Record da includere
+            threshold (float): Soglia su |z|
+            direction (str): 'both', 'high' (picchi) o 'low' (cali)
+            limit (int): Numero massimo di anomalie restituite
+
+        Returns:
+            dict: Anomalie e riepilogo della scansione
+        """
+        indices, z = self.z_scores(mask)
+        if direction == 'high':
+            flagged = z >= threshold
+        elif direction == 'low':
+            flagged = z <= -threshold
+        else:
+            flagged = np.abs(z) >= threshold
+
+        flagged_positions = np.nonzero(flagged)[0]
+        strength = np.abs(z[flagged_positions])
+        if len(flagged_positions) > limit:
+            # Selezione parziale dei più forti, poi ordinamento dei soli selezionati
+            top = np.argpartition(-strength, limit - 1)[:limit]
+            flagged_positions, strength = flagged_positions[top], strength[top]
+        flagged_positions = flagged_positions[np.argsort(-strength, kind='stable')]
+
+        selected = indices[flagged_positions]
+        rows = self.records.iloc[selected]
+        groups = self.groups[selected]
+        anomalies = [
+            {
+                'instant': int(row.instant),
+                'date': row.dteday.strftime('%Y-%m-%d'),
+                'hour': int(row.hr),
+                'workingday': int(row.workingday),
+                'weathersit': int(row.weathersit),
+                'count': int(row.cnt),
+                'expected': float(self.medians[group]),
+                'mad': float(self.mads[group]),
+                'z_score': round(float(score), 3),
+                'direction': 'high' if score > 0 else 'low',
+                'group_size': int(self.counts[group])
+            }
+            for row, group, score in zip(rows.itertuples(index=False), groups, z[flagged_positions])
+        ]
+
+        return {
+            'anomalies': anomalies,
+            'summary': {
+                'records_scanned': int(len(indices)),
+                'anomalies_found': int(flagged.sum()),
+                'anomalies_returned': len(anomalies),
+                'high': int((z[flagged] > 0).sum()),
+                'low': int((z[flagged] < 0).sum()),
+                'threshold': threshold,
+                'direction': direction,
+                'groups': int((self.counts > 0).sum())
+            }
+        }
+
+
+class AnomalyStore:
+    """Baseline in memoria per la versione corrente del dataset"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._baseline = None
+        self._version = None
+
+    def get(self):
+        """Baseline aggiornata alla versione corrente del dataset"""
+        version = get_dataset_version()
+        with self._lock:
+            if self._baseline is not None and self._version == version:
+                return self._baseline
+
+        # Richieste concorrenti a cache fredda leggono la tabella una sola volta
+        return self._flight.do(version, lambda: self._load(version))
+
+    def _load(self, version):
+        """Legge le colonne necessarie da bike_records e calcola le baseline"""
+        from .bike_record import BikeRecord
+
+        records = pd.read_sql(
+            select(*[getattr(BikeRecord, c) for c in ANOMALY_COLUMNS]).order_by(BikeRecord.instant),
+            db.session.connection()
+        )
+        records['dteday'] = pd.to_datetime(records['dteday'])
+        baseline = AnomalyBaseline(records)
+
+        with self._lock:
+            self._baseline, self._version = baseline, version
+        return baseline
+
+
+anomaly_store = AnomalyStore()
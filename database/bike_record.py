@@ -7,6 +7,14 @@ class BikeRecord(db.Model):
     """
     __tablename__ = 'bike_records'
     
+    # Indici composti per i filtri delle analisi (range date/ora, stagione, meteo)
+    __table_args__ = (
+        db.Index('ix_bike_records_dteday_hr', 'dteday', 'hr'),
+        db.Index('ix_bike_records_season_dteday', 'season', 'dteday'),
+        db.Index('ix_bike_records_workingday_hr', 'workingday', 'hr'),
+        db.Index('ix_bike_records_weathersit_hr', 'weathersit', 'hr'),
+    )
+    
     # Primary key
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     
@@ -163,58 +171,70 @@ class BikeRecord(db.Model):
         )
     
     @classmethod
-    def get_hourly_patterns(cls):
+    def get_hourly_patterns(cls, filters=None):
         """Pattern utilizzo orari"""
         from sqlalchemy import func
-        return db.session.query(
+        query = db.session.query(
             cls.hr,
             func.avg(cls.cnt).label('avg_count'),
             func.max(cls.cnt).label('max_count'),
             func.min(cls.cnt).label('min_count'),
             func.count(cls.id).label('sample_count')
-        ).group_by(cls.hr).order_by(cls.hr).all()
+        )
+        if filters:
+            query = filters.apply(query)
+        return query.group_by(cls.hr).order_by(cls.hr).all()
     
     @classmethod
-    def get_seasonal_trends(cls):
+    def get_seasonal_trends(cls, filters=None):
         """Trend stagionali"""
         from sqlalchemy import func
-        return db.session.query(
+        query = db.session.query(
             cls.season,
             cls.mnth,
             func.avg(cls.cnt).label('avg_count'),
             func.sum(cls.cnt).label('total_count')
-        ).group_by(cls.season, cls.mnth).order_by(cls.season, cls.mnth).all()
+        )
+        if filters:
+            query = filters.apply(query)
+        return query.group_by(cls.season, cls.mnth).order_by(cls.season, cls.mnth).all()
     
     @classmethod
-    def get_weather_impact(cls):
+    def get_weather_impact(cls, filters=None):
         """Impatto condizioni meteo"""
         from sqlalchemy import func
-        return db.session.query(
+        query = db.session.query(
             cls.weathersit,
             func.avg(cls.cnt).label('avg_count'),
             func.avg(cls.temp).label('avg_temp'),
             func.avg(cls.hum).label('avg_humidity'),
             func.count(cls.id).label('sample_count')
-        ).group_by(cls.weathersit).all()
+        )
+        if filters:
+            query = filters.apply(query)
+        return query.group_by(cls.weathersit).all()
     
     @classmethod
-    def get_user_type_analysis(cls):
+    def get_user_type_analysis(cls, filters=None):
         """Analisi tipi utenti"""
         from sqlalchemy import func
-        return db.session.query(
+        query = db.session.query(
             cls.hr,
             cls.weekday,
             func.avg(cls.casual).label('avg_casual'),
             func.avg(cls.registered).label('avg_registered'),
             func.avg(cls.cnt).label('avg_total')
-        ).group_by(cls.hr, cls.weekday).all()
+        )
+        if filters:
+            query = filters.apply(query)
+        return query.group_by(cls.hr, cls.weekday).all()
     
     @classmethod 
-    def get_dataset_statistics(cls):
+    def get_dataset_statistics(cls, filters=None):
         """Statistiche dataset complete"""
         from sqlalchemy import func
         
-        stats = db.session.query(
+        query = db.session.query(
             func.count(cls.id).label('total_records'),
             func.min(cls.dteday).label('start_date'),
             func.max(cls.dteday).label('end_date'),
@@ -224,7 +244,10 @@ class BikeRecord(db.Model):
             func.sum(cls.cnt).label('total_usage'),
             func.sum(cls.casual).label('total_casual'),
             func.sum(cls.registered).label('total_registered')
-        ).first()
+        )
+        if filters:
+            query = filters.apply(query)
+        stats = query.first()
         
         return {
             'total_records': stats.total_records,
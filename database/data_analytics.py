@@ -1,23 +1,59 @@
 """Modulo per analisi dati noleggio bici"""
 
-from . import db, BikeRecord
+from . import db, BikeRecord, QuantileSketch
+from .quantile_sketch import QuantileSketchBuilder
+from .analytics_cube import cube_store
+from .stratified_sample import sample_store, StratifiedSampleBuilder, Z_95
+from .result_cache import cached_analysis
+from .anomaly_detection import anomaly_store, DEFAULT_THRESHOLD
+from .time_series import time_series_store, period_start, FREQUENCIES, DEFAULT_WINDOWS, DELTAS
 from sqlalchemy import func, case
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
 import logging
+import time
 
 class BikeAnalytics:
     
-    def get_hourly_rental_patterns(self):
-        """Calcola pattern orari di noleggio con statistiche dettagliate"""
+    DAY_NAMES = {
+        0: 'DOM', 1: 'LUN', 2: 'MAR', 3: 'MER',
+        4: 'GIO', 5: 'VEN', 6: 'SAB'
+    }
+    
+    WEATHER_CONDITIONS = {
+        1: 'Sereno/Poche nuvole',
+        2: 'Nebbia/Nuvoloso', 
+        3: 'Neve/Pioggia leggera',
+        4: 'Pioggia/Neve intensa'
+    }
+    
+    DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+    
+    @cached_analysis
+    def get_hourly_rental_patterns(self, filters=None, approx=False):
+        """Calcola pattern orari di noleggio con statistiche dettagliate
+        
+        Args:
+            filters (AnalyticsFilters, optional): Filtri su date, stagione, ora, meteo
+            approx (bool): Se True risponde dal campione stratificato con intervalli di confidenza
+        """
+        if approx:
+            return self._approx_hourly_patterns(filters)
+        
         try:
             # Query per aggregazione per ora
-            hourly_data = db.session.query(
+            hourly_query = db.session.query(
                 BikeRecord.hr.label('hour'),
                 func.avg(BikeRecord.cnt).label('avg_rentals'),
                 func.max(BikeRecord.cnt).label('max_rentals'),
                 func.min(BikeRecord.cnt).label('min_rentals'),
                 func.count(BikeRecord.id).label('sample_count'),
                 func.sum(BikeRecord.cnt).label('total_rentals')
-            ).group_by(BikeRecord.hr).order_by(BikeRecord.hr).all()
+            )
+            hourly_data = self._filtered(hourly_query, filters).group_by(BikeRecord.hr).order_by(BikeRecord.hr).all()
             
             if not hourly_data:
                 return None
@@ -28,11 +64,20 @@ class BikeAnalytics:
             logging.error(f"Errore nel recupero pattern orari: {str(e)}")
             raise
     
-    def get_weekday_weekend_comparison(self):
-        """Confronta noleggi tra giorni lavorativi e weekend"""
+    @cached_analysis
+    def get_weekday_weekend_comparison(self, filters=None, approx=False):
+        """Confronta noleggi tra giorni lavorativi e weekend
+        
+        Args:
+            filters (AnalyticsFilters, optional): Filtri su date, stagione, ora, meteo
+            approx (bool): Se True risponde dal campione stratificato con intervalli di confidenza
+        """
+        if approx:
+            return self._approx_weekday_comparison(filters)
+        
         try:
             # Query principale per weekday vs weekend
-            weekday_weekend_data = db.session.query(
+            weekday_weekend_query = db.session.query(
                 case(
                     (BikeRecord.weekday.in_([0, 6]), 'Weekend'),
                     else_='Weekday'
@@ -42,7 +87,8 @@ class BikeAnalytics:
                 func.min(BikeRecord.cnt).label('min_rentals'),  # Min noleggi
                 func.count(BikeRecord.id).label('sample_count'),# Conteggio campioni
                 func.sum(BikeRecord.cnt).label('total_rentals'),# Totale noleggi
-            ).group_by(
+            )
+            weekday_weekend_data = self._filtered(weekday_weekend_query, filters).group_by(
                 case(
                     (BikeRecord.weekday.in_([0, 6]), 'Weekend'),
                     else_='Weekday'
@@ -50,11 +96,12 @@ class BikeAnalytics:
             ).all()
             
             # Query dettagliata per giorno
-            daily_breakdown = db.session.query(
+            daily_query = db.session.query(
                 BikeRecord.weekday.label('weekday'),
                 func.avg(BikeRecord.cnt).label('avg_rentals'),
                 func.count(BikeRecord.id).label('sample_count')
-            ).group_by(BikeRecord.weekday).order_by(BikeRecord.weekday).all()
+            )
+            daily_breakdown = self._filtered(daily_query, filters).group_by(BikeRecord.weekday).order_by(BikeRecord.weekday).all()
             
             if not weekday_weekend_data or not daily_breakdown:
                 return None
@@ -65,11 +112,20 @@ class BikeAnalytics:
             logging.error(f"Errore nel confronto weekday vs weekend: {str(e)}")
             raise
     
-    def get_weather_impact_analysis(self):
-        """Analizza impatto condizioni meteo sui noleggi"""
+    @cached_analysis
+    def get_weather_impact_analysis(self, filters=None, approx=False):
+        """Analizza impatto condizioni meteo sui noleggi
+        
+        Args:
+            filters (AnalyticsFilters, optional): Filtri su date, stagione, ora, meteo
+            approx (bool): Se True risponde dal campione stratificato con intervalli di confidenza
+        """
+        if approx:
+            return self._approx_weather_impact(filters)
+        
         try:
             # Query condizioni meteo
-            weather_impact_data = db.session.query(
+            weather_impact_query = db.session.query(
                 BikeRecord.weathersit.label('weather_condition'),
                 func.avg(BikeRecord.cnt).label('avg_rentals'),
                 func.max(BikeRecord.cnt).label('max_rentals'),
@@ -79,10 +135,11 @@ class BikeAnalytics:
                 func.avg(BikeRecord.temp).label('avg_temp'),
                 func.avg(BikeRecord.hum).label('avg_humidity'),
                 func.avg(BikeRecord.windspeed).label('avg_windspeed')
-            ).group_by(BikeRecord.weathersit).order_by(BikeRecord.weathersit).all()
+            )
+            weather_impact_data = self._filtered(weather_impact_query, filters).group_by(BikeRecord.weathersit).order_by(BikeRecord.weathersit).all()
             
             # Query correlazione temperatura
-            temp_correlation = db.session.query(
+            temp_query = db.session.query(
                 case(
                     (BikeRecord.temp < 0.3, 'Freddo'),
                     (BikeRecord.temp < 0.7, 'Mite'),
@@ -90,7 +147,8 @@ class BikeAnalytics:
                 ).label('temp_category'),
                 func.avg(BikeRecord.cnt).label('avg_rentals'),
                 func.count(BikeRecord.id).label('sample_count')
-            ).group_by(
+            )
+            temp_correlation = self._filtered(temp_query, filters).group_by(
                 case(
                     (BikeRecord.temp < 0.3, 'Freddo'),
                     (BikeRecord.temp < 0.7, 'Mite'),
@@ -107,6 +165,532 @@ class BikeAnalytics:
             logging.error(f"Errore nell'analisi meteo: {str(e)}")
             raise
     
+    @cached_analysis
+    def get_seasonal_trends(self, filters=None):
+        """Trend stagionali per stagione e mese
+        
+        Se i filtri sono esprimibili come slice del cubo OLAP (tutti tranne il range
+        di date) la griglia stagione × mese viene letta dal cubo, aggiornato a ogni
+        caricamento, invece di scansionare la tabella.
+        """
+        try:
+            where = self._cube_where(filters)
+            if where is not None:
+                seasonal_data = [
+                    SimpleNamespace(
+                        season=row['season'], mnth=row['mnth'],
+                        avg_count=row['cnt']['avg'], total_count=row['cnt']['sum']
+                    )
+                    for row in cube_store.get().rollup(['season', 'mnth'], ['cnt'], where)
+                ]
+            else:
+                seasonal_data = BikeRecord.get_seasonal_trends(filters)
+            
+            if not seasonal_data:
+                return None
+            
+            data = self._process_seasonal_data(seasonal_data)
+            data['grid'] = self._seasonal_grid(data['monthly_trends'])
+            data['source'] = 'cube' if where is not None else 'database'
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nel recupero trend stagionali: {str(e)}")
+            raise
+    
+    @cached_analysis
+    def get_user_type_analysis(self, filters=None):
+        """Analisi utenti casuali vs registrati per ora e giorno della settimana
+        
+        Come per i trend stagionali, la griglia 24 × 7 viene letta dal cubo OLAP
+        quando i filtri non includono un range di date.
+        """
+        try:
+            where = self._cube_where(filters)
+            if where is not None:
+                user_type_data = [
+                    SimpleNamespace(
+                        hr=row['hr'], weekday=row['weekday'],
+                        avg_casual=row['casual']['avg'],
+                        avg_registered=row['registered']['avg'],
+                        avg_total=row['cnt']['avg']
+                    )
+                    for row in cube_store.get().rollup(['hr', 'weekday'], ['casual', 'registered', 'cnt'], where)
+                ]
+            else:
+                user_type_data = BikeRecord.get_user_type_analysis(filters)
+            
+            if not user_type_data:
+                return None
+            
+            data = self._process_user_type_data(user_type_data)
+            data['heatmap'] = self._user_type_heatmap(data['user_patterns'])
+            data['source'] = 'cube' if where is not None else 'database'
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nell'analisi tipi utenti: {str(e)}")
+            raise
+    
+    @cached_analysis
+    def get_dataset_statistics(self, filters=None):
+        """Statistiche complete del dataset"""
+        try:
+            stats = BikeRecord.get_dataset_statistics(filters)
+            
+            if not stats['total_records']:
+                return None
+            
+            return stats
+            
+        except Exception as e:
+            logging.error(f"Errore nel calcolo statistiche dataset: {str(e)}")
+            raise
+    
+    @cached_analysis
+    def get_quantile_distribution(self, dimension, quantiles=DEFAULT_QUANTILES):
+        """
+        Quantili di cnt per gruppo letti dagli sketch t-digest precalcolati
+        
+        Args:
+            dimension (str): 'hour', 'weekday' o 'weather'
+            quantiles (tuple): Quantili richiesti in [0, 1]
+            
+        Returns:
+            dict: Quantili per gruppo con errore di rango stimato, None se non ci sono dati
+        """
+        if dimension not in QuantileSketchBuilder.DIMENSIONS:
+            raise ValueError(f"Dimensione non supportata: {dimension}")
+        
+        try:
+            sketches = (QuantileSketch.query
+                        .filter_by(dimension=dimension)
+                        .order_by(QuantileSketch.group_value)
+                        .all())
+            
+            # Dati caricati prima dell'introduzione degli sketch: ricostruzione una tantum
+            if not sketches and db.session.query(BikeRecord.id).first():
+                logging.info("Sketch dei quantili assenti, ricostruzione dal database")
+                QuantileSketchBuilder().rebuild_from_database()
+                return self.get_quantile_distribution(dimension, quantiles)
+            
+            if not sketches:
+                return None
+            
+            return self._process_quantile_data(dimension, sketches, quantiles)
+            
+        except Exception as e:
+            logging.error(f"Errore nel calcolo dei quantili: {str(e)}")
+            raise
+    
+    @cached_analysis
+    def get_anomalies(self, filters=None, threshold=DEFAULT_THRESHOLD, direction='both', limit=100):
+        """
+        Ore con noleggi anomali rispetto al gruppo (hr, workingday, weathersit)
+        
+        Args:
+            filters (AnalyticsFilters, optional): Record da analizzare (es. range di date)
+            threshold (float): Soglia sullo z-score robusto in valore assoluto
+            direction (str): 'both', 'high' (picchi) o 'low' (cali)
+            limit (int): Numero massimo di anomalie restituite
+            
+        Returns:
+            dict: Anomalie ordinate per |z| e riepilogo, None se non ci sono dati
+        """
+        if direction not in ('both', 'high', 'low'):
+            raise ValueError(f"Direzione non supportata: {direction}")
+        
+        try:
+            start = time.perf_counter()
+            baseline = anomaly_store.get()
+            
+            if baseline.total_records == 0:
+                return None
+            
+            mask = filters.mask(baseline.records) if filters else None
+            data = baseline.detect(mask, threshold=threshold, direction=direction, limit=limit)
+            data['method'] = {
+                'baseline': 'median/MAD per hr × workingday × weathersit',
+                'z_score': '0.6745 · (cnt − mediana) / MAD',
+                'baseline_records': baseline.total_records
+            }
+            data['summary']['scan_ms'] = round((time.perf_counter() - start) * 1000, 2)
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nel rilevamento anomalie: {str(e)}")
+            raise
+    
+    @cached_analysis
+    def get_time_series(self, freq='day', window=None, filters=None):
+        """
+        Serie temporale di cnt ricampionata con somme/medie mobili e variazioni
+        
+        Le finestre mobili sono calcolate sull'intera serie (i primi periodi del range
+        richiesto usano la storia precedente), poi il risultato viene ristretto a start/end.
+        
+        Args:
+            freq (str): 'hour', 'day', 'week' o 'month'
+            window (int, optional): Ampiezza della finestra mobile in periodi
+            filters (AnalyticsFilters, optional): Solo start/end sono supportati
+            
+        Returns:
+            dict: Punti della serie e riepilogo, None se non ci sono dati
+        """
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Frequenza non supportata: {freq}. Valori ammessi: {', '.join(FREQUENCIES)}")
+        if filters and set(filters.to_dict()) - {'start', 'end'}:
+            raise ValueError("La serie temporale supporta solo i filtri 'start' e 'end'")
+        window = window or DEFAULT_WINDOWS[freq]
+        
+        try:
+            series = time_series_store.get().resampled[freq]
+            
+            if not len(series.totals):
+                return None
+            
+            rolling_sums = series.rolling_sums(window)
+            columns = {
+                'total_rentals': series.totals.tolist(),
+                'records': series.records.tolist(),
+                'rolling_sum': self._nullable(rolling_sums),
+                'rolling_avg': self._nullable(rolling_sums / window, digits=2)
+            }
+            for name, lag in DELTAS[freq].items():
+                delta, pct = series.deltas(lag)
+                columns[f'{name}_delta'] = self._nullable(delta)
+                columns[f'{name}_pct'] = self._nullable(pct, digits=2)
+            
+            # Periodi nel range richiesto (il periodo che contiene start è incluso)
+            selected = np.ones(len(series.labels), dtype=bool)
+            if filters and filters.start:
+                selected &= series.labels >= period_start(np.array([np.datetime64(filters.start, 'h')]), freq)[0]
+            if filters and filters.end:
+                # end è una data inclusa: tutte le ore del giorno finale
+                selected &= series.labels < np.datetime64(filters.end) + np.timedelta64(1, 'D')
+            
+            periods = np.datetime_as_string(series.labels, unit='m' if freq == 'hour' else 'D').tolist()
+            names = list(columns)
+            points = [
+                dict(zip(['period'] + names, [periods[i]] + [columns[name][i] for name in names]))
+                for i in np.flatnonzero(selected)
+            ]
+            
+            return {
+                'points': points,
+                'columns': ['period'] + names,
+                'summary': {
+                    'freq': freq,
+                    'window': window,
+                    'deltas': {name: lag for name, lag in DELTAS[freq].items()},
+                    'periods': len(points),
+                    'total_periods': int(len(series.labels)),
+                    'first_period': periods[0],
+                    'last_period': periods[-1]
+                }
+            }
+            
+        except Exception as e:
+            logging.error(f"Errore nel calcolo della serie temporale: {str(e)}")
+            raise
+    
+    def get_cube_rollup(self, dims, measures, where=None):
+        """
+        Roll-up del cubo OLAP precalcolato (nessun accesso alla tabella dei record)
+        
+        Args:
+            dims (list): Dimensioni da mantenere (es. ['season', 'hr'])
+            measures (list): Misure tra cnt, casual, registered
+            where (dict, optional): Slice {dimensione: [valori]}
+            
+        Returns:
+            dict: Celle del roll-up, None se il cubo è vuoto
+        """
+        try:
+            cube = cube_store.get()
+            
+            if cube.total_records == 0:
+                return None
+            
+            cells = cube.rollup(dims, measures, where)
+            
+            return {
+                'dimensions': list(dims),
+                'measures': list(measures),
+                'cells': cells,
+                'summary': {
+                    'total_cells': len(cells),
+                    'total_records': cube.total_records
+                }
+            }
+            
+        except ValueError:
+            raise
+        except Exception as e:
+            logging.error(f"Errore nel roll-up del cubo: {str(e)}")
+            raise
+    
+    def get_dashboard(self, app, filters=None, approx=False):
+        """
+        Calcola tutte le sezioni della dashboard in un'unica chiamata.
+        
+        Le query sono indipendenti, quindi ognuna gira su un thread separato con il
+        proprio app context: Flask-SQLAlchemy crea una sessione per contesto, quindi
+        ogni sezione legge su una connessione distinta del pool.
+        
+        Args:
+            app: Istanza Flask (serve per aprire un app context in ogni thread)
+            filters (AnalyticsFilters, optional): Filtri applicati a tutte le sezioni
+            approx (bool): Analisi orarie, weekday e meteo dal campione stratificato
+            
+        Returns:
+            dict: Sezioni della dashboard e tempi di calcolo in millisecondi,
+                  oppure None se il database è vuoto
+        """
+        sections = {
+            'hourly_patterns': partial(self.get_hourly_rental_patterns, filters, approx=approx),
+            'weekday_weekend': partial(self.get_weekday_weekend_comparison, filters, approx=approx),
+            'weather_impact': partial(self.get_weather_impact_analysis, filters, approx=approx),
+            'seasonal_trends': partial(self.get_seasonal_trends, filters),
+            'user_types': partial(self.get_user_type_analysis, filters),
+            'dataset_statistics': partial(self.get_dataset_statistics, filters)
+        }
+        
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=len(sections), thread_name_prefix='dashboard') as executor:
+                futures = {
+                    name: executor.submit(self._run_dashboard_section, app, section)
+                    for name, section in sections.items()
+                }
+                results = {name: future.result() for name, future in futures.items()}
+                
+        except Exception as e:
+            logging.error(f"Errore nel calcolo della dashboard: {str(e)}")
+            raise
+        
+        if any(data is None for data, _ in results.values()):
+            return None
+        
+        dashboard = {name: data for name, (data, _) in results.items()}
+        dashboard['timings_ms'] = {
+            'sections': {name: elapsed for name, (_, elapsed) in results.items()},
+            'total': round((time.perf_counter() - start) * 1000, 2)
+        }
+        return dashboard
+    
+    def _run_dashboard_section(self, app, section):
+        """Esegue una sezione della dashboard in un app context dedicato
+        
+        Returns:
+            tuple: (risultato della sezione, tempo impiegato in ms)
+        """
+        with app.app_context():
+            start = time.perf_counter()
+            data = section()
+            return data, round((time.perf_counter() - start) * 1000, 2)
+    
+    def _approx_hourly_patterns(self, filters):
+        """Pattern orari stimati dal campione stratificato"""
+        try:
+            sample, mask = self._approx_sample(filters)
+            estimates = sample.estimate('cnt', 'hr', mask)
+            
+            if estimates.empty:
+                return None
+            
+            hourly_data = [
+                SimpleNamespace(hour=int(hour), **self._estimated_row(row))
+                for hour, row in estimates.iterrows()
+            ]
+            data = self._process_hourly_data(hourly_data)
+            
+            for pattern in data['hourly_patterns']:
+                self._add_confidence_intervals(pattern, estimates.loc[pattern['hour']])
+            
+            data['approximation'] = self._approximation_info(sample, mask)
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nella stima dei pattern orari: {str(e)}")
+            raise
+    
+    def _approx_weekday_comparison(self, filters):
+        """Confronto weekday vs weekend stimato dal campione stratificato"""
+        try:
+            sample, mask = self._approx_sample(filters)
+            day_types = sample.records['weekday'].isin([0, 6]).map({True: 'Weekend', False: 'Weekday'})
+            comparison = sample.estimate('cnt', day_types, mask)
+            daily = sample.estimate('cnt', 'weekday', mask)
+            
+            if comparison.empty or daily.empty:
+                return None
+            
+            weekday_weekend_data = [
+                SimpleNamespace(day_type=day_type, **self._estimated_row(row))
+                for day_type, row in comparison.iterrows()
+            ]
+            daily_breakdown = [
+                SimpleNamespace(weekday=int(weekday), **self._estimated_row(row))
+                for weekday, row in daily.iterrows()
+            ]
+            data = self._process_weekday_data(weekday_weekend_data, daily_breakdown)
+            
+            for day_type, stats in data['comparison'].items():
+                self._add_confidence_intervals(stats, comparison.loc[day_type])
+            for stats in data['daily_breakdown']:
+                self._add_confidence_intervals(stats, daily.loc[stats['weekday']])
+            
+            data['approximation'] = self._approximation_info(sample, mask)
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nella stima weekday vs weekend: {str(e)}")
+            raise
+    
+    def _approx_weather_impact(self, filters):
+        """Impatto meteo stimato dal campione stratificato"""
+        try:
+            sample, mask = self._approx_sample(filters)
+            weather = sample.estimate('cnt', 'weathersit', mask)
+            
+            if weather.empty:
+                return None
+            
+            conditions = {
+                column: sample.estimate(column, 'weathersit', mask)['mean']
+                for column in ('temp', 'hum', 'windspeed')
+            }
+            temp = sample.records['temp']
+            temp_categories = pd.Series(
+                np.select([temp < 0.3, temp < 0.7], ['Freddo', 'Mite'], 'Caldo'),
+                index=temp.index
+            )
+            temperature = sample.estimate('cnt', temp_categories, mask)
+            
+            weather_impact_data = [
+                SimpleNamespace(
+                    weather_condition=int(code),
+                    avg_temp=conditions['temp'][code],
+                    avg_humidity=conditions['hum'][code],
+                    avg_windspeed=conditions['windspeed'][code],
+                    **self._estimated_row(row)
+                )
+                for code, row in weather.iterrows()
+            ]
+            temp_correlation = [
+                SimpleNamespace(temp_category=category, **self._estimated_row(row))
+                for category, row in temperature.iterrows()
+            ]
+            data = self._process_weather_data(weather_impact_data, temp_correlation)
+            
+            for stats in data['weather_conditions']:
+                self._add_confidence_intervals(stats, weather.loc[stats['weather_code']])
+            for stats in data['temperature_impact']:
+                self._add_confidence_intervals(stats, temperature.loc[stats['temperature_category']])
+            
+            data['approximation'] = self._approximation_info(sample, mask)
+            return data
+            
+        except Exception as e:
+            logging.error(f"Errore nella stima dell'impatto meteo: {str(e)}")
+            raise
+    
+    def _approx_sample(self, filters):
+        """Campione stratificato corrente e maschera dei filtri"""
+        sample = sample_store.get()
+        mask = filters.mask(sample.records) if filters else None
+        return sample, mask
+    
+    def _estimated_row(self, estimate):
+        """Campi di una riga aggregata ricostruiti dalle stime del campione"""
+        return {
+            'avg_rentals': estimate['mean'],
+            'max_rentals': int(estimate['max']),
+            'min_rentals': int(estimate['min']),
+            'sample_count': int(round(estimate['count'])),
+            'total_rentals': int(round(estimate['total']))
+        }
+    
+    def _add_confidence_intervals(self, stats, estimate):
+        """Aggiunge gli intervalli di confidenza al 95% a una riga processata"""
+        stats['avg_rentals_ci'] = [round(bound, 2) for bound in estimate['mean_ci']]
+        if 'total_rentals' in stats:
+            stats['total_rentals_ci'] = [int(round(bound)) for bound in estimate['total_ci']]
+    
+    def _approximation_info(self, sample, mask):
+        """Descrizione della stima approssimata"""
+        return {
+            'method': 'stratified_sample',
+            'strata': list(StratifiedSampleBuilder.STRATA),
+            'confidence_level': 0.95,
+            'z_score': round(Z_95, 4),
+            'sample_size': sample.sample_size,
+            'sample_rows_used': mask.sum() if mask is not None else sample.sample_size,
+            'population': sample.population,
+            'note': 'min/max sono gli estremi osservati nel campione'
+        }
+    
+    def _cube_where(self, filters):
+        """
+        Slice del cubo OLAP equivalenti ai filtri
+        
+        Returns:
+            dict: {dimensione: [valori]} (vuoto senza filtri), oppure None se i filtri
+                  includono un range di date, che il cubo non può rappresentare
+        """
+        if not filters:
+            return {}
+        if filters.start or filters.end:
+            return None
+        
+        where = {}
+        for name in ('season', 'workingday', 'weathersit'):
+            values = getattr(filters, name)
+            if values:
+                where[name] = list(values)
+        if filters.hour_from is not None or filters.hour_to is not None:
+            first = filters.hour_from if filters.hour_from is not None else 0
+            last = filters.hour_to if filters.hour_to is not None else 23
+            where['hr'] = list(range(first, last + 1))
+        return where
+    
+    def _user_type_heatmap(self, user_patterns):
+        """Griglia ora × giorno della settimana delle medie (None per le celle vuote)"""
+        heatmap = {
+            'hours': list(range(24)),
+            'weekdays': list(self.DAY_NAMES),
+            'weekday_names': list(self.DAY_NAMES.values())
+        }
+        for measure in ('avg_casual', 'avg_registered', 'avg_total'):
+            heatmap[measure] = [[None] * 7 for _ in range(24)]
+        for pattern in user_patterns:
+            for measure in ('avg_casual', 'avg_registered', 'avg_total'):
+                heatmap[measure][pattern['hour']][pattern['weekday']] = pattern[measure]
+        return heatmap
+    
+    def _seasonal_grid(self, monthly_trends):
+        """Griglia stagione × mese di media e totale noleggi (None per le celle vuote)"""
+        grid = {
+            'seasons': [1, 2, 3, 4],
+            'months': list(range(1, 13)),
+            'avg_rentals': [[None] * 12 for _ in range(4)],
+            'total_rentals': [[None] * 12 for _ in range(4)]
+        }
+        for trend in monthly_trends:
+            grid['avg_rentals'][trend['season'] - 1][trend['month'] - 1] = trend['avg_rentals']
+            grid['total_rentals'][trend['season'] - 1][trend['month'] - 1] = trend['total_rentals']
+        return grid
+    
+    def _nullable(self, values, digits=None):
+        """Lista serializzabile di un array float: None al posto di NaN, interi senza digits"""
+        values = np.round(values, digits) if digits is not None else values
+        return [None if value != value else (value if digits is not None else int(value)) for value in values.tolist()]
+    
+    def _filtered(self, query, filters):
+        """Applica i filtri opzionali a una query di analisi"""
+        return filters.apply(query) if filters else query
+    
     def _process_hourly_data(self, hourly_data):
         """Processa dati orari e calcola statistiche"""
         hourly_patterns = []
@@ -151,10 +735,7 @@ class BikeAnalytics:
     
     def _process_weekday_data(self, weekday_weekend_data, daily_breakdown):
         """Processa dati weekday vs weekend"""
-        day_names = {
-            0: 'DOM', 1: 'LUN', 2: 'MAR', 3: 'MER',
-            4: 'GIO', 5: 'VEN', 6: 'SAB'
-        }
+        day_names = self.DAY_NAMES
         
         # Processa dati principali
         comparison_data = {}
@@ -203,12 +784,7 @@ class BikeAnalytics:
     
     def _process_weather_data(self, weather_impact_data, temp_correlation):
         """Processa dati impatto meteo"""
-        weather_conditions = {
-            1: 'Sereno/Poche nuvole',
-            2: 'Nebbia/Nuvoloso', 
-            3: 'Neve/Pioggia leggera',
-            4: 'Pioggia/Neve intensa'
-        }
+        weather_conditions = self.WEATHER_CONDITIONS
         
         weather_stats = []
         best_weather = None
@@ -259,4 +835,97 @@ class BikeAnalytics:
                 'weather_impact_percentage': weather_impact_percentage,
                 'total_weather_conditions': len(weather_stats)
             }
-        }
\ No newline at end of file
+        }
+    
+    def _process_seasonal_data(self, seasonal_data):
+        """Processa trend stagionali"""
+        season_names = {1: 'Primavera', 2: 'Estate', 3: 'Autunno', 4: 'Inverno'}
+        
+        monthly_trends = []
+        for row in seasonal_data:
+            monthly_trends.append({
+                'season': row.season,
+                'season_name': season_names.get(row.season, 'Sconosciuta'),
+                'month': row.mnth,
+                'avg_rentals': round(row.avg_count, 2),
+                'total_rentals': row.total_count
+            })
+        
+        best_month = max(monthly_trends, key=lambda x: x['avg_rentals'])
+        worst_month = min(monthly_trends, key=lambda x: x['avg_rentals'])
+        
+        return {
+            'monthly_trends': monthly_trends,
+            'summary': {
+                'best_month': best_month,
+                'worst_month': worst_month,
+                'total_periods_analyzed': len(monthly_trends)
+            }
+        }
+    
+    def _process_user_type_data(self, user_type_data):
+        """Processa analisi utenti casuali vs registrati"""
+        user_patterns = []
+        for row in sorted(user_type_data, key=lambda r: (r.weekday, r.hr)):
+            user_patterns.append({
+                'hour': row.hr,
+                'weekday': row.weekday,
+                'avg_casual': round(row.avg_casual, 2),
+                'avg_registered': round(row.avg_registered, 2),
+                'avg_total': round(row.avg_total, 2)
+            })
+        
+        total_casual = sum(p['avg_casual'] for p in user_patterns)
+        total_registered = sum(p['avg_registered'] for p in user_patterns)
+        total = total_casual + total_registered
+        
+        return {
+            'user_patterns': user_patterns,
+            'summary': {
+                'casual_share': round(total_casual / total * 100, 2) if total else 0,
+                'registered_share': round(total_registered / total * 100, 2) if total else 0,
+                'peak_casual': max(user_patterns, key=lambda x: x['avg_casual']),
+                'peak_registered': max(user_patterns, key=lambda x: x['avg_registered']),
+                'total_slots_analyzed': len(user_patterns)
+            }
+        }
+    
+    def _process_quantile_data(self, dimension, sketches, quantiles):
+        """Processa gli sketch dei quantili"""
+        labels = {
+            'hour': lambda value: f'{value:02d}:00',
+            'weekday': lambda value: self.DAY_NAMES.get(value, 'N/A'),
+            'weather': lambda value: self.WEATHER_CONDITIONS.get(value, 'Sconosciuto')
+        }[dimension]
+        
+        groups = []
+        for sketch in sketches:
+            digest = sketch.digest
+            values = digest.quantiles(quantiles)
+            groups.append({
+                'group': sketch.group_value,
+                'label': labels(sketch.group_value),
+                'sample_count': digest.count,
+                'min_rentals': digest.min,
+                'max_rentals': digest.max,
+                'quantiles': {
+                    f'p{round(q * 100, 1):g}': round(value, 2)
+                    for q, value in zip(quantiles, values)
+                }
+            })
+        
+        error_bounds = sketches[0].digest.rank_error_bound(quantiles)
+        
+        return {
+            'dimension': dimension,
+            'groups': groups,
+            'summary': {
+                'total_groups': len(groups),
+                'sketch': 't-digest',
+                'compression': sketches[0].digest.compression,
+                'rank_error_bound': {
+                    f'p{round(q * 100, 1):g}': round(bound, 4)
+                    for q, bound in zip(quantiles, error_bounds)
+                }
+            }
+        }
@@ -5,6 +5,11 @@ import pandas as pd
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
 from . import db, BikeRecord 
+from .quantile_sketch import QuantileSketchBuilder
+from .analytics_cube import CubeBuilder
+from .stratified_sample import StratifiedSampleBuilder
+from .time_series import TimeSeriesBuilder
+from .dataset_version import bump_dataset_version
 
 class BikeDataLoader:
     """Gestisce il caricamento dei dati nella tabella unificata"""
@@ -13,14 +18,21 @@ class BikeDataLoader:
         self.total_records = 0
         self.success_count = 0
         self.error_count = 0
+        
+        # Aggregati mantenuti durante il caricamento (start/update/finalize):
+        # quelli salvati su database e quelli in memoria pubblicati per versione del dataset
+        self.stored_aggregators = [QuantileSketchBuilder(), StratifiedSampleBuilder()]
+        self.versioned_aggregators = [CubeBuilder(), TimeSeriesBuilder()]
+        self.aggregators = self.stored_aggregators + self.versioned_aggregators
     
-    def load_from_file_object(self, file_obj, batch_size=1000):
+    def load_from_file_object(self, file_obj, batch_size=1000, append=False):
         """
         Carica i dati da un file object (per upload Flask)
         
         Args:
             file_obj: File object da Flask request.files
             batch_size: Numero di record per batch
+            append: Se True aggiunge i record a quelli esistenti invece di sostituirli
         """
         print(f"📊 Inizio caricamento dati da file upload: {file_obj.filename}")
         
@@ -31,10 +43,14 @@ class BikeDataLoader:
             print(f"📈 Record trovati: {self.total_records}")
             
             # Pulisci tabella esistente
-            self._clear_existing_data()
+            if not append:
+                self._clear_existing_data()
             
-            # Carica dati in batch
+            # Carica dati in batch aggiornando gli aggregati
+            self._start_aggregators(append)
             self._load_in_batches(df, batch_size)
+            self._finalize_aggregators()
+            self._analyze_tables()
 
             print(f"📊 Caricamento completato: {self.success_count} successi, {self.error_count} errori")
 
@@ -103,6 +119,10 @@ class BikeDataLoader:
             db.session.commit()
             self.success_count += len(records)
             
+            # Aggiorna gli aggregati solo con i record salvati
+            if records:
+                self._update_aggregators(records)
+            
             print(f"✅ Batch {start_index//1000 + 1}: {len(records)} record salvati")
             
         except IntegrityError as e:
@@ -116,6 +136,46 @@ class BikeDataLoader:
             self.error_count += len(batch)
             print(f"❌ Errore nel batch {start_index//1000 + 1}: {str(e)}")
     
+    def _start_aggregators(self, append):
+        """Inizializza gli aggregati calcolati durante il caricamento"""
+        for aggregator in self.aggregators:
+            aggregator.start(append)
+    
+    def _update_aggregators(self, records):
+        """Aggiorna gli aggregati con un batch di record salvati"""
+        columns = [column.name for column in BikeRecord.__table__.columns if column.name != 'id']
+        frame = pd.DataFrame(
+            [[getattr(record, column) for column in columns] for record in records],
+            columns=columns
+        )
+        
+        for aggregator in self.aggregators:
+            aggregator.update(frame)
+    
+    def _finalize_aggregators(self):
+        """Persiste gli aggregati al termine del caricamento"""
+        # Prima salva gli aggregati su database: un processo che legge la nuova versione
+        # deve trovare sketch e campione già aggiornati
+        for aggregator in self.stored_aggregators:
+            aggregator.finalize()
+        
+        # Nuova versione del dataset: invalida gli aggregati in memoria degli altri processi
+        version = bump_dataset_version()
+        
+        for aggregator in self.versioned_aggregators:
+            aggregator.finalize(version)
+    
+    def _analyze_tables(self):
+        """
+        Aggiorna le statistiche del query planner (ANALYZE)
+        
+        Senza statistiche SQLite sceglie sempre l'indice del filtro anche quando è poco
+        selettivo (es. weathersit=1,2) e poi ordina tutte le righe per instant, invece di
+        scorrere l'indice su instant: la paginazione di /api/data/records ne risente.
+        """
+        db.session.execute(db.text('ANALYZE bike_records'))
+        db.session.commit()
+    
     def _create_bike_record(self, row):
         """Crea un record BikeRecord dai dati CSV
         
@@ -0,0 +1,80 @@
+"""
+Versione del dataset caricato
+
+La versione cambia a ogni caricamento (/api/data/load) ed è salvata in un file
+nella cartella instance dell'app: tutti i processi la leggono senza interrogare
+il database e la usano per invalidare gli aggregati tenuti in memoria.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+
+VERSION_FILENAME = 'dataset.version'
+
+# Versione usata finché non viene fatto il primo caricamento
+INITIAL_VERSION = '0'
+
+_lock = threading.Lock()
+_cached = {'stat_key': None, 'version': INITIAL_VERSION}
+
+
+def _version_path():
+    """Percorso del file di versione nella cartella instance"""
+    return os.path.join(current_app.instance_path, VERSION_FILENAME)
+
+
+def get_dataset_version():
+    """
+    Restituisce la versione corrente del dataset
+
+    Il contenuto del file viene riletto solo quando cambiano inode o mtime
+    (ogni bump sostituisce il file), quindi il costo per chiamata è una stat().
+    """
+    path = _version_path()
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return INITIAL_VERSION
+
+    stat_key = (stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        if _cached['stat_key'] != stat_key:
+            with open(path) as f:
+                _cached['version'] = f.read().strip() or INITIAL_VERSION
+            _cached['stat_key'] = stat_key
+        return _cached['version']
+
+
+def get_dataset_modified():
+    """
+    Istante dell'ultimo cambio di versione del dataset (mtime del file di versione)
+
+    Returns:
+        datetime: Data UTC dell'ultimo caricamento, None se non è mai stato fatto
+    """
+    try:
+        mtime = os.stat(_version_path()).st_mtime
+    except FileNotFoundError:
+        return None
+    return datetime.fromtimestamp(mtime, tz=timezone.utc)
+
+
+def bump_dataset_version():
+    """
+    Genera e salva una nuova versione del dataset
+
+    Returns:
+        str: Nuova versione
+    """
+    path = _version_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    version = f'{time.time_ns():x}'
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+
+    return version
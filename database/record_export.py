@@ -0,0 +1,117 @@
+"""
+Export completo di bike_records in Parquet / Arrow IPC
+
+La tabella viene letta da un cursore lato server a gruppi di righe (yield_per):
+ogni gruppo diventa un row group Parquet o un record batch Arrow e i byte
+prodotti vengono restituiti subito, quindi la memoria resta limitata a un
+gruppo di righe qualunque sia la dimensione della tabella.
+
+pyarrow è una dipendenza opzionale: senza di essa restano disponibili gli
+export testuali (csv.gz).
+"""
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    pa = None
+    pq = None
+
+from . import db
+from .record_query import RECORD_TABLE, records_statement
+
+# Righe per row group / record batch
+DEFAULT_ROW_GROUP_SIZE = 50000
+
+ARROW_FORMATS = ('parquet', 'arrow')
+
+
+def arrow_available():
+    """True se pyarrow è installato"""
+    return pa is not None
+
+
+def iter_record_groups(columns, filters=None, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Legge i record a gruppi da un cursore lato server
+
+    Yields:
+        list: Righe Core (al massimo row_group_size per gruppo)
+    """
+    statement = records_statement(columns, filters).execution_options(yield_per=row_group_size)
+    for partition in db.session.execute(statement).partitions():
+        yield partition
+
+
+def arrow_schema(columns):
+    """Schema Arrow delle colonne richieste, derivato dai tipi della tabella"""
+    types = {int: pa.int64(), float: pa.float64()}
+    fields = []
+    for name in columns:
+        python_type = RECORD_TABLE.c[name].type.python_type
+        fields.append(pa.field(name, types.get(python_type, pa.date32()), nullable=False))
+    return pa.schema(fields)
+
+
+class _ChunkSink(io.RawIOBase):
+    """File di destinazione per i writer pyarrow: accumula i byte fino al drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def encode_arrow(groups, columns, export_format):
+    """
+    Serializza i gruppi di righe in Parquet o Arrow IPC (stream format)
+
+    Args:
+        groups: Iterabile di liste di righe (vedi iter_record_groups)
+        columns (list): Colonne, nell'ordine delle righe
+        export_format (str): 'parquet' o 'arrow'
+
+    Yields:
+        bytes: Porzioni del file prodotte dopo ogni gruppo
+    """
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        for rows in groups:
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            if export_format == 'parquet':
+                # Un row group per gruppo letto dal cursore
+                writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(rows))
+            else:
+                writer.write_batch(batch)
+
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+
+    data = sink.drain()
+    if data:
+        yield data
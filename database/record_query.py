@@ -0,0 +1,77 @@
+"""
+Lettura dei record grezzi di bike_records con proiezione delle colonne
+
+Le query sono costruite in SQLAlchemy Core sulla tabella (senza istanziare
+oggetti BikeRecord) e ordinate per `instant`, che è univoco e indicizzato:
+la paginazione keyset (`instant > after`) costa come la prima pagina a
+qualsiasi profondità.
+"""
+from datetime import date
+from sqlalchemy import select
+
+from .bike_record import BikeRecord
+from .analytics_filters import InvalidFilterError
+
+RECORD_TABLE = BikeRecord.__table__
+
+# Colonne del dataset originale (senza la chiave tecnica id)
+RECORD_COLUMNS = [column.name for column in RECORD_TABLE.columns if column.name != 'id']
+
+
+def parse_columns(value):
+    """
+    Parsing della proiezione richiesta (?columns=dteday,hr,cnt)
+
+    Args:
+        value (str): Colonne separate da virgola (vuoto = tutte)
+
+    Returns:
+        list: Colonne valide nell'ordine richiesto
+    """
+    if not value:
+        return list(RECORD_COLUMNS)
+
+    columns = []
+    for name in (v.strip() for v in value.split(',')):
+        if name and name not in columns:
+            columns.append(name)
+
+    unknown = [name for name in columns if name not in RECORD_COLUMNS]
+    if unknown:
+        raise InvalidFilterError(f"Colonne non valide: {unknown}. Disponibili: {', '.join(RECORD_COLUMNS)}")
+    return columns or list(RECORD_COLUMNS)
+
+
+def records_statement(columns, filters=None, after=None, limit=None):
+    """
+    SELECT delle colonne richieste ordinata per instant
+
+    Args:
+        columns (list): Colonne da proiettare
+        filters (AnalyticsFilters, optional): Filtri su date, ore, stagione, meteo
+        after (int, optional): Cursore keyset, restituisce solo instant > after
+        limit (int, optional): Numero massimo di righe
+
+    Returns:
+        Select: Statement Core da eseguire con db.session.execute()
+    """
+    statement = select(*[RECORD_TABLE.c[name] for name in columns])
+
+    conditions = filters.conditions(RECORD_TABLE) if filters else []
+    if after is not None:
+        conditions.append(RECORD_TABLE.c.instant > after)
+    if conditions:
+        statement = statement.where(*conditions)
+
+    statement = statement.order_by(RECORD_TABLE.c.instant)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+def row_to_dict(columns, row):
+    """Riga Core -> dizionario serializzabile (date in formato ISO)"""
+    return {
+        name: value.isoformat() if isinstance(value, date) else value
+        for name, value in zip(columns, row)
+    }
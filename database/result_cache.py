@@ -0,0 +1,104 @@
+"""
+Cache dei risultati delle analisi per versione del dataset
+
+I risultati vengono memorizzati per (metodo, parametri) e sono validi finché non
+cambia la versione del dataset: il primo accesso dopo un nuovo caricamento svuota
+la cache. I risultati sono condivisi tra le richieste e non vanno modificati.
+"""
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+
+from .dataset_version import get_dataset_version
+
+
+class VersionedResultCache:
+    """Cache LRU dei risultati valida per una sola versione del dataset"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get_or_compute(self, key, compute):
+        """
+        Restituisce il risultato in cache o lo calcola e lo memorizza
+
+        Args:
+            key (tuple): Chiave del risultato (metodo + parametri normalizzati)
+            compute (callable): Calcolo del risultato; None non viene memorizzato
+
+        Returns:
+            Risultato del calcolo
+        """
+        version = get_dataset_version()
+        with self._lock:
+            if self._version != version:
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return self._entries[key]
+            self._stats['misses'] += 1
+
+        result = compute()
+
+        with self._lock:
+            # Se nel frattempo è cambiata la versione il risultato non è più valido
+            if result is not None and self._version == version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Svuota la cache"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Dimensione della cache e conteggio di hit/miss"""
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), dataset_version=self._version)
+
+
+analysis_cache = VersionedResultCache()
+
+
+def _normalize(value):
+    """Valore di un parametro utilizzabile in una chiave di cache"""
+    if hasattr(value, 'to_dict'):
+        # Filtri: nessun filtro attivo equivale a None
+        items = value.to_dict()
+        return tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in items.items())) or None
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize(v)) for k, v in value.items()))
+    return value
+
+
+def cached_analysis(method):
+    """
+    Decoratore per i metodi di BikeAnalytics il cui risultato dipende solo dai parametri
+
+    La chiave usa i parametri con i default applicati, quindi get_x() e
+    get_x(filters=None, approx=False) condividono lo stesso risultato.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = (method.__name__,) + tuple(
+            (name, _normalize(value)) for name, value in bound.arguments.items() if name != 'self'
+        )
+        return analysis_cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,193 @@
+"""
+Coalescenza delle computazioni concorrenti (singleflight)
+
+Quando più richieste concorrenti chiedono la stessa computazione (stessa chiave),
+solo la prima la esegue; le altre attendono e ricevono lo stesso risultato (o la
+stessa eccezione). Serve soprattutto a cache fredde (avvio, nuovo caricamento),
+quando decine di richieste identiche partirebbero insieme sullo stesso scan SQLite.
+
+Tra processi diversi (più worker) la coalescenza è opzionale e usa un lock su file
+(fcntl): il processo che ottiene il lock calcola e salva il risultato su disco, gli
+altri in attesa lo rileggono se è stato prodotto dopo l'inizio della loro attesa.
+I file servono solo a chi attende durante il calcolo: quelli più vecchi di
+STALE_FILE_SECONDS (chiavi di versioni precedenti del dataset o di parametri non
+più richiesti) vengono rimossi periodicamente.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non disponibile su Windows
+    fcntl = None
+
+# Età oltre la quale lock e risultati su file vengono rimossi: chi attende il lock
+# rilegge il risultato appena il lock viene rilasciato
+STALE_FILE_SECONDS = 300
+
+# Intervallo minimo tra due pulizie della cartella dei lock
+CLEANUP_INTERVAL_SECONDS = 60
+
+
+class _Call:
+    """Computazione in corso per una chiave"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Gruppo di computazioni coalescenti per chiave"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'executed': 0, 'shared': 0, 'shared_across_processes': 0, 'files_removed': 0}
+        self._last_cleanup = 0.0
+
+    def do(self, key, function, lock_dir=None):
+        """
+        Esegue function una sola volta per le chiamate concorrenti con la stessa chiave
+
+        Args:
+            key (str): Chiave della computazione (es. endpoint + parametri + versione dataset)
+            function (callable): Computazione senza argomenti
+            lock_dir (str, optional): Cartella dei lock su file per coalescere anche tra processi
+
+        Returns:
+            Risultato di function (condiviso tra i chiamanti concorrenti)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            with self._lock:
+                self._stats['shared'] += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if lock_dir and fcntl is not None:
+                call.result = self._do_across_processes(key, function, lock_dir)
+                self._cleanup(lock_dir)
+            else:
+                call.result = function()
+                with self._lock:
+                    self._stats['executed'] += 1
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def _do_across_processes(self, key, function, lock_dir):
+        """Esegue function sotto lock su file, riusando il risultato di un altro processo"""
+        os.makedirs(lock_dir, exist_ok=True)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        lock_path = os.path.join(lock_dir, f'{digest}.lock')
+        result_path = os.path.join(lock_dir, f'{digest}.result')
+
+        started = time.time()
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Un altro processo ha completato la stessa computazione mentre attendevamo
+                shared = self._read_result(result_path, key, started)
+                if shared is not None:
+                    with self._lock:
+                        self._stats['shared_across_processes'] += 1
+                    return shared[0]
+
+                result = function()
+                with self._lock:
+                    self._stats['executed'] += 1
+                self._write_result(result_path, key, result)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _cleanup(self, lock_dir):
+        """
+        Rimuove lock e risultati più vecchi di STALE_FILE_SECONDS (al massimo ogni CLEANUP_INTERVAL_SECONDS)
+
+        Un lock viene rimosso solo se nessun processo lo detiene. Un processo che
+        lo ha appena aperto senza ancora bloccarlo ne creerà uno nuovo: nel caso
+        peggiore la stessa chiave viene calcolata due volte, senza errori.
+        """
+        now = time.time()
+        with self._lock:
+            if now - self._last_cleanup < CLEANUP_INTERVAL_SECONDS:
+                return
+            self._last_cleanup = now
+
+        removed = 0
+        try:
+            entries = list(os.scandir(lock_dir))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            try:
+                if now - entry.stat().st_mtime < STALE_FILE_SECONDS:
+                    continue
+                if entry.name.endswith('.lock'):
+                    with open(entry.path, 'a') as lock_file:
+                        try:
+                            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        except BlockingIOError:
+                            continue
+                        os.remove(entry.path)
+                else:
+                    os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                # Già rimosso da un altro processo
+                continue
+        if removed:
+            with self._lock:
+                self._stats['files_removed'] += removed
+
+    @staticmethod
+    def _read_result(path, key, started):
+        """Risultato salvato da un altro processo dopo l'istante started, altrimenti None"""
+        try:
+            with open(path, 'rb') as f:
+                finished, stored_key, result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if stored_key != key or finished < started:
+            return None
+        return (result,)
+
+    @staticmethod
+    def _write_result(path, key, result):
+        """Salva il risultato per i processi in attesa (scrittura atomica)"""
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((time.time(), key, result), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            # Risultato non serializzabile: gli altri processi lo ricalcoleranno
+            logging.warning(f"Singleflight: risultato non condivisibile tra processi ({e})")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def stats(self):
+        """Contatori di computazioni eseguite e risultati condivisi"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
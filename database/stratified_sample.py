@@ -0,0 +1,297 @@
+"""
+Campione stratificato di bike_records per le analisi approssimate
+
+Il campione è un reservoir per ogni strato (hr × weathersit), aggiornato batch per
+batch durante il caricamento dei dati: in modalità append vengono riscritti solo gli
+slot sostituiti. Le stime usano i pesi N_h/n_h dello strato e riportano intervalli
+di confidenza al 95% (stimatore di dominio per i totali, rapporto per le medie).
+"""
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from database import db
+from .dataset_version import get_dataset_version
+from .singleflight import SingleFlight
+
+# Quantile normale per intervalli di confidenza al 95%
+Z_95 = 1.959963984540054
+
+SAMPLE_COLUMNS = [
+    'instant', 'dteday', 'season', 'yr', 'mnth', 'hr', 'holiday', 'weekday',
+    'workingday', 'weathersit', 'temp', 'atemp', 'hum', 'windspeed',
+    'casual', 'registered', 'cnt'
+]
+
+
+class SampleStratum(db.Model):
+    """Popolazione e riempimento del reservoir di uno strato (hr × weathersit)"""
+    __tablename__ = 'sample_strata'
+
+    hr = db.Column(db.Integer, primary_key=True)
+    weathersit = db.Column(db.Integer, primary_key=True)
+    population = db.Column(db.Integer, nullable=False, default=0)  # N_h: record visti nello strato
+    sampled = db.Column(db.Integer, nullable=False, default=0)     # n_h: slot occupati nel reservoir
+
+
+class BikeRecordSample(db.Model):
+    """Record del campione stratificato (uno per slot del reservoir)"""
+    __tablename__ = 'bike_record_samples'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    slot = db.Column(db.Integer, nullable=False)
+
+    instant = db.Column(db.Integer, nullable=False)
+    dteday = db.Column(db.Date, nullable=False)
+    season = db.Column(db.Integer, nullable=False)
+    yr = db.Column(db.Integer, nullable=False)
+    mnth = db.Column(db.Integer, nullable=False)
+    hr = db.Column(db.Integer, nullable=False)
+    holiday = db.Column(db.Integer, nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)
+    workingday = db.Column(db.Integer, nullable=False)
+    weathersit = db.Column(db.Integer, nullable=False)
+    temp = db.Column(db.Float, nullable=False)
+    atemp = db.Column(db.Float, nullable=False)
+    hum = db.Column(db.Float, nullable=False)
+    windspeed = db.Column(db.Float, nullable=False)
+    casual = db.Column(db.Integer, nullable=False)
+    registered = db.Column(db.Integer, nullable=False)
+    cnt = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('hr', 'weathersit', 'slot', name='uq_bike_record_sample_slot'),
+    )
+
+
+class StratifiedSampleBuilder:
+    """
+    Mantiene il reservoir di ogni strato durante il caricamento (start/update/finalize)
+
+    Per ogni strato si applica l'algoritmo R: il t-esimo record visto entra nel
+    reservoir con probabilità k/t sostituendo uno slot a caso. Le decisioni di un
+    batch sono vettorizzate; tra più record assegnati allo stesso slot vince l'ultimo,
+    come nell'esecuzione sequenziale.
+    """
+
+    STRATA = ('hr', 'weathersit')
+
+    # Slot del reservoir per strato (24 × 4 strati)
+    RESERVOIR_SIZE = 500
+
+    def __init__(self, reservoir_size=RESERVOIR_SIZE, seed=None):
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(seed)
+        self.population = {}
+        self.sampled = {}
+        self.changes = {}
+        self.replace_all = True
+
+    def start(self, append=False):
+        """Riparte dallo stato salvato degli strati in modalità append"""
+        self.population, self.sampled, self.changes = {}, {}, {}
+        self.replace_all = not append
+        if append:
+            for stratum in SampleStratum.query.all():
+                key = (stratum.hr, stratum.weathersit)
+                self.population[key] = stratum.population
+                self.sampled[key] = stratum.sampled
+
+    def update(self, frame):
+        """Aggiorna i reservoir con un batch di record salvati"""
+        frame = frame[SAMPLE_COLUMNS]
+        for key, group in frame.groupby(list(self.STRATA), sort=False):
+            key = tuple(int(k) for k in key)
+            seen = self.population.get(key, 0)
+            filled = self.sampled.get(key, 0)
+            size = len(group)
+
+            # Fase di riempimento: i primi k record entrano direttamente
+            free = max(0, min(self.reservoir_size - filled, size))
+            accepted = {filled + offset: offset for offset in range(free)}
+
+            # Fase di sostituzione: il record t-esimo entra con probabilità k/t
+            remaining = size - free
+            if remaining:
+                positions = seen + free + np.arange(1, remaining + 1)
+                slots = (self.rng.random(remaining) * positions).astype(np.int64)
+                for index in np.nonzero(slots < self.reservoir_size)[0]:
+                    accepted[int(slots[index])] = free + int(index)
+
+            # Solo i record entrati nel reservoir vengono convertiti
+            rows = group.iloc[list(accepted.values())].to_dict('records')
+            for slot, row in zip(accepted, rows):
+                self.changes[key + (slot,)] = row
+
+            self.population[key] = seen + size
+            self.sampled[key] = filled + free
+
+    def finalize(self):
+        """Salva gli slot modificati e lo stato degli strati"""
+        try:
+            if self.replace_all:
+                BikeRecordSample.query.delete()
+                SampleStratum.query.delete()
+            elif self.changes:
+                # Rimuove solo gli slot sostituiti, a gruppi per strato
+                by_stratum = {}
+                for hr, weathersit, slot in self.changes:
+                    by_stratum.setdefault((hr, weathersit), []).append(slot)
+                for (hr, weathersit), slots in by_stratum.items():
+                    BikeRecordSample.query.filter(
+                        BikeRecordSample.hr == hr,
+                        BikeRecordSample.weathersit == weathersit,
+                        BikeRecordSample.slot.in_(slots)
+                    ).delete(synchronize_session=False)
+
+            db.session.bulk_insert_mappings(BikeRecordSample, [
+                dict(row, slot=slot) for (_, _, slot), row in self.changes.items()
+            ])
+            for (hr, weathersit), population in self.population.items():
+                db.session.merge(SampleStratum(
+                    hr=hr, weathersit=weathersit,
+                    population=population, sampled=self.sampled[(hr, weathersit)]
+                ))
+            db.session.commit()
+            print(f"🎯 Campione stratificato aggiornato: {len(self.changes)} slot modificati")
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def rebuild_from_database(self, chunk_size=50000):
+        """Ricostruisce il campione leggendo bike_records a blocchi"""
+        from .bike_record import BikeRecord
+
+        self.start()
+        statement = select(*[getattr(BikeRecord, c) for c in SAMPLE_COLUMNS]).execution_options(yield_per=chunk_size)
+        for partition in db.session.execute(statement).partitions():
+            self.update(pd.DataFrame(partition, columns=SAMPLE_COLUMNS))
+        self.finalize()
+
+
+class StratifiedSample:
+    """Campione caricato in memoria con i pesi di strato"""
+
+    def __init__(self, records, strata):
+        self.records = records
+        self.strata = strata
+
+    @property
+    def sample_size(self):
+        return int(len(self.records))
+
+    @property
+    def population(self):
+        return int(self.strata['population'].sum())
+
+    def estimate(self, value_column, group_column, mask=None):
+        """
+        Stima conteggio, totale e media di value_column per ogni gruppo
+
+        Per il dominio d e lo strato h (N_h record, n_h nel campione):
+            T̂_d = Σ_h N_h/n_h · Σ_{i∈h,d} y_i
+            Var(T̂_d) = Σ_h N_h² (1 − n_h/N_h) s²_h(y·I_d) / n_h
+        La media è il rapporto T̂_d / N̂_d con varianza linearizzata sui residui (y − R̂)·I_d.
+
+        Args:
+            value_column (str): Colonna da stimare (es. 'cnt')
+            group_column (str or pd.Series): Colonna o serie con il gruppo di ogni record
+            mask (np.ndarray, optional): Record del campione che rispettano i filtri
+
+        Returns:
+            pd.DataFrame: Per gruppo: count, total, total_ci, mean, mean_ci, min, max
+        """
+        records = self.records
+        groups = records[group_column] if isinstance(group_column, str) else group_column
+        if mask is not None:
+            records, groups = records[mask], groups[mask]
+        if records.empty:
+            return pd.DataFrame()
+
+        y = records[value_column].astype(float)
+        frame = pd.DataFrame({
+            'hr': records['hr'].to_numpy(), 'weathersit': records['weathersit'].to_numpy(),
+            'group': groups.to_numpy(), 'y': y.to_numpy(), 'yy': (y * y).to_numpy()
+        })
+        cells = frame.groupby(['group', 'hr', 'weathersit']).agg(
+            n_d=('y', 'size'), sy=('y', 'sum'), syy=('yy', 'sum'),
+            y_min=('y', 'min'), y_max=('y', 'max')
+        ).reset_index().merge(self.strata, on=['hr', 'weathersit'])
+
+        N, n = cells['population'].astype(float), cells['sampled'].astype(float)
+        weight = N / n
+        # Fattore per la varianza dello stimatore: N_h² (1 − f_h) / n_h / (n_h − 1)
+        factor = np.where(n > 1, N * N * (1 - n / N) / n / np.maximum(n - 1, 1), 0.0)
+
+        cells['count_est'] = weight * cells['n_d']
+        cells['total_est'] = weight * cells['sy']
+        cells['total_var'] = factor * (cells['syy'] - cells['sy'] ** 2 / n)
+
+        by_group = cells.groupby('group')
+        result = pd.DataFrame({
+            'count': by_group['count_est'].sum(),
+            'total': by_group['total_est'].sum(),
+            'total_var': by_group['total_var'].sum(),
+            'min': by_group['y_min'].min(),
+            'max': by_group['y_max'].max()
+        })
+        result['mean'] = result['total'] / result['count']
+
+        # Residui (y − R̂)·I_d per la varianza del rapporto
+        ratio = cells['group'].map(result['mean'])
+        se = cells['sy'] - ratio * cells['n_d']
+        see = cells['syy'] - 2 * ratio * cells['sy'] + ratio ** 2 * cells['n_d']
+        cells['mean_var'] = factor * (see - se ** 2 / n)
+        result['mean_var'] = cells.groupby('group')['mean_var'].sum() / result['count'] ** 2
+
+        total_half = Z_95 * np.sqrt(result['total_var'].clip(lower=0))
+        mean_half = Z_95 * np.sqrt(result['mean_var'].clip(lower=0))
+        result['total_ci'] = list(zip(result['total'] - total_half, result['total'] + total_half))
+        result['mean_ci'] = list(zip(result['mean'] - mean_half, result['mean'] + mean_half))
+        return result.drop(columns=['total_var', 'mean_var'])
+
+
+class SampleStore:
+    """Campione in memoria per la versione corrente del dataset"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._sample = None
+        self._version = None
+
+    def get(self):
+        """Campione aggiornato alla versione corrente del dataset"""
+        version = get_dataset_version()
+        with self._lock:
+            if self._sample is not None and self._version == version:
+                return self._sample
+
+        # Richieste concorrenti a cache fredda caricano il campione una sola volta
+        return self._flight.do(version, lambda: self._load(version))
+
+    def _load(self, version):
+        """Carica dal database il campione della versione indicata"""
+        strata = pd.read_sql(select(SampleStratum.__table__), db.session.connection())
+
+        # Dati caricati prima dell'introduzione del campione: ricostruzione una tantum
+        if strata.empty:
+            from .bike_record import BikeRecord
+            if db.session.query(BikeRecord.id).first():
+                StratifiedSampleBuilder().rebuild_from_database()
+                strata = pd.read_sql(select(SampleStratum.__table__), db.session.connection())
+
+        records = pd.read_sql(
+            select(*[getattr(BikeRecordSample, c) for c in SAMPLE_COLUMNS]),
+            db.session.connection()
+        )
+        records['dteday'] = pd.to_datetime(records['dteday'])
+        sample = StratifiedSample(records, strata[['hr', 'weathersit', 'population', 'sampled']])
+
+        with self._lock:
+            self._sample, self._version = sample, version
+        return sample
+
+
+sample_store = SampleStore()
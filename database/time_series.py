@@ -0,0 +1,317 @@
+"""
+Serie temporale dei noleggi con finestre mobili
+
+La serie oraria di cnt (densa: le ore senza record valgono 0) viene ricampionata
+per ora, giorno, settimana (da lunedì) e mese. Ogni serie ricampionata mantiene le
+somme cumulative dei totali: somme e medie mobili su una finestra di w periodi si
+ottengono come differenza di due somme cumulative, in O(n) per qualsiasi w.
+
+Lo stato è aggiornato durante il caricamento (start/update/finalize): in modalità
+append vengono riaggregati solo i periodi a partire dalla prima ora modificata e le
+somme cumulative vengono estese dall'ultimo valore valido, senza ricalcolare la coda
+già consolidata della serie.
+"""
+import threading
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+
+from . import db, BikeRecord
+from .dataset_version import get_dataset_version
+from .singleflight import SingleFlight
+
+FREQUENCIES = ('hour', 'day', 'week', 'month')
+
+# Finestra mobile di default per frequenza (in periodi)
+DEFAULT_WINDOWS = {'hour': 24, 'day': 7, 'week': 4, 'month': 3}
+
+# Variazioni rispetto al periodo precedente: nome -> distanza in periodi
+DELTAS = {
+    'hour': {'dod': 24, 'wow': 168},
+    'day': {'dod': 1, 'wow': 7},
+    'week': {'wow': 1},
+    'month': {'mom': 1}
+}
+
+
+def period_start(hours, freq):
+    """
+    Inizio del periodo di ogni ora
+
+    Args:
+        hours (np.ndarray): Timestamp datetime64[h]
+        freq (str): 'hour', 'day', 'week' o 'month'
+
+    Returns:
+        np.ndarray: Inizio del periodo come datetime64[h]
+    """
+    if freq == 'hour':
+        return hours
+    if freq == 'day':
+        return hours.astype('datetime64[D]').astype('datetime64[h]')
+    if freq == 'week':
+        days = hours.astype('datetime64[D]').astype(np.int64)
+        # Il giorno 0 (1970-01-01) è un giovedì: (days + 3) % 7 è 0 di lunedì
+        return (days - (days + 3) % 7).astype('datetime64[D]').astype('datetime64[h]')
+    if freq == 'month':
+        return hours.astype('datetime64[M]').astype('datetime64[h]')
+    raise ValueError(f"Frequenza non supportata: {freq}")
+
+
+class ResampledSeries:
+    """Totali per periodo con le somme cumulative per le finestre mobili"""
+
+    def __init__(self, freq):
+        self.freq = freq
+        self.labels = np.array([], dtype='datetime64[h]')
+        self.totals = np.array([], dtype=np.int64)
+        self.records = np.array([], dtype=np.int64)
+        self.prefix = np.zeros(1, dtype=np.int64)
+
+    def copy(self):
+        """Copia indipendente della serie"""
+        series = ResampledSeries(self.freq)
+        series.labels = self.labels.copy()
+        series.totals = self.totals.copy()
+        series.records = self.records.copy()
+        series.prefix = self.prefix.copy()
+        return series
+
+    def refresh(self, hourly, from_hour=0):
+        """
+        Riaggrega i periodi a partire da quello che contiene l'ora from_hour
+
+        Args:
+            hourly (HourlySeries): Serie oraria aggiornata
+            from_hour (int): Indice della prima ora modificata (0 = ricalcolo completo)
+
+        Returns:
+            int: Numero di periodi ricalcolati
+        """
+        if hourly.origin is None:
+            self.__init__(self.freq)
+            return 0
+
+        # Primo periodo da ricalcolare e sua prima ora nella serie oraria
+        first = period_start(np.array([hourly.origin + from_hour]), self.freq)[0]
+        cut = int(np.searchsorted(self.labels, first))
+        start_hour = max(0, int((first - hourly.origin) / np.timedelta64(1, 'h')))
+
+        hours = hourly.origin + np.arange(start_hour, len(hourly.counts))
+        labels = period_start(hours, self.freq)
+        boundaries = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+
+        tail_labels = labels[boundaries]
+        tail_totals = np.add.reduceat(hourly.counts[start_hour:], boundaries) if len(hours) else np.array([], dtype=np.int64)
+        tail_records = np.add.reduceat(hourly.records[start_hour:], boundaries) if len(hours) else np.array([], dtype=np.int64)
+
+        self.labels = np.concatenate([self.labels[:cut], tail_labels])
+        self.totals = np.concatenate([self.totals[:cut], tail_totals])
+        self.records = np.concatenate([self.records[:cut], tail_records])
+        # Le somme cumulative dei periodi consolidati restano valide
+        self.prefix = np.concatenate([self.prefix[:cut + 1], self.prefix[cut] + np.cumsum(tail_totals)])
+        return len(tail_labels)
+
+    def rolling_sums(self, window):
+        """Somma mobile degli ultimi window periodi (NaN senza storia sufficiente)"""
+        sums = np.full(len(self.totals), np.nan)
+        if window <= len(self.totals):
+            sums[window - 1:] = self.prefix[window:] - self.prefix[:len(self.prefix) - window]
+        return sums
+
+    def deltas(self, lag):
+        """Variazione assoluta e percentuale rispetto a lag periodi prima"""
+        delta = np.full(len(self.totals), np.nan)
+        previous = np.full(len(self.totals), np.nan)
+        if lag < len(self.totals):
+            previous[lag:] = self.totals[:-lag]
+            delta[lag:] = self.totals[lag:] - self.totals[:-lag]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            pct = np.where(previous > 0, delta / previous * 100, np.nan)
+        return delta, pct
+
+
+class HourlySeries:
+    """Totale di cnt e numero di record per ogni ora, denso a partire da origin"""
+
+    def __init__(self):
+        self.origin = None
+        self.counts = np.array([], dtype=np.int64)
+        self.records = np.array([], dtype=np.int64)
+
+    def copy(self):
+        """Copia indipendente della serie"""
+        series = HourlySeries()
+        series.origin = self.origin
+        series.counts = self.counts.copy()
+        series.records = self.records.copy()
+        return series
+
+    def add(self, hours, counts, records=None):
+        """
+        Aggiunge i conteggi di un insieme di ore
+
+        Args:
+            hours (np.ndarray): Timestamp datetime64[h] (anche ripetuti)
+            counts (np.ndarray): cnt di ogni timestamp
+            records (np.ndarray, optional): Record di ogni timestamp (default 1)
+
+        Returns:
+            int: Indice della prima ora modificata, None se non ci sono ore
+        """
+        if not len(hours):
+            return None
+        records = np.ones(len(hours), dtype=np.int64) if records is None else records
+
+        first, last = hours.min(), hours.max()
+        shift = 0
+        if self.origin is None:
+            self.origin = first
+        elif first < self.origin:
+            # Ore precedenti all'inizio della serie: tutti gli indici si spostano
+            shift = int((self.origin - first) / np.timedelta64(1, 'h'))
+            self.origin = first
+        length = max(len(self.counts) + shift, int((last - self.origin) / np.timedelta64(1, 'h')) + 1)
+
+        if shift or length > len(self.counts):
+            self.counts = self._resize(self.counts, shift, length)
+            self.records = self._resize(self.records, shift, length)
+
+        offsets = ((hours - self.origin) / np.timedelta64(1, 'h')).astype(np.int64)
+        self.counts += np.bincount(offsets, weights=counts, minlength=length).astype(np.int64)
+        self.records += np.bincount(offsets, weights=records, minlength=length).astype(np.int64)
+        return 0 if shift else int(offsets.min())
+
+    @staticmethod
+    def _resize(array, shift, length):
+        """Array di lunghezza length con i valori esistenti spostati di shift posizioni"""
+        resized = np.zeros(length, dtype=np.int64)
+        resized[shift:shift + len(array)] = array
+        return resized
+
+
+class TimeSeries:
+    """Serie oraria con le serie ricampionate per ogni frequenza"""
+
+    def __init__(self):
+        self.hourly = HourlySeries()
+        self.resampled = {freq: ResampledSeries(freq) for freq in FREQUENCIES}
+        self.dirty_from = None
+
+    def copy(self):
+        """Copia indipendente della serie"""
+        series = TimeSeries()
+        series.hourly = self.hourly.copy()
+        series.resampled = {freq: resampled.copy() for freq, resampled in self.resampled.items()}
+        series.dirty_from = self.dirty_from
+        return series
+
+    @property
+    def total_hours(self):
+        return int(len(self.hourly.counts))
+
+    def update(self, frame):
+        """
+        Aggiunge un batch di record (colonne dteday, hr, cnt)
+
+        Le serie ricampionate vengono aggiornate da refresh() a fine caricamento.
+        """
+        if frame.empty:
+            return
+        hours = (pd.to_datetime(frame['dteday']).to_numpy().astype('datetime64[D]').astype('datetime64[h]')
+                 + frame['hr'].to_numpy().astype('timedelta64[h]'))
+        records = frame['records'].to_numpy() if 'records' in frame else None
+        changed = self.hourly.add(hours, frame['cnt'].to_numpy(), records)
+        if changed is not None:
+            self.dirty_from = changed if self.dirty_from is None else min(self.dirty_from, changed)
+
+    def refresh(self):
+        """
+        Ricalcola i periodi a partire dalla prima ora modificata
+
+        Returns:
+            int: Ore ricalcolate (dalla prima modificata alla fine della serie)
+        """
+        if self.dirty_from is None:
+            return 0
+        for resampled in self.resampled.values():
+            resampled.refresh(self.hourly, self.dirty_from)
+        recomputed = self.total_hours - self.dirty_from
+        self.dirty_from = None
+        return recomputed
+
+    @classmethod
+    def from_database(cls):
+        """Costruisce la serie con una query GROUP BY dteday, hr"""
+        rows = (db.session.query(
+                    BikeRecord.dteday, BikeRecord.hr,
+                    func.sum(BikeRecord.cnt).label('cnt'),
+                    func.count(BikeRecord.id).label('records'))
+                .group_by(BikeRecord.dteday, BikeRecord.hr)
+                .all())
+
+        series = cls()
+        if rows:
+            series.update(pd.DataFrame(rows, columns=['dteday', 'hr', 'cnt', 'records']))
+            series.refresh()
+        return series
+
+
+class TimeSeriesStore:
+    """Serie temporale condivisa dal processo, valida per una versione del dataset"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._series = None
+        self._version = None
+
+    def get(self):
+        """Serie aggiornata alla versione corrente del dataset"""
+        version = get_dataset_version()
+        with self._lock:
+            if self._series is not None and self._version == version:
+                return self._series
+
+        def rebuild():
+            series = TimeSeries.from_database()
+            self.publish(series, version)
+            return series
+
+        return self._flight.do(version, rebuild)
+
+    def publish(self, series, version):
+        """Rende disponibile una serie costruita per una versione"""
+        with self._lock:
+            self._series = series
+            self._version = version
+
+
+time_series_store = TimeSeriesStore()
+
+
+class TimeSeriesBuilder:
+    """Aggiorna la serie temporale durante il caricamento dei dati (start/update/finalize)"""
+
+    def __init__(self, store=time_series_store):
+        self.store = store
+        self.series = None
+
+    def start(self, append=False):
+        """Riparte dalla serie corrente in modalità append, altrimenti da una serie vuota"""
+        self.series = self.store.get().copy() if append else TimeSeries()
+
+    def update(self, frame):
+        """Aggiunge alla serie un batch di record salvati"""
+        self.series.update(frame[['dteday', 'hr', 'cnt']])
+
+    def finalize(self, version):
+        """
+        Ricalcola la coda modificata e pubblica la serie per la nuova versione del dataset
+
+        Args:
+            version: Versione restituita da bump_dataset_version al termine del caricamento
+        """
+        recomputed = self.series.refresh()
+        self.store.publish(self.series, version)
+        print(f"📈 Serie temporale aggiornata: {self.series.total_hours} ore, {recomputed} ricalcolate")
@@ -0,0 +1,125 @@
+"""
+Matrice delle features per le predizioni batch
+
+Gli input batch arrivano come lista di record ({feature: valore} per riga), in
+formato colonnare ({feature: [valori]}) o come DataFrame (scoring di file). La
+matrice viene costruita in un solo passaggio con pandas/NumPy; le righe con
+features mancanti o non numeriche vengono escluse dalla matrice e restituite come
+errori per riga, così le righe valide vengono comunque predette con una sola
+chiamata al modello.
+"""
+import numpy as np
+import pandas as pd
+
+
+class BatchInputError(ValueError):
+    """Payload batch non valido nel suo complesso (risposta 400)"""
+
+
+class InvalidFeaturesError(ValueError):
+    """Features di una predizione singola mancanti o non numeriche (risposta 400)"""
+
+
+def batch_size(inputs):
+    """Numero di righe di un input batch (lista di record, colonnare o DataFrame)"""
+    if isinstance(inputs, (list, pd.DataFrame)):
+        return len(inputs)
+    if isinstance(inputs, dict):
+        if not all(isinstance(values, list) for values in inputs.values()):
+            raise BatchInputError("Nell'input colonnare ogni feature deve essere una lista di valori")
+        lengths = {len(values) for values in inputs.values()}
+        if len(lengths) > 1:
+            raise BatchInputError("Le colonne dell'input colonnare devono avere la stessa lunghezza")
+        return lengths.pop() if lengths else 0
+    raise BatchInputError("L'input batch deve essere una lista di record o un oggetto di colonne")
+
+
+def build_feature_matrix(inputs, feature_names):
+    """
+    Costruisce la matrice delle features per le righe valide
+
+    Args:
+        inputs (list, dict or pd.DataFrame): Lista di record, colonne {feature: [valori]} o DataFrame
+        feature_names (list): Features del modello, nell'ordine usato in training
+
+    Returns:
+        tuple: (X delle righe valide, indici delle righe valide, {indice: errore}, numero di righe)
+    """
+    rows = batch_size(inputs)
+    not_records = np.zeros(rows, dtype=bool)
+
+    if isinstance(inputs, list):
+        not_records = np.array([not isinstance(record, dict) for record in inputs], dtype=bool)
+        records = [{} if invalid else record for record, invalid in zip(inputs, not_records)]
+        raw = pd.DataFrame.from_records(records, columns=feature_names)
+    elif isinstance(inputs, pd.DataFrame):
+        # Le colonne assenti nel file diventano features mancanti
+        raw = inputs.reindex(columns=feature_names)
+    else:
+        raw = pd.DataFrame({feature: inputs.get(feature, [None] * rows) for feature in feature_names})
+
+    numeric = raw.apply(pd.to_numeric, errors='coerce').astype(np.float64)
+    values = numeric.to_numpy()
+    missing = raw.isna().to_numpy()
+    # I modelli ad albero convertono l'input in float32: i valori oltre quel limite non sono validi
+    invalid = ~(np.abs(values) <= np.finfo(np.float32).max) & ~missing
+
+    bad = not_records | missing.any(axis=1) | invalid.any(axis=1)
+    errors = {}
+    # Messaggi costruiti solo per le righe scartate
+    for index in np.flatnonzero(bad):
+        if not_records[index]:
+            errors[int(index)] = "La riga deve essere un oggetto {feature: valore}"
+            continue
+        problems = []
+        absent = [feature_names[j] for j in np.flatnonzero(missing[index])]
+        wrong = [feature_names[j] for j in np.flatnonzero(invalid[index])]
+        if absent:
+            problems.append(f"features mancanti: {', '.join(absent)}")
+        if wrong:
+            problems.append(f"valori non numerici o fuori scala: {', '.join(wrong)}")
+        errors[int(index)] = '; '.join(problems)
+
+    valid = np.flatnonzero(~bad)
+    return values[valid], valid, errors, rows
+
+
+def build_feature_row(features, feature_names):
+    """
+    Riga delle features di una predizione singola, validata come le righe batch
+
+    Args:
+        features (dict): Features di input {feature: valore}
+        feature_names (list): Features del modello, nell'ordine usato in training
+
+    Returns:
+        np.ndarray: Array 2D (1 x features) float64
+
+    Raises:
+        InvalidFeaturesError: Se una feature è nulla, non numerica o fuori scala
+    """
+    X, _, errors, _ = build_feature_matrix([features], feature_names)
+    if errors:
+        raise InvalidFeaturesError(f"Input non valido: {errors[0]}")
+    return X
+
+
+def merge_results(rows, valid, results, errors):
+    """
+    Risultati nell'ordine dell'input: predizioni per le righe valide, errori per le altre
+
+    Args:
+        rows (int): Numero di righe dell'input
+        valid (np.ndarray): Indici delle righe predette
+        results (list): Un dict di risultato per ogni riga valida
+        errors (dict): {indice: messaggio} delle righe scartate
+
+    Returns:
+        list: Un elemento per riga con 'index' e il risultato o 'error'
+    """
+    merged = [None] * rows
+    for index, result in zip(valid.tolist(), results):
+        merged[index] = dict(index=index, **result)
+    for index, message in errors.items():
+        merged[index] = {'index': index, 'error': message}
+    return merged
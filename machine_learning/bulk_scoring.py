@@ -0,0 +1,220 @@
+"""
+Scoring di file di scenari (CSV / Parquet) con i predittori addestrati
+
+Il file caricato viene letto a blocchi di righe: per ogni blocco ogni predittore
+richiesto esegue una sola inferenza vettorizzata, e il blocco con le colonne
+delle predizioni aggiunte viene serializzato e restituito subito. La memoria
+resta quindi limitata a un blocco, qualunque sia la dimensione del file.
+
+I modelli vengono risolti dal registro una sola volta all'inizio: tutto il file
+viene valutato con gli stessi modelli anche se un artefatto cambia durante lo
+scoring. Le righe con features mancanti o non numeriche restano nel file, con
+le predizioni vuote e il motivo nella colonna prediction_error.
+
+Lettura e scrittura Parquet richiedono pyarrow (dipendenza opzionale).
+"""
+import logging
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    pa = None
+    pq = None
+
+from database.record_export import _ChunkSink
+from machine_learning.batch_features import build_feature_matrix
+from machine_learning.model_registry import model_registry
+from machine_learning.peak_demand_predictor import PeakDemandPredictor
+from machine_learning.rental_count_predictor import RentalCountPredictor
+from machine_learning.weather_impact_predictor import WeatherImpactPredictor
+
+# Righe lette, predette e scritte per blocco
+DEFAULT_CHUNK_SIZE = 50000
+
+SCORING_FORMATS = ('csv', 'parquet')
+
+ERROR_COLUMN = 'prediction_error'
+
+# Predittori disponibili: classe, attributo con le features del modello e colonne aggiunte (con dtype)
+BULK_PREDICTORS = {
+    'peak_demand': {
+        'class': PeakDemandPredictor,
+        'features': 'feature_names',
+        'columns': {'is_peak': 'boolean', 'peak_probability': 'float64'}
+    },
+    'rental_count': {
+        'class': RentalCountPredictor,
+        'features': 'feature_names',
+        'columns': {'predicted_rentals': 'Int64'}
+    },
+    'weather_impact': {
+        'class': WeatherImpactPredictor,
+        'features': 'weather_features',
+        'columns': {'predicted_impact': 'float64'}
+    }
+}
+
+
+def file_format(filename):
+    """Formato di un file dall'estensione ('csv' o 'parquet'), None se non supportato"""
+    name = filename.lower()
+    if name.endswith(('.csv', '.csv.gz')):
+        return 'csv'
+    if name.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    return None
+
+
+def iter_chunks(file_obj, input_format, chunk_size=DEFAULT_CHUNK_SIZE, compression=None):
+    """
+    Legge il file a blocchi di righe
+
+    Args:
+        file_obj: File caricato (seekable per il Parquet)
+        input_format (str): 'csv' o 'parquet'
+        chunk_size (int): Righe per blocco
+        compression (str, optional): Compressione del CSV (es. 'gzip')
+
+    Yields:
+        pd.DataFrame: Blocchi di al massimo chunk_size righe
+    """
+    if input_format == 'parquet':
+        for batch in pq.ParquetFile(file_obj).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(file_obj, chunksize=chunk_size, compression=compression)
+
+
+class BulkScorer:
+    """Aggiunge a ogni blocco le predizioni dei predittori scelti"""
+
+    def __init__(self, predictors):
+        self.predictors = predictors
+        self.rows = 0
+        self.chunks = 0
+        self.errors = 0
+        self.inference_ms = 0.0
+
+    @classmethod
+    def load(cls, model_types):
+        """
+        Risolve dal registro i modelli dei predittori richiesti
+
+        Args:
+            model_types (dict): {chiave di BULK_PREDICTORS: tipo di modello addestrato da usare}
+
+        Raises:
+            FileNotFoundError: Se uno dei modelli non è stato addestrato
+        """
+        predictors = {}
+        for name, model_type in model_types.items():
+            try:
+                predictor = model_registry.get(BULK_PREDICTORS[name]['class'], model_type)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Modello {model_type} di {name} non ancora addestrato")
+            if not predictor.is_trained:
+                raise ValueError("Modello non ancora addestrato")
+            predictors[name] = predictor
+        return cls(predictors)
+
+    def score(self, chunk):
+        """
+        Predizioni vettorizzate su un blocco
+
+        Args:
+            chunk (pd.DataFrame): Righe del file
+
+        Returns:
+            pd.DataFrame: Il blocco con le colonne delle predizioni e prediction_error
+        """
+        chunk = chunk.reset_index(drop=True)
+        problems = {}
+
+        for name, predictor in self.predictors.items():
+            spec = BULK_PREDICTORS[name]
+            X, valid, errors, rows = build_feature_matrix(chunk, getattr(predictor, spec['features']))
+
+            start = time.perf_counter()
+            results = type(predictor).infer(predictor.inference_model, X) if len(valid) else []
+            self.inference_ms += (time.perf_counter() - start) * 1000
+
+            # Una colonna per valore restituito da infer() (peak: is_peak e probabilità)
+            columns = spec['columns']
+            values = list(zip(*results)) if len(columns) > 1 else [results]
+            for (column, dtype), column_values in zip(columns.items(), values or [[]] * len(columns)):
+                output = pd.Series(index=chunk.index, dtype=dtype)
+                output.iloc[valid] = list(column_values)
+                chunk[column] = output
+
+            for index, message in errors.items():
+                problems.setdefault(index, []).append(f'{name}: {message}')
+
+        error_column = pd.Series(index=chunk.index, dtype='string')
+        if problems:
+            error_column.iloc[list(problems)] = ['; '.join(messages) for messages in problems.values()]
+        chunk[ERROR_COLUMN] = error_column
+
+        self.rows += len(chunk)
+        self.chunks += 1
+        self.errors += len(problems)
+        return chunk
+
+    def score_chunks(self, chunks):
+        """Generatore dei blocchi con le predizioni; registra il riepilogo alla fine"""
+        start = time.perf_counter()
+        for chunk in chunks:
+            yield self.score(chunk)
+        logging.info(
+            f"Scoring file ({', '.join(self.predictors)}): {self.rows} righe in {self.chunks} blocchi, "
+            f"{self.errors} righe con errori, inferenza {self.inference_ms:.0f} ms "
+            f"su {(time.perf_counter() - start) * 1000:.0f} ms totali"
+        )
+
+
+def encode_csv(chunks):
+    """Serializza i blocchi in un unico CSV (intestazione solo nel primo)"""
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+
+def encode_parquet(chunks):
+    """
+    Serializza i blocchi in un file Parquet, un row group per blocco
+
+    Lo schema è quello del primo blocco: i blocchi successivi vengono convertiti
+    allo stesso schema (es. colonne intere lette come float per un valore mancante,
+    o colonne testuali nel primo blocco per un valore non numerico).
+    """
+    sink = _ChunkSink()
+    writer = None
+    schema = None
+
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                schema = table.schema
+                writer = pq.ParquetWriter(sink, schema, compression='snappy')
+            else:
+                for field in schema:
+                    if pa.types.is_string(field.type) and field.name in chunk:
+                        chunk[field.name] = chunk[field.name].astype('string')
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False, safe=False)
+            writer.write_table(table, row_group_size=len(chunk))
+
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        if writer is not None:
+            writer.close()
+
+    data = sink.drain()
+    if data:
+        yield data
@@ -0,0 +1,80 @@
+"""
+Predizione combinata con i tre modelli su una sola matrice di features
+
+Per pianificare un'ora servono domanda di picco, numero di noleggi e impatto
+meteo. Invece di tre richieste separate, ognuna con la propria validazione e
+matrice delle features, l'input viene validato e convertito una sola volta
+sull'unione delle features dei modelli richiesti. Ogni modello riceve poi le
+proprie colonne (feature_names per picchi e noleggi, weather_features per il
+meteo), nell'ordine usato in training.
+
+Le predizioni passano dalla cache delle predizioni e i modelli vengono risolti
+dal registro una sola volta per richiesta, come nello scoring di file.
+"""
+import time
+
+import numpy as np
+
+from machine_learning.batch_features import build_feature_matrix, merge_results
+from machine_learning.bulk_scoring import BULK_PREDICTORS, BulkScorer
+from machine_learning.prediction_cache import prediction_cache
+
+
+def shared_features(predictors):
+    """Unione ordinata delle features dei predittori"""
+    features = []
+    for name, predictor in predictors.items():
+        for feature in getattr(predictor, BULK_PREDICTORS[name]['features']):
+            if feature not in features:
+                features.append(feature)
+    return features
+
+
+def predict_all(inputs, model_types):
+    """
+    Predizioni di tutti i modelli richiesti per ogni riga dell'input
+
+    Args:
+        inputs (list or dict): Lista di record o colonne {feature: [valori]}
+        model_types (dict): {chiave di BULK_PREDICTORS: tipo di modello addestrato}
+
+    Returns:
+        dict: Per ogni riga le colonne di tutti i predittori (o 'error'), tipi di modello e riepilogo
+
+    Raises:
+        FileNotFoundError: Se uno dei modelli non è stato addestrato
+    """
+    predictors = BulkScorer.load(model_types).predictors
+    features = shared_features(predictors)
+
+    start = time.perf_counter()
+    X, valid, errors, rows = build_feature_matrix(inputs, features)
+    features_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    results = [{} for _ in valid]
+    inference_ms = {}
+    for name, predictor in predictors.items():
+        spec = BULK_PREDICTORS[name]
+        columns = [features.index(feature) for feature in getattr(predictor, spec['features'])]
+
+        start = time.perf_counter()
+        outputs = prediction_cache.infer_batch(predictor, np.ascontiguousarray(X[:, columns])) if len(valid) else []
+        inference_ms[name] = round((time.perf_counter() - start) * 1000, 3)
+
+        # Una colonna per valore restituito da infer() (peak: is_peak e probabilità)
+        for result, output in zip(results, outputs):
+            result.update(zip(spec['columns'], output if len(spec['columns']) > 1 else (output,)))
+
+    peak = predictors.get('peak_demand')
+    return {
+        'predictions': merge_results(rows, valid, results, errors),
+        'model_types': {name: predictor.model_type for name, predictor in predictors.items()},
+        'peak_threshold': peak.peak_threshold_value if peak is not None else None,
+        'summary': {
+            'rows': rows,
+            'predicted': int(len(valid)),
+            'errors': len(errors),
+            'features_ms': features_ms,
+            'inference_ms': inference_ms
+        }
+    }
@@ -0,0 +1,211 @@
+"""
+Modelli ad albero compatti per gli artefatti in formato compact
+
+Partendo dal modello compilato (vedi compiled_models) gli array dei nodi vengono
+ridotti:
+    - indici dei nodi in int32, indice della feature nel tipo intero più piccolo
+    - soglie in float32: ogni soglia float64 diventa il più grande float32 che
+      non la supera. Le righe vengono già convertite in float32 prima della
+      visita, e per un x float32 vale x <= soglia se e solo se x <= soglia
+      arrotondata in questo modo: le foglie raggiunte non cambiano
+    - valori delle foglie in float32 oppure, con leaf_bits, quantizzati su
+      interi a 8 o 16 bit (valore = offset + codice * scala)
+    - con prune_tolerance, ogni sottoalbero le cui foglie differiscono tutte
+      dal valore del nodo radice del sottoalbero al massimo della tolleranza
+      diventa una foglia con quel valore
+
+Le predizioni non sono più identiche bit per bit a sklearn ma lo scarto di ogni
+albero, e quindi della media della foresta, è limitato da max_error:
+tolleranza di pruning più errore di arrotondamento dei valori delle foglie.
+La visita è sempre quella NumPy (gli alberi sklearn non sono disponibili).
+"""
+import warnings
+
+import numpy as np
+
+from machine_learning.compiled_models import CompiledTreeClassifier, CompiledTreeRegressor, CompiledTrees
+
+# Bit ammessi per la quantizzazione dei valori delle foglie
+LEAF_BITS = (8, 16)
+
+
+class CompactTrees:
+    """Valori delle foglie float32 o quantizzati (da combinare con una classe CompiledTrees)"""
+
+    STATE = ('value_scale', 'value_offset', 'compaction')
+
+    def leaf_values(self, leaves):
+        values = self.values.take(leaves, axis=0)
+        if self.value_scale is None:
+            return values
+        return values * self.value_scale + self.value_offset
+
+
+class CompactTreeRegressor(CompactTrees, CompiledTreeRegressor):
+    """DecisionTreeRegressor / RandomForestRegressor compatti"""
+
+    STATE = CompiledTreeRegressor.STATE + CompactTrees.STATE
+
+
+class CompactTreeClassifier(CompactTrees, CompiledTreeClassifier):
+    """DecisionTreeClassifier / RandomForestClassifier compatti"""
+
+    STATE = CompiledTreeClassifier.STATE + CompactTrees.STATE
+
+
+# Classi compatte ricostruibili dagli artefatti compact
+COMPACT_KINDS = {
+    compact_class.__name__: compact_class for compact_class in (CompactTreeRegressor, CompactTreeClassifier)
+}
+
+
+def node_levels(compiled):
+    """Profondità di ogni nodo (le foglie puntano a se stesse)"""
+    level = np.full(compiled.n_nodes, -1, dtype=np.intp)
+    frontier = np.asarray(compiled.roots, dtype=np.intp)
+    depth = 0
+    while len(frontier):
+        level[frontier] = depth
+        internal = frontier[compiled.left[frontier] != frontier]
+        frontier = np.concatenate([compiled.left[internal], compiled.right[internal]])
+        depth += 1
+    return level
+
+
+def collapsible_nodes(compiled, level, tolerance):
+    """
+    Nodi interni i cui sottoalberi possono diventare foglie
+
+    Un nodo è collassabile se il valore di ogni foglia del suo sottoalbero
+    dista dal valore del nodo al massimo tolerance (per ogni classe).
+    """
+    values = compiled.values.reshape(compiled.n_nodes, -1)
+    internal = compiled.left != np.arange(compiled.n_nodes)
+    low, high = values.copy(), values.copy()
+    # Dal basso verso l'alto: intervallo dei valori delle foglie di ogni sottoalbero
+    for depth in range(level.max() - 1, -1, -1):
+        nodes = np.flatnonzero(internal & (level == depth))
+        low[nodes] = np.minimum(low[compiled.left[nodes]], low[compiled.right[nodes]])
+        high[nodes] = np.maximum(high[compiled.left[nodes]], high[compiled.right[nodes]])
+    deviation = np.maximum(high - values, values - low).max(axis=1)
+    return internal & (deviation <= tolerance)
+
+
+def quantize(leaf_values, leaf_bits):
+    """Codici interi, scala, offset ed errore massimo della quantizzazione lineare"""
+    low, high = float(leaf_values.min()), float(leaf_values.max())
+    levels = 2 ** leaf_bits - 1
+    scale = (high - low) / levels if high > low else 1.0
+    codes = np.rint((leaf_values - low) / scale).clip(0, levels).astype(np.uint8 if leaf_bits == 8 else np.uint16)
+    error = float(np.abs(codes * scale + low - leaf_values).max())
+    return codes, scale, low, error
+
+
+def node_bytes(compiled):
+    """Memoria degli array dei nodi in byte"""
+    return int(sum(getattr(compiled, name).nbytes for name in ('roots', 'feature', 'threshold', 'left', 'right', 'values')))
+
+
+def compact_model(compiled, leaf_bits=None, prune_tolerance=0.0):
+    """
+    Versione compatta di un modello ad albero compilato
+
+    Args:
+        compiled (CompiledTrees): Modello compilato con gli array float64
+        leaf_bits (int, optional): 8 o 16 per quantizzare i valori delle foglie, None per float32
+        prune_tolerance (float): Scarto massimo per collassare un sottoalbero (nelle unità della predizione)
+
+    Returns:
+        CompactTreeRegressor o CompactTreeClassifier, con il riepilogo in compaction
+
+    Raises:
+        ValueError: Se il modello non è ad albero o i parametri non sono validi
+    """
+    if not isinstance(compiled, CompiledTrees):
+        raise ValueError(f"Modello {type(compiled).__name__} non supportato dal formato compact")
+    if leaf_bits is not None and leaf_bits not in LEAF_BITS:
+        raise ValueError(f"leaf_bits non supportato: {leaf_bits}. Usa {', '.join(map(str, LEAF_BITS))}")
+    if prune_tolerance < 0:
+        raise ValueError("prune_tolerance deve essere >= 0")
+
+    nodes = np.arange(compiled.n_nodes)
+    level = node_levels(compiled)
+    leaf = compiled.left == nodes
+    collapsed = collapsible_nodes(compiled, level, prune_tolerance) if prune_tolerance > 0 else np.zeros_like(leaf)
+
+    # Dall'alto verso il basso: si tengono i nodi raggiungibili senza attraversare un nodo collassato
+    kept = np.zeros(compiled.n_nodes, dtype=bool)
+    kept[compiled.roots] = True
+    for depth in range(level.max()):
+        parents = np.flatnonzero(kept & (level == depth) & ~leaf & ~collapsed)
+        kept[compiled.left[parents]] = True
+        kept[compiled.right[parents]] = True
+
+    # Nuova numerazione: stesso ordine dei nodi, foglie che puntano a se stesse
+    selected = np.flatnonzero(kept)
+    index = np.cumsum(kept) - 1
+    new_leaf = (leaf | collapsed)[selected]
+    left = np.where(new_leaf, index[selected], index[compiled.left[selected]])
+    right = np.where(new_leaf, index[selected], index[compiled.right[selected]])
+
+    # Il più grande float32 <= soglia: stesse decisioni per le righe float32
+    threshold = compiled.threshold[selected]
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32.astype(np.float64) > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+    threshold32[new_leaf] = 0.0
+
+    values = np.asarray(compiled.values[selected], dtype=np.float64)
+    leaf_values = values[new_leaf]
+    if leaf_bits is None:
+        stored = values.astype(np.float32)
+        rounding_error = float(np.abs(stored[new_leaf].astype(np.float64) - leaf_values).max())
+        scale = offset = None
+    else:
+        codes, scale, offset, rounding_error = quantize(leaf_values, leaf_bits)
+        stored = np.zeros(values.shape, dtype=codes.dtype)
+        stored[new_leaf] = codes
+
+    compact_class = CompactTreeClassifier if isinstance(compiled, CompiledTreeClassifier) else CompactTreeRegressor
+    feature = np.where(new_leaf, 0, compiled.feature[selected])
+    state = {
+        'roots': index[compiled.roots].astype(np.int32),
+        'feature': feature.astype(np.min_scalar_type(max(compiled.n_features_in_ - 1, 0))),
+        'threshold': threshold32,
+        'left': left.astype(np.int32),
+        'right': right.astype(np.int32),
+        'values': np.ascontiguousarray(stored),
+        'depth': int(level[selected].max()),
+        'n_features_in_': compiled.n_features_in_,
+        'forest': compiled.forest,
+        'value_scale': scale,
+        'value_offset': offset,
+        'compaction': None
+    }
+    if isinstance(compiled, CompiledTreeClassifier):
+        state['classes_'] = compiled.classes_
+    compact = compact_class.from_arrays(state)
+
+    compact.compaction = {
+        'leaf_bits': leaf_bits,
+        'prune_tolerance': float(prune_tolerance),
+        'nodes': int(compiled.n_nodes),
+        'nodes_compacted': int(compact.n_nodes),
+        'depth': int(compiled.depth),
+        'depth_compacted': int(compact.depth),
+        'node_bytes': node_bytes(compiled),
+        'node_bytes_compacted': node_bytes(compact),
+        # Limite dello scarto di ogni predizione rispetto al modello originale
+        'max_error': float(prune_tolerance) + rounding_error
+    }
+    return compact
+
+
+def max_deviation(model, compact, X):
+    """Scarto massimo tra le uscite di model e del modello compatto su X"""
+    method = 'predict_proba' if hasattr(compact, 'predict_proba') else 'predict'
+    with warnings.catch_warnings():
+        # Modelli addestrati su DataFrame: sklearn avverte per l'input senza nomi delle features
+        warnings.simplefilter('ignore', UserWarning)
+        expected = np.asarray(getattr(model, method)(X), dtype=np.float64)
+    return float(np.abs(getattr(compact, method)(X) - expected).max())
@@ -0,0 +1,349 @@
+"""
+Motore di inferenza compilato per i modelli sklearn addestrati
+
+Il predict() generico di sklearn valida l'input (dtype, nomi delle features) e,
+per le foreste, distribuisce gli alberi con joblib: su una sola riga questo
+costo supera la visita degli alberi. compile_model() appiattisce il modello in
+array NumPy contigui (feature, soglia, figli e valore di ogni nodo di tutti gli
+alberi); la visita fa avanzare tutte le righe su tutti gli alberi insieme, un
+livello di profondità per iterazione. Sui batch grandi e per gli alberi
+singoli, dove la visita NumPy costa più di quella Cython di sklearn, se gli
+alberi sklearn sono disponibili ognuno viene visitato con Tree.apply (senza
+validazione né joblib) e i valori delle foglie vengono presi comunque dagli
+array compilati.
+
+I risultati sono identici bit per bit a quelli di sklearn perché vengono
+ripetute le stesse operazioni nello stesso ordine:
+    - X convertita in float32 e confrontata con le soglie float64 (x <= soglia)
+    - probabilità delle foglie normalizzate come in DecisionTreeClassifier.predict_proba
+    - contributi degli alberi sommati uno alla volta nell'ordine di estimators_,
+      poi divisi per il numero di alberi (come _accumulate_prediction)
+    - modelli lineari: stesso prodotto X @ coef_.T + intercept_ (ed expit per
+      la regressione logistica binaria)
+
+Come sklearn, i modelli compilati rifiutano con ValueError gli input con NaN o
+infiniti (per gli alberi anche i valori che superano il limite di float32): senza
+questo controllo NaN fallirebbe ogni confronto x <= soglia e scenderebbe sempre
+a destra, con una predizione silenziosa.
+
+Al caricamento il modello compilato viene confrontato con sklearn su righe di
+prova costruite attorno alle soglie: se un risultato differisce, o il modello
+non è supportato, le predizioni restano a sklearn.
+"""
+import logging
+import warnings
+from abc import ABC, abstractmethod
+
+import numpy as np
+from scipy.special import expit
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.linear_model import LinearRegression, LogisticRegression
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+# Righe visitate per blocco: limita la memoria delle matrici (righe x alberi)
+ROW_BLOCK_SIZE = 4096
+
+# Oltre questo numero di visite (righe x alberi) si usa Tree.apply di sklearn, se disponibile
+NUMPY_TRAVERSAL_MAX_VISITS = 2048
+
+# Righe di prova per la verifica al caricamento
+PROBE_ROWS = 512
+
+
+def finite_input(X, dtype):
+    """X convertita in dtype (C-contigua), ValueError se contiene NaN o infiniti dopo la conversione"""
+    with np.errstate(over='ignore'):
+        X = np.ascontiguousarray(X, dtype=dtype)
+    if not np.isfinite(X).all():
+        raise ValueError(f"L'input contiene NaN, infiniti o valori troppo grandi per {np.dtype(dtype).name}")
+    return X
+
+
+class CompiledTrees(ABC):
+    """Albero singolo o foresta appiattiti in array contigui"""
+
+    # Stato salvato negli artefatti mmap (vedi to_arrays)
+    STATE = ('roots', 'feature', 'threshold', 'left', 'right', 'values', 'depth', 'n_features_in_', 'forest')
+
+    def __init__(self, estimators, forest=True):
+        trees = [estimator.tree_ for estimator in estimators]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+
+        feature, threshold, left, right, values = [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            nodes = np.arange(tree.node_count) + offset
+            leaf = tree.children_left == -1
+            # Le foglie puntano a se stesse: tutte le righe avanzano fino alla profondità massima
+            left.append(np.where(leaf, nodes, tree.children_left + offset))
+            right.append(np.where(leaf, nodes, tree.children_right + offset))
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            values.append(self.node_values(tree))
+
+        self.roots = offsets.astype(np.intp)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold).astype(np.float64)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.values = np.ascontiguousarray(np.concatenate(values))
+        self.depth = max(tree.max_depth for tree in trees)
+        self.n_features_in_ = estimators[0].n_features_in_
+        self.forest = forest
+        # Alberi sklearn per la visita Cython dei batch grandi
+        self.trees = trees
+
+    @abstractmethod
+    def node_values(self, tree):
+        """Valore restituito da ogni nodo (usato solo per le foglie)"""
+
+    def to_arrays(self):
+        """Stato del modello compilato: solo array NumPy e scalari, senza oggetti sklearn"""
+        return {name: getattr(self, name) for name in self.STATE}
+
+    @classmethod
+    def from_arrays(cls, state):
+        """Modello compilato dallo stato di to_arrays (anche con array memory-mapped)"""
+        compiled = cls.__new__(cls)
+        compiled.__dict__.update(state)
+        # Senza alberi sklearn la visita è NumPy per tutti i batch
+        compiled.trees = None
+        return compiled
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def apply(self, X):
+        """
+        Foglia raggiunta da ogni riga in ogni albero
+
+        Args:
+            X (np.ndarray): Matrice float32 C-contigua
+
+        Returns:
+            np.ndarray: Indici globali delle foglie (righe x alberi)
+        """
+        n_rows, n_features = X.shape
+        flat = X.reshape(-1)
+        base = (np.arange(n_rows, dtype=np.intp) * n_features)[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :], n_rows, axis=0)
+        for _ in range(self.depth):
+            # float32 promosso a float64 nel confronto, come in sklearn
+            go_left = flat[base + self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def tree_leaves(self, X):
+        """
+        Foglie raggiunte, un array di indici globali per albero
+
+        Args:
+            X (np.ndarray): Matrice float32 C-contigua
+        """
+        # Albero singolo: la visita Cython senza validazione è sempre la più veloce
+        if self.trees is not None and (not self.forest or X.shape[0] * self.n_trees > NUMPY_TRAVERSAL_MAX_VISITS):
+            return [tree.apply(X) + root for tree, root in zip(self.trees, self.roots)]
+        return self.apply(X).T
+
+    def leaf_values(self, leaves):
+        """Valori delle foglie raggiunte (indici globali)"""
+        return self.values.take(leaves, axis=0)
+
+    def _average(self, X):
+        """Media dei valori delle foglie, sommati albero per albero nell'ordine di sklearn"""
+        X = finite_input(X, np.float32)
+        output = np.zeros((X.shape[0],) + self.values.shape[1:], dtype=np.float64)
+        for start in range(0, X.shape[0], ROW_BLOCK_SIZE):
+            block = output[start:start + ROW_BLOCK_SIZE]
+            leaves = self.tree_leaves(X[start:start + ROW_BLOCK_SIZE])
+            if not self.forest:
+                block[:] = self.leaf_values(leaves[0])
+                continue
+            for tree_leaves in leaves:
+                block += self.leaf_values(tree_leaves)
+        if self.forest:
+            output /= self.n_trees
+        return output
+
+
+class CompiledTreeRegressor(CompiledTrees):
+    """DecisionTreeRegressor / RandomForestRegressor compilati"""
+
+    def node_values(self, tree):
+        return tree.value[:, 0, 0]
+
+    def predict(self, X):
+        return self._average(X)
+
+
+class CompiledTreeClassifier(CompiledTrees):
+    """DecisionTreeClassifier / RandomForestClassifier compilati"""
+
+    STATE = CompiledTrees.STATE + ('classes_',)
+
+    def __init__(self, estimators, classes, forest=True):
+        self.classes_ = classes
+        super().__init__(estimators, forest)
+
+    def node_values(self, tree):
+        # Normalizzazione di DecisionTreeClassifier.predict_proba, calcolata una volta per nodo
+        proba = tree.value[:, 0, :len(self.classes_)].copy()
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        return proba
+
+    def predict_proba(self, X):
+        return self._average(X)
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+class CompiledLinearRegression:
+    """LinearRegression compilata (stessi coefficienti, senza validazione dell'input)"""
+
+    STATE = ('coef_', 'intercept_', 'n_features_in_')
+
+    def __init__(self, model):
+        # Stessi array del modello: anche l'allineamento in memoria per BLAS resta invariato
+        self.coef_ = model.coef_
+        self.intercept_ = model.intercept_
+        self.n_features_in_ = model.n_features_in_
+
+    def to_arrays(self):
+        """Stato del modello compilato: solo array NumPy e scalari, senza oggetti sklearn"""
+        return {name: getattr(self, name) for name in self.STATE}
+
+    @classmethod
+    def from_arrays(cls, state):
+        """Modello compilato dallo stato di to_arrays (anche con array memory-mapped)"""
+        compiled = cls.__new__(cls)
+        compiled.__dict__.update(state)
+        return compiled
+
+    def predict(self, X):
+        return finite_input(X, np.float64) @ self.coef_.T + self.intercept_
+
+
+class CompiledLogisticRegression(CompiledLinearRegression):
+    """LogisticRegression binaria compilata"""
+
+    STATE = CompiledLinearRegression.STATE + ('classes_',)
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.classes_ = model.classes_
+
+    def decision_function(self, X):
+        return (finite_input(X, np.float64) @ self.coef_.T + self.intercept_).reshape(-1)
+
+    def predict_proba(self, X):
+        probability = self.decision_function(X)
+        expit(probability, out=probability)
+        return np.vstack([1 - probability, probability]).T
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+# Classi compilate ricostruibili dagli artefatti mmap
+COMPILED_KINDS = {
+    compiled_class.__name__: compiled_class
+    for compiled_class in (
+        CompiledTreeClassifier, CompiledTreeRegressor, CompiledLinearRegression, CompiledLogisticRegression
+    )
+}
+
+
+def build_compiled(model):
+    """Modello compilato, None se il tipo non è supportato"""
+    if isinstance(model, RandomForestClassifier) and model.n_outputs_ == 1:
+        return CompiledTreeClassifier(model.estimators_, model.classes_)
+    if isinstance(model, RandomForestRegressor) and model.n_outputs_ == 1:
+        return CompiledTreeRegressor(model.estimators_)
+    if isinstance(model, DecisionTreeClassifier) and model.n_outputs_ == 1:
+        return CompiledTreeClassifier([model], model.classes_, forest=False)
+    if isinstance(model, DecisionTreeRegressor) and model.n_outputs_ == 1:
+        return CompiledTreeRegressor([model], forest=False)
+    if isinstance(model, LogisticRegression) and len(model.classes_) == 2 and model.multi_class in ('auto', 'ovr', 'warn'):
+        return CompiledLogisticRegression(model)
+    if isinstance(model, LinearRegression) and np.ndim(model.coef_) == 1:
+        return CompiledLinearRegression(model)
+    return None
+
+
+def probe_rows(compiled, rows=PROBE_ROWS, seed=44):
+    """
+    Righe di prova per la verifica: per gli alberi metà dei valori cade esattamente
+    su una soglia (il caso limite di x <= soglia), il resto attorno all'intervallo delle soglie
+    """
+    rng = np.random.default_rng(seed)
+    n_features = compiled.n_features_in_
+    if not isinstance(compiled, CompiledTrees):
+        return rng.normal(0, 2, size=(rows, n_features))
+
+    X = np.zeros((rows, n_features))
+    internal = compiled.left != np.arange(compiled.n_nodes)
+    for column in range(n_features):
+        thresholds = compiled.threshold[internal & (compiled.feature == column)]
+        if len(thresholds) == 0:
+            X[:, column] = rng.normal(0, 1, rows)
+            continue
+        low, high = thresholds.min(), thresholds.max()
+        margin = max(high - low, 1.0) * 0.1
+        X[:, column] = rng.uniform(low - margin, high + margin, rows)
+        exact = rng.random(rows) < 0.5
+        # Le soglie sono punti medi tra valori float32: si prova anche il loro arrotondamento a float32
+        X[exact, column] = rng.choice(thresholds, exact.sum()).astype(np.float32)
+    return X
+
+
+def outputs_match(model, compiled, X):
+    """True se sklearn e il modello compilato producono gli stessi bit su X"""
+    method = 'predict_proba' if hasattr(compiled, 'predict_proba') else 'predict'
+    with warnings.catch_warnings():
+        # Modelli addestrati su DataFrame: sklearn avverte per l'input senza nomi delle features
+        warnings.simplefilter('ignore', UserWarning)
+        expected = np.asarray(getattr(model, method)(X))
+    actual = getattr(compiled, method)(X)
+    return expected.dtype == actual.dtype and expected.shape == actual.shape and expected.tobytes() == actual.tobytes()
+
+
+def verified_probes(compiled):
+    """Righe di prova per la verifica: il probe intero più blocchi piccoli per la visita NumPy delle foreste"""
+    X = probe_rows(compiled)
+    probes = [X]
+    if isinstance(compiled, CompiledTrees) and compiled.forest:
+        # Blocchi piccoli: verificano anche la visita NumPy (il batch intero usa Tree.apply)
+        small = max(1, NUMPY_TRAVERSAL_MAX_VISITS // compiled.n_trees)
+        probes += [X[start:start + small] for start in range(0, min(len(X), 8 * small), small)]
+    return probes
+
+
+def compile_model(model):
+    """
+    Versione compilata del modello, verificata contro sklearn
+
+    Args:
+        model: Modello sklearn addestrato
+
+    Returns:
+        Modello compilato (stessa interfaccia predict/predict_proba/classes_)
+        oppure il modello sklearn se non supportato o non identico
+    """
+    try:
+        compiled = build_compiled(model)
+        if compiled is None:
+            return model
+        if not all(outputs_match(model, compiled, probe) for probe in verified_probes(compiled)):
+            logging.warning(f"Modello compilato {type(model).__name__} diverso da sklearn: uso sklearn")
+            return model
+        return compiled
+    except Exception as e:
+        logging.warning(f"Compilazione di {type(model).__name__} non riuscita: {str(e)}")
+        return model
@@ -0,0 +1,276 @@
+"""
+Micro-batching delle predizioni singole concorrenti
+
+Le predizioni singole che arrivano insieme per lo stesso modello vengono raccolte
+da un thread dedicato fino a max_batch_size righe o max_wait_ms millisecondi dalla
+prima richiesta in coda, poi eseguite con una sola inferenza vettorizzata: i
+modelli sklearn (in particolare le foreste) costano molto meno per riga quando
+ricevono più righe insieme. Ogni chiamante riceve il risultato della propria riga.
+
+Se l'inferenza del batch fallisce le righe vengono rieseguite singolarmente,
+così ogni chiamante riceve il proprio errore e non quello di un'altra richiesta.
+Un errore imprevisto del thread di batching viene assegnato alle richieste del
+batch senza fermare il thread; un chiamante che non riceve risposta entro
+MICRO_BATCH_TIMEOUT_MS esegue comunque l'inferenza della propria riga direttamente.
+
+Configurazione (app.config, letta da init_micro_batching):
+    MICRO_BATCH_ENABLED: Attiva il micro-batching (default True)
+    MICRO_BATCH_MAX_SIZE: Righe massime per batch (default 64)
+    MICRO_BATCH_MAX_WAIT_MS: Attesa massima dalla prima richiesta in coda (default 2)
+    MICRO_BATCH_TIMEOUT_MS: Attesa massima del risultato prima dell'inferenza diretta (default 1000)
+"""
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 2.0
+DEFAULT_TIMEOUT_MS = 1000.0
+
+
+class _Request:
+    """Riga in attesa di predizione"""
+
+    def __init__(self, predictor, row):
+        self.predictor = predictor
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coda e thread di batching per un modello (classe del predittore + tipo di modello)"""
+
+    def __init__(self, name, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 timeout_ms=DEFAULT_TIMEOUT_MS):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {
+            'requests': 0, 'batches': 0, 'rows_batched': 0, 'fallbacks': 0,
+            'timeouts': 0, 'worker_errors': 0, 'max_queue_depth': 0, 'wait_ms_total': 0.0
+        }
+        # Istogramma delle dimensioni dei batch: limite superiore del bucket -> batch
+        self._buckets = [1]
+        while self._buckets[-1] < max_batch_size:
+            self._buckets.append(min(self._buckets[-1] * 2, max_batch_size))
+        self._histogram = dict.fromkeys(self._buckets, 0)
+
+    def submit(self, predictor, row):
+        """
+        Accoda una riga e attende il risultato della sua inferenza
+
+        Args:
+            predictor: Predittore caricato (con il metodo di classe infer)
+            row (np.ndarray): Vettore delle features (float64)
+
+        Returns:
+            Risultato di infer() per la riga
+        """
+        request = _Request(predictor, row)
+        self._ensure_worker()
+        self._queue.put(request)
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], depth)
+
+        if not request.done.wait(self.timeout):
+            # Thread di batching bloccato o troppo lento: inferenza diretta della riga
+            with self._lock:
+                self._stats['timeouts'] += 1
+            logging.warning(f"Micro-batch {self.name}: nessun risultato entro {self.timeout * 1000} ms, inferenza diretta")
+            return type(predictor).infer(predictor.inference_model, row.reshape(1, -1))[0]
+
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _ensure_worker(self):
+        """Avvia il thread di batching al primo utilizzo"""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'micro-batch-{self.name}', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Raccoglie le richieste in batch ed esegue l'inferenza"""
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get())
+                # Scadenza calcolata dall'arrivo della prima richiesta: se il thread era
+                # occupato con il batch precedente, la coda accumulata parte subito
+                deadline = batch[0].enqueued + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - time.perf_counter()
+                    try:
+                        batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self._execute(batch)
+            except Exception as e:
+                # Il thread non deve terminare: le richieste senza risultato ricevono l'errore
+                logging.error(f"Errore nel thread di micro-batching {self.name}: {str(e)}")
+                with self._lock:
+                    self._stats['worker_errors'] += 1
+                for request in batch:
+                    if request.result is None and request.error is None:
+                        request.error = e
+            finally:
+                # Ogni chiamante viene sempre svegliato, anche dopo un errore
+                for request in batch:
+                    request.done.set()
+
+    def _execute(self, batch):
+        """Inferenza del batch, raggruppando le righe per istanza del predittore"""
+        started = time.perf_counter()
+        groups = {}
+        for request in batch:
+            groups.setdefault(id(request.predictor), []).append(request)
+
+        for requests in groups.values():
+            predictor = requests[0].predictor
+            try:
+                results = type(predictor).infer(predictor.inference_model, np.vstack([r.row for r in requests]))
+                for request, result in zip(requests, results):
+                    request.result = result
+            except Exception as e:
+                if len(requests) == 1:
+                    requests[0].error = e
+                else:
+                    self._execute_individually(predictor, requests)
+
+        self._record(batch, started)
+
+    def _execute_individually(self, predictor, requests):
+        """Riesegue le righe una per una dopo un errore del batch"""
+        with self._lock:
+            self._stats['fallbacks'] += 1
+        for request in requests:
+            try:
+                request.result = type(predictor).infer(predictor.inference_model, request.row.reshape(1, -1))[0]
+            except Exception as e:
+                request.error = e
+
+    def _record(self, batch, started):
+        """Aggiorna contatori e istogramma dopo un batch"""
+        size = len(batch)
+        bucket = next(limit for limit in self._buckets if size <= limit)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['rows_batched'] += size
+            self._stats['wait_ms_total'] += sum(started - r.enqueued for r in batch) * 1000
+            self._histogram[bucket] += 1
+
+    def stats(self):
+        """Profondità della coda, istogramma delle dimensioni dei batch e attese medie"""
+        with self._lock:
+            stats = dict(self._stats)
+            histogram = dict(self._histogram)
+        batches, rows = stats['batches'], stats['rows_batched']
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': stats['max_queue_depth'],
+            'requests': stats['requests'],
+            'batches': batches,
+            'avg_batch_size': round(rows / batches, 2) if batches else None,
+            'avg_wait_ms': round(stats['wait_ms_total'] / rows, 3) if rows else None,
+            'fallbacks': stats['fallbacks'],
+            'timeouts': stats['timeouts'],
+            'worker_errors': stats['worker_errors'],
+            'batch_size_histogram': {f'<={limit}': count for limit, count in histogram.items()},
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'timeout_ms': self.timeout * 1000
+        }
+
+
+class MicroBatcherPool:
+    """Un MicroBatcher per modello, creato al primo utilizzo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._batchers = {}
+        self.enabled = True
+        self.max_batch_size = DEFAULT_MAX_BATCH_SIZE
+        self.max_wait_ms = DEFAULT_MAX_WAIT_MS
+        self.timeout_ms = DEFAULT_TIMEOUT_MS
+
+    def configure(self, enabled=True, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                  timeout_ms=DEFAULT_TIMEOUT_MS):
+        """Imposta i parametri (validi per i batcher creati da qui in poi)"""
+        if max_batch_size < 1 or max_wait_ms < 0:
+            raise ValueError("MICRO_BATCH_MAX_SIZE deve essere >= 1 e MICRO_BATCH_MAX_WAIT_MS >= 0")
+        if timeout_ms <= max_wait_ms:
+            raise ValueError("MICRO_BATCH_TIMEOUT_MS deve essere maggiore di MICRO_BATCH_MAX_WAIT_MS")
+        with self._lock:
+            self.enabled = enabled
+            self.max_batch_size = max_batch_size
+            self.max_wait_ms = max_wait_ms
+            self.timeout_ms = timeout_ms
+            self._batchers = {}
+
+    def infer(self, predictor, row):
+        """
+        Inferenza di una riga: tramite il batcher del modello se attivo, altrimenti diretta
+
+        Args:
+            predictor: Predittore caricato dal registro
+            row (array-like): Vettore delle features nell'ordine del modello
+
+        Returns:
+            Risultato di infer() per la riga
+        """
+        # La conversione avviene nel thread del chiamante: una riga non numerica
+        # fallisce qui e non entra nel batch degli altri
+        row = np.asarray(row, dtype=np.float64).reshape(-1)
+        if not self.enabled:
+            return type(predictor).infer(predictor.inference_model, row.reshape(1, -1))[0]
+
+        key = f'{type(predictor).__name__}:{predictor.model_type}'
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = self._batchers[key] = MicroBatcher(
+                    key, self.max_batch_size, self.max_wait_ms, self.timeout_ms
+                )
+        return batcher.submit(predictor, row)
+
+    def stats(self):
+        """Statistiche di ogni batcher attivo"""
+        with self._lock:
+            batchers = dict(self._batchers)
+        return {
+            'enabled': self.enabled,
+            'models': {key: batcher.stats() for key, batcher in batchers.items()}
+        }
+
+
+micro_batchers = MicroBatcherPool()
+
+
+def init_micro_batching(app):
+    """Configura il micro-batching delle predizioni dai parametri dell'app"""
+    micro_batchers.configure(
+        enabled=app.config.get('MICRO_BATCH_ENABLED', True),
+        max_batch_size=int(app.config.get('MICRO_BATCH_MAX_SIZE', DEFAULT_MAX_BATCH_SIZE)),
+        max_wait_ms=float(app.config.get('MICRO_BATCH_MAX_WAIT_MS', DEFAULT_MAX_WAIT_MS)),
+        timeout_ms=float(app.config.get('MICRO_BATCH_TIMEOUT_MS', DEFAULT_TIMEOUT_MS))
+    )
+    logging.info(
+        f"Micro-batching predizioni: {'attivo' if micro_batchers.enabled else 'disattivo'} "
+        f"(max {micro_batchers.max_batch_size} righe, {micro_batchers.max_wait_ms} ms)"
+    )
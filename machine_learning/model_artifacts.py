@@ -0,0 +1,159 @@
+"""
+Formati degli artefatti dei modelli salvati in machine_learning/weights/
+
+    - pickle: il modello sklearn serializzato con joblib (formato storico)
+    - mmap: solo gli array del modello compilato (vedi compiled_models), non
+      compressi, senza oggetti sklearn
+    - compact: come mmap, con gli array degli alberi ridotti (vedi compact_models):
+      int32/float32, foglie quantizzate e pruning opzionali. I modelli lineari
+      restano invariati
+
+Tutti gli artefatti vengono letti con joblib.load(mmap_mode='r'). Nel formato
+mmap gli array dei nodi restano memory-mapped in sola lettura: le pagine del
+file vivono una volta sola nella page cache del sistema operativo e sono
+condivise da tutti i worker che caricano lo stesso modello. Con il formato
+pickle sklearn copia i nodi degli alberi in memoria privata di ogni processo.
+
+Gli artefatti vengono scritti in un file temporaneo e poi sostituiti con
+os.replace: un worker che ha ancora mappato il file precedente continua a
+leggerne il contenuto (stesso inode) fino al ricaricamento dal registro.
+"""
+import os
+import threading
+import time
+
+import joblib
+
+from machine_learning.compact_models import COMPACT_KINDS, compact_model, max_deviation
+from machine_learning.compiled_models import (
+    COMPILED_KINDS, CompiledTrees, build_compiled, compile_model, outputs_match, verified_probes
+)
+
+ARTIFACT_FORMATS = ('pickle', 'mmap', 'compact')
+
+# Classi ricostruibili dagli artefatti mmap e compact
+ARRAY_KINDS = {**COMPILED_KINDS, **COMPACT_KINDS}
+
+
+def dump_artifact(model_data, filepath, artifact_format='pickle', leaf_bits=None, prune_tolerance=0.0, evaluate=None):
+    """
+    Salva modello e metadati nel formato richiesto, sostituendo il file in modo atomico
+
+    Args:
+        model_data (dict): Metadati del predittore con il modello sklearn in 'model'
+        filepath (str): Percorso dell'artefatto
+        artifact_format (str): 'pickle', 'mmap' o 'compact'
+        leaf_bits (int, optional): Quantizzazione dei valori delle foglie (solo compact)
+        prune_tolerance (float): Tolleranza del pruning dei sottoalberi (solo compact)
+        evaluate (callable, optional): modello -> metriche di validazione, per gli scarti del formato compact
+
+    Returns:
+        dict: Formato, dimensione su disco, tempo di caricamento e riepilogo della compattazione
+
+    Raises:
+        ValueError: Se il formato non è supportato o il modello non è compilabile
+    """
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise ValueError(f"Formato artefatto non supportato: {artifact_format}. Usa {', '.join(ARTIFACT_FORMATS)}")
+    if artifact_format != 'compact' and (leaf_bits is not None or prune_tolerance):
+        raise ValueError("leaf_bits e prune_tolerance richiedono il formato compact")
+
+    model = model_data['model']
+    compiled = None
+    compaction = None
+    if artifact_format in ('mmap', 'compact'):
+        compiled = build_compiled(model)
+        if compiled is None:
+            raise ValueError(f"Modello {type(model).__name__} non supportato dal formato {artifact_format}")
+        if artifact_format == 'compact' and isinstance(compiled, CompiledTrees):
+            compiled, compaction = compact_artifact_model(model, compiled, leaf_bits, prune_tolerance, evaluate)
+        model_data = dict(
+            model_data,
+            model=None,
+            compiled_kind=type(compiled).__name__,
+            compiled_state=compiled.to_arrays()
+        )
+    model_data = dict(model_data, artifact_format=artifact_format)
+
+    # Stessa directory (os.replace atomico) e permessi come un file creato normalmente
+    temporary = f'{filepath}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        # Nessuna compressione: gli array devono restare mappabili
+        joblib.dump(model_data, temporary, compress=0)
+
+        start = time.perf_counter()
+        restored, _ = restore_model(load_artifact(temporary))
+        load_ms = (time.perf_counter() - start) * 1000
+
+        if compiled is not None:
+            # Il modello riletto dal file deve produrre gli stessi bit di sklearn (o del modello compatto)
+            reference = model if compaction is None else compiled
+            if not all(outputs_match(reference, restored, probe) for probe in verified_probes(compiled)):
+                raise ValueError(f"Artefatto {artifact_format} diverso dal modello in memoria")
+        del restored
+
+        os.replace(temporary, filepath)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    report = {
+        'artifact_format': artifact_format,
+        'size_bytes': os.path.getsize(filepath),
+        'load_ms': round(load_ms, 3)
+    }
+    if compaction is not None:
+        report['compaction'] = compaction
+    return report
+
+
+def compact_artifact_model(model, compiled, leaf_bits, prune_tolerance, evaluate=None):
+    """
+    Modello compatto verificato contro sklearn e riepilogo della compattazione
+
+    Lo scarto massimo misurato sulle righe di prova non deve superare il limite
+    max_error; con evaluate vengono aggiunte le differenze delle metriche di
+    validazione (compatto - originale).
+    """
+    compact = compact_model(compiled, leaf_bits, prune_tolerance)
+    compaction = dict(compact.compaction)
+
+    deviation = max(max_deviation(model, compact, probe) for probe in verified_probes(compiled))
+    # Margine per l'arrotondamento della somma degli alberi
+    if deviation > compaction['max_error'] * (1 + 1e-9) + 1e-12:
+        raise ValueError(f"Scarto del modello compatto ({deviation}) oltre il limite ({compaction['max_error']})")
+    compaction['max_probe_deviation'] = deviation
+
+    if evaluate is not None:
+        reference, candidate = evaluate(model), evaluate(compact)
+        compaction['metric_deltas'] = {
+            name: candidate[name] - value
+            for name, value in reference.items()
+            if isinstance(value, float) and isinstance(candidate.get(name), float)
+        }
+    compact.compaction = compaction
+    return compact, compaction
+
+
+def load_artifact(filepath):
+    """Legge un artefatto con gli array memory-mapped in sola lettura"""
+    return joblib.load(filepath, mmap_mode='r')
+
+
+def restore_model(model_data):
+    """
+    Modello e modello usato per le predizioni a partire da un artefatto letto
+
+    Args:
+        model_data (dict): Contenuto dell'artefatto
+
+    Returns:
+        tuple: (model, inference_model); nei formati mmap e compact entrambi sono il modello compilato
+    """
+    if model_data.get('artifact_format') in ('mmap', 'compact'):
+        compiled = ARRAY_KINDS[model_data['compiled_kind']].from_arrays(model_data['compiled_state'])
+        return compiled, compiled
+
+    model = model_data['model']
+    return model, compile_model(model)
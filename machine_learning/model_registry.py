@@ -0,0 +1,138 @@
+"""
+Registro dei modelli caricati in memoria
+
+Le predizioni usano il predittore già caricato invece di rileggere il file
+joblib a ogni richiesta. Ogni voce ricorda mtime e dimensione del file da cui è
+stata caricata: se il file cambia (nuovo training, copia da un altro processo o
+da un deploy) la voce viene ricaricata al primo utilizzo successivo.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from database.singleflight import SingleFlight
+
+
+class ModelRegistry:
+    """Predittori addestrati caricati, per classe e tipo di modello"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._models = {}
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def artifact_signature(path):
+        """(mtime in ns, dimensione) del file del modello, None se non esiste"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, predictor_class, model_type='random_forest'):
+        """
+        Predittore caricato per classe e tipo di modello
+
+        Args:
+            predictor_class: Classe del predittore (es. RentalCountPredictor)
+            model_type (str): Tipo di modello salvato
+
+        Returns:
+            Istanza del predittore con il modello caricato
+
+        Raises:
+            FileNotFoundError: Se il modello non è stato addestrato
+        """
+        key = (predictor_class.__name__, model_type)
+        path = predictor_class.model_path(model_type)
+        signature = self.artifact_signature(path)
+
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry['signature'] == signature:
+                return entry['predictor']
+            if signature is None:
+                # File rimosso: il modello in memoria non è più valido
+                self._models.pop(key, None)
+
+        if signature is None:
+            raise FileNotFoundError(f"File modello non trovato: {path}")
+
+        # Richieste concorrenti caricano lo stesso file una sola volta
+        return self._flight.do(
+            f'{key[0]}:{model_type}:{signature}',
+            lambda: self._load(key, predictor_class, model_type, path, signature)
+        )
+
+    def _load(self, key, predictor_class, model_type, path, signature):
+        """Carica il modello dal file e lo registra con la firma del file"""
+        predictor = predictor_class(model_type=model_type)
+        predictor.load_model()
+
+        with self._lock:
+            previous = self._models.get(key)
+            self._models[key] = {
+                'predictor': predictor,
+                'signature': signature,
+                'path': path,
+                'loaded_at': datetime.now().isoformat()
+            }
+        if previous is not None:
+            self.logger.info(f"Modello {key[0]} ({model_type}) ricaricato: file modificato")
+        return predictor
+
+    def invalidate(self, predictor_class, model_type=None):
+        """Rimuove dal registro i modelli di una classe (o solo di un tipo)"""
+        with self._lock:
+            for key in list(self._models):
+                if key[0] == predictor_class.__name__ and model_type in (None, key[1]):
+                    del self._models[key]
+
+    def warm_up(self, predictor_classes, model_type='random_forest'):
+        """
+        Carica in memoria i modelli addestrati delle classi indicate
+
+        Returns:
+            dict: Per classe: status ('loaded', 'missing', 'error') e durata in ms
+        """
+        results = {}
+        for predictor_class in predictor_classes:
+            start = time.perf_counter()
+            try:
+                self.get(predictor_class, model_type)
+                status = 'loaded'
+            except FileNotFoundError:
+                status = 'missing'
+            except Exception as e:
+                self.logger.error(f"Errore nel caricamento di {predictor_class.__name__}: {str(e)}")
+                status = 'error'
+            results[predictor_class.__name__] = {
+                'status': status,
+                'duration_ms': round((time.perf_counter() - start) * 1000, 2)
+            }
+        return results
+
+    def loaded_models(self):
+        """Modelli attualmente in memoria con il file da cui sono stati caricati"""
+        with self._lock:
+            return [
+                {
+                    'predictor': name,
+                    'model_type': model_type,
+                    'artifact': os.path.basename(entry['path']),
+                    'artifact_size': entry['signature'][1],
+                    'artifact_modified': datetime.fromtimestamp(entry['signature'][0] / 1e9).isoformat(),
+                    'loaded_at': entry['loaded_at'],
+                    'artifact_format': entry['predictor'].artifact_format,
+                    # Classe usata per le predizioni: compilata (Compiled*) o il modello sklearn
+                    'inference_engine': type(entry['predictor'].inference_model).__name__
+                }
+                for (name, model_type), entry in self._models.items()
+            ]
+
+
+model_registry = ModelRegistry()
@@ -15,17 +15,27 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report, confusion_matrix
 import os
 import logging
+import time
 from database.data_loader import BikeDataLoader
+from machine_learning.model_registry import model_registry
+from machine_learning.batch_features import build_feature_matrix, build_feature_row, merge_results
+from machine_learning.prediction_cache import prediction_cache
+from machine_learning.model_artifacts import dump_artifact, load_artifact, restore_model
 
 class PeakDemandPredictor:
     """Predittore dei picchi di domanda"""
     
+    # Tipi di modello supportati da initialize_model()
+    MODEL_TYPES = ('logistic_regression', 'decision_tree', 'random_forest')
+    
     def __init__(self, model_type='random_forest', peak_threshold_percentile=80):
         
         print("Initializing PeakDemandPredictor with model_type:", model_type)
 
         self.model_type = model_type
         self.model = None
+        self.inference_model = None  # Versione compilata di model usata per le predizioni
+        self.validation_data = None  # (X_test, y_test) dell'ultimo training
         self.is_trained = False
         self.peak_threshold_percentile = peak_threshold_percentile
         self.peak_threshold_value = None
@@ -150,6 +160,7 @@ class PeakDemandPredictor:
             # Inizializzare e addestrare il modello
             self.model = self.initialize_model()
             self.model.fit(X_train, y_train)
+            self.validation_data = (X_test, y_test)
             
             # Valutazione del modello
             y_pred = self.model.predict(X_test)
@@ -170,19 +181,45 @@ class PeakDemandPredictor:
             raise
 
     @classmethod
-    def predict(cls, features):
+    def infer(cls, model, X):
+        """
+        Inferenza vettorizzata su una matrice di features
+        
+        Args:
+            model: Classificatore addestrato (sklearn o compilato)
+            X (np.ndarray): Matrice delle features (una riga per predizione)
+            
+        Returns:
+            list: (is_peak, peak_probability) per ogni riga
+        """
+        # Una sola inferenza: la classe predetta è quella con probabilità massima
+        # (come in predict() dei classificatori sklearn)
+        if hasattr(model, 'predict_proba'):
+            probabilities = model.predict_proba(X)
+            is_peak = model.classes_[np.argmax(probabilities, axis=1)]
+            peak_probability = probabilities[:, 1]
+        else:
+            is_peak = model.predict(X)
+            peak_probability = is_peak.astype(float) # 1.0 se predetto picco, 0.0 altrimenti
+        return [(bool(peak), float(probability)) for peak, probability in zip(is_peak, peak_probability)]
+    
+    @classmethod
+    def predict(cls, features, model_type='random_forest'):
         """
         Predice se ci sarà un picco di domanda
         
         Args:
             features (dict): Dizionario con features per predizione
+            model_type (str): Tipo di modello addestrato da usare
         
         Returns:
             dict: Predizione di picco e probabilità
         """
-        # Load model se non ancora caricato
-        predictor = cls()
-        predictor.load_model()
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        # Modello pre-addestrato dal registro (ricaricato solo se il file è cambiato)
+        predictor = model_registry.get(cls, model_type)
 
         if not predictor.is_trained:
             raise ValueError("Modello non ancora addestrato")
@@ -191,18 +228,12 @@ class PeakDemandPredictor:
             # Preparare features per predizione
             X = predictor.prepare_single_features(features)
 
-            # Effettuare predizione
-            is_peak = predictor.model.predict(X)[0]
-
-            # Calcolare probabilità se disponibile
-            if hasattr(predictor.model, 'predict_proba'):
-                peak_probability = predictor.model.predict_proba(X)[0, 1]
-            else:
-                peak_probability = float(is_peak) # Mettere 1.0 se predetto picco, 0.0 altrimenti
+            # Effettuare predizione (dalla cache o raggruppata con le richieste concorrenti)
+            is_peak, peak_probability = prediction_cache.infer(predictor, X[0])
             
             return {
-                'is_peak': bool(is_peak),
-                'peak_probability': float(peak_probability),
+                'is_peak': is_peak,
+                'peak_probability': peak_probability,
                 'peak_threshold': predictor.peak_threshold_value,
                 'model_type': predictor.model_type,
                 'features_used': list(features.keys())
@@ -212,6 +243,48 @@ class PeakDemandPredictor:
             predictor.logger.error(f"Errore durante la predizione: {str(e)}")
             raise
     
+    @classmethod
+    def predict_batch(cls, inputs, model_type='random_forest'):
+        """
+        Predice i picchi di domanda per più righe con una sola chiamata al modello
+        
+        Args:
+            inputs (list or dict): Lista di record o colonne {feature: [valori]}
+            model_type (str): Tipo di modello addestrato da usare
+            
+        Returns:
+            dict: Risultati nell'ordine dell'input (con 'error' per le righe non valide) e riepilogo
+        """
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        predictor = model_registry.get(cls, model_type)
+
+        if not predictor.is_trained:
+            raise ValueError("Modello non ancora addestrato")
+
+        X, valid, errors, rows = build_feature_matrix(inputs, predictor.feature_names)
+        start = time.perf_counter()
+        results = []
+        if len(valid):
+            results = [
+                {'is_peak': is_peak, 'peak_probability': peak_probability}
+                for is_peak, peak_probability in prediction_cache.infer_batch(predictor, X)
+            ]
+        inference_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        return {
+            'predictions': merge_results(rows, valid, results, errors),
+            'model_type': predictor.model_type,
+            'peak_threshold': predictor.peak_threshold_value,
+            'summary': {
+                'rows': rows,
+                'predicted': int(len(valid)),
+                'errors': len(errors),
+                'inference_ms': inference_ms
+            }
+        }
+    
     def prepare_single_features(self, features):
         """
         Prepara features per una singola predizione
@@ -221,6 +294,9 @@ class PeakDemandPredictor:
             
         Returns:
             np.ndarray: Array 2D con features processate
+            
+        Raises:
+            InvalidFeaturesError: Se una feature è nulla, non numerica o fuori scala
         """
         
         # Crea array con valori di default
@@ -234,7 +310,8 @@ class PeakDemandPredictor:
                 self.logger.warning(f"Feature mancante: {feature}, uso valore di default 0")
                 feature_values.append(0)  # Valore di default se mancante
         
-        return np.array(feature_values).reshape(1, -1) # Array 2D
+        # Array 2D; valori nulli, non numerici o fuori scala sono un errore come nelle predizioni batch
+        return build_feature_row(dict(zip(self.feature_names, feature_values)), self.feature_names)
     
     def calculate_metrics(self, y_true, y_pred, y_pred_proba):
         """Calcola metriche di valutazione per classificazione"""
@@ -274,20 +351,44 @@ class PeakDemandPredictor:
                 'f1_score': 0.0, 'roc_auc': 0.0, 'pr_auc': 0.0
             }
     
-    def save_model(self, filename=None):
-        """Salva il modello addestrato"""
+    def validation_metrics(self, model):
+        """
+        Metriche sul test set dell'ultimo training calcolate con un altro modello
+        (es. la versione compatta dell'artefatto)
+        """
+        X_test, y_test = self.validation_data
+        y_pred = model.predict(X_test)
+        y_pred_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else y_pred
+        return self.calculate_metrics(y_test, y_pred, y_pred_proba)
+    
+    @classmethod
+    def model_path(cls, model_type, filename=None):
+        """Percorso del file del modello in machine_learning/weights/"""
+        if filename is None:
+            filename = f'peak_demand_predictor_{model_type}.joblib'
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(current_dir, 'weights', filename)
+    
+    def save_model(self, filename=None, artifact_format='pickle', leaf_bits=None, prune_tolerance=0.0):
+        """
+        Salva il modello addestrato
+        
+        Args:
+            filename (str, optional): Nome del file in machine_learning/weights/
+            artifact_format (str): 'pickle' (modello sklearn), 'mmap' (array del modello compilato, condivisi tra i worker)
+                o 'compact' (array ridotti)
+            leaf_bits (int, optional): Bit dei valori delle foglie quantizzati (solo compact)
+            prune_tolerance (float): Scarto massimo dei sottoalberi collassati (solo compact)
+            
+        Returns:
+            dict: Dimensione, tempo di caricamento e, per compact, riepilogo della compattazione
+        """
         if not self.is_trained:
             raise ValueError("Nessun modello addestrato da salvare")
 
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'peak_demand_predictor_{self.model_type}.joblib'
-
-            # Percorso assoluto per salvare in /progetto/machine_learning/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
             
             # Crea directory se non esiste
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -304,9 +405,14 @@ class PeakDemandPredictor:
                 'created_at': pd.Timestamp.now().isoformat()
             }
             
-            # Salvare con joblib
-            joblib.dump(model_data, filepath)
+            # Salvare con joblib nel formato richiesto (sostituzione atomica del file)
+            evaluate = self.validation_metrics if self.validation_data is not None else None
+            report = dump_artifact(model_data, filepath, artifact_format, leaf_bits, prune_tolerance, evaluate)
+            
+            # Le predizioni successive useranno il nuovo modello
+            model_registry.invalidate(type(self), self.model_type)
             self.logger.info(f"Modello picchi salvato in {filepath}")
+            return report
             
         except Exception as e:
             self.logger.error(f"Errore nel salvataggio modello: {str(e)}")
@@ -316,17 +422,11 @@ class PeakDemandPredictor:
         """Carica un modello pre-addestrato"""
         
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'peak_demand_predictor_{self.model_type}.joblib'
-
-            # Percorso assoluto per salvare in /progetto/machine_learning/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
             
             # Carica modello e metadati
-            model_data = joblib.load(filepath)
+            model_data = load_artifact(filepath)
             
             # Verifica struttura dati
             required_keys = ['model', 'model_type', 'feature_names', 'is_trained']
@@ -335,7 +435,8 @@ class PeakDemandPredictor:
                     raise ValueError(f"File modello corrotto: manca '{key}'")
             
             # Ripristina stato del modello
-            self.model = model_data['model']
+            self.model, self.inference_model = restore_model(model_data)
+            self.artifact_format = model_data.get('artifact_format', 'pickle')
             self.model_type = model_data['model_type']
             self.feature_names = model_data['feature_names']
             self.peak_threshold_value = model_data['peak_threshold_value']
@@ -0,0 +1,234 @@
+"""
+Cache dei risultati delle predizioni per vettore di features quantizzato
+
+Le features discrete (season, yr, mnth, hr, holiday, weekday, workingday,
+weathersit) entrano nella chiave così come sono; quelle meteo continue (temp,
+atemp, hum, windspeed) vengono arrotondate alla risoluzione configurata, se
+diversa da 0. Solo la chiave è quantizzata: un miss viene sempre calcolato sulla
+riga esatta. Con una risoluzione attiva un hit restituisce quindi la predizione
+di un'altra riga dello stesso intervallo (approssimazione opzionale); con la
+risoluzione di default (0) la cache restituisce solo risultati del vettore esatto.
+
+Ogni modello (classe del predittore + tipo di modello) ha la sua cache LRU con
+scadenza (TTL). Il registro restituisce un nuovo predittore solo quando
+l'artefatto cambia: al primo accesso con un predittore diverso la cache del
+modello viene svuotata.
+
+Configurazione (app.config, letta da init_prediction_cache):
+    PREDICTION_CACHE_ENABLED: Attiva la cache (default True)
+    PREDICTION_CACHE_MAX_ENTRIES: Vettori memorizzati per modello (default 10000)
+    PREDICTION_CACHE_TTL_SECONDS: Durata di un risultato, 0 senza scadenza (default 300)
+    PREDICTION_CACHE_RESOLUTION: Passo di quantizzazione delle features continue
+        nella chiave, 0 per usare i valori esatti (default 0)
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from machine_learning.micro_batcher import micro_batchers
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_RESOLUTION = 0.0
+
+# Features meteo normalizzate 0-1 quantizzate nella chiave
+CONTINUOUS_FEATURES = ('temp', 'atemp', 'hum', 'windspeed')
+
+
+class _ModelCache:
+    """Risultati di un modello, validi per un solo predittore caricato"""
+
+    def __init__(self, name, predictor, resolution):
+        self.name = name
+        self.predictor = predictor
+        self.entries = OrderedDict()
+        features = getattr(predictor, 'weather_features', None) or predictor.feature_names
+        self.continuous = np.array([feature in CONTINUOUS_FEATURES for feature in features]) if resolution else None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+
+class PredictionCache:
+    """Cache LRU/TTL davanti all'inferenza di ogni predittore"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._invalidations = {}
+        self.enabled = True
+        self.max_entries = DEFAULT_MAX_ENTRIES
+        self.ttl_seconds = DEFAULT_TTL_SECONDS
+        self.resolution = DEFAULT_RESOLUTION
+
+    def configure(self, enabled=True, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                  resolution=DEFAULT_RESOLUTION):
+        """Imposta i parametri e svuota la cache"""
+        if max_entries < 1 or ttl_seconds < 0 or resolution < 0:
+            raise ValueError(
+                "PREDICTION_CACHE_MAX_ENTRIES deve essere >= 1, "
+                "PREDICTION_CACHE_TTL_SECONDS e PREDICTION_CACHE_RESOLUTION >= 0"
+            )
+        with self._lock:
+            self.enabled = enabled
+            self.max_entries = max_entries
+            self.ttl_seconds = ttl_seconds
+            self.resolution = resolution
+            self._models = {}
+            self._invalidations = {}
+
+    def _keys(self, cache, X):
+        """Chiavi delle righe di X, con le features continue arrotondate alla risoluzione"""
+        continuous = cache.continuous
+        if continuous is not None and continuous.any():
+            X = X.copy()
+            X[:, continuous] = np.rint(X[:, continuous] / self.resolution) * self.resolution
+        return [row.tobytes() for row in np.ascontiguousarray(X)]
+
+    def _model_cache(self, predictor):
+        """Cache del modello, svuotata se il registro ha caricato un nuovo predittore"""
+        key = f'{type(predictor).__name__}:{predictor.model_type}'
+        with self._lock:
+            cache = self._models.get(key)
+            if cache is None or cache.predictor is not predictor:
+                if cache is not None:
+                    self._invalidations[key] = self._invalidations.get(key, 0) + 1
+                cache = self._models[key] = _ModelCache(key, predictor, self.resolution)
+            return cache
+
+    def _lookup(self, cache, keys):
+        """Risultati in cache per le chiavi (None se assenti o scaduti)"""
+        now = time.monotonic()
+        results = []
+        with self._lock:
+            for key in keys:
+                entry = cache.entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del cache.entries[key]
+                    cache.stats['expirations'] += 1
+                    entry = None
+                if entry is None:
+                    cache.stats['misses'] += 1
+                    results.append(None)
+                else:
+                    cache.entries.move_to_end(key)
+                    cache.stats['hits'] += 1
+                    results.append(entry)
+        return results
+
+    def _store(self, cache, items):
+        """Memorizza (chiave, risultato) rimuovendo i meno recenti oltre max_entries"""
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            # Il predittore è stato sostituito durante l'inferenza: risultati del vecchio modello
+            if self._models.get(cache.name) is not cache:
+                return
+            for key, result in items:
+                cache.entries[key] = (result, expires)
+                cache.entries.move_to_end(key)
+            while len(cache.entries) > self.max_entries:
+                cache.entries.popitem(last=False)
+                cache.stats['evictions'] += 1
+
+    def infer(self, predictor, row):
+        """
+        Predizione singola: dalla cache o tramite il micro-batching
+
+        Args:
+            predictor: Predittore caricato dal registro
+            row (array-like): Vettore delle features nell'ordine del modello
+
+        Returns:
+            Risultato di infer() per la riga
+        """
+        row = np.asarray(row, dtype=np.float64).reshape(1, -1)
+        if not self.enabled:
+            return micro_batchers.infer(predictor, row[0])
+
+        cache = self._model_cache(predictor)
+        key = self._keys(cache, row)[0]
+        entry = self._lookup(cache, [key])[0]
+        if entry is not None:
+            return entry[0]
+
+        result = micro_batchers.infer(predictor, row[0])
+        self._store(cache, [(key, result)])
+        return result
+
+    def infer_batch(self, predictor, X):
+        """
+        Predizioni di più righe: una sola inferenza per le righe non in cache (una per chiave)
+
+        Args:
+            predictor: Predittore caricato dal registro
+            X (np.ndarray): Matrice delle features (float64) nell'ordine del modello
+
+        Returns:
+            list: Risultato di infer() per ogni riga
+        """
+        if not self.enabled:
+            return type(predictor).infer(predictor.inference_model, X)
+
+        cache = self._model_cache(predictor)
+        keys = self._keys(cache, X)
+        results = [entry[0] if entry is not None else None for entry in self._lookup(cache, keys)]
+
+        missing = {}
+        for index, (key, entry) in enumerate(zip(keys, results)):
+            if entry is None:
+                missing.setdefault(key, []).append(index)
+        if missing:
+            first = [indices[0] for indices in missing.values()]
+            computed = type(predictor).infer(predictor.inference_model, X[first])
+            for indices, result in zip(missing.values(), computed):
+                for index in indices:
+                    results[index] = result
+            self._store(cache, zip(missing, computed))
+        return results
+
+    def clear(self):
+        """Svuota la cache di tutti i modelli"""
+        with self._lock:
+            self._models = {}
+
+    def stats(self):
+        """Hit rate, voci e rimozioni per modello"""
+        with self._lock:
+            models = {key: (len(cache.entries), dict(cache.stats)) for key, cache in self._models.items()}
+            invalidations = dict(self._invalidations)
+        result = {}
+        for key in set(models) | set(invalidations):
+            entries, stats = models.get(key, (0, {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}))
+            lookups = stats['hits'] + stats['misses']
+            result[key] = dict(
+                stats,
+                entries=entries,
+                hit_rate=round(stats['hits'] / lookups, 4) if lookups else None,
+                invalidations=invalidations.get(key, 0)
+            )
+        return {
+            'enabled': self.enabled,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'resolution': self.resolution,
+            'models': result
+        }
+
+
+prediction_cache = PredictionCache()
+
+
+def init_prediction_cache(app):
+    """Configura la cache delle predizioni dai parametri dell'app"""
+    prediction_cache.configure(
+        enabled=app.config.get('PREDICTION_CACHE_ENABLED', True),
+        max_entries=int(app.config.get('PREDICTION_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        ttl_seconds=float(app.config.get('PREDICTION_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS)),
+        resolution=float(app.config.get('PREDICTION_CACHE_RESOLUTION', DEFAULT_RESOLUTION))
+    )
+    logging.info(
+        f"Cache predizioni: {'attiva' if prediction_cache.enabled else 'disattiva'} "
+        f"(max {prediction_cache.max_entries} voci per modello, TTL {prediction_cache.ttl_seconds} s, "
+        f"risoluzione {prediction_cache.resolution})"
+    )
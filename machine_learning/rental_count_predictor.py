@@ -17,16 +17,26 @@ from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 from sklearn.model_selection import cross_val_score, KFold
 import os
 import logging
+import time
 
 from database.data_loader import BikeDataLoader
+from machine_learning.model_registry import model_registry
+from machine_learning.batch_features import build_feature_matrix, build_feature_row, merge_results
+from machine_learning.prediction_cache import prediction_cache
+from machine_learning.model_artifacts import dump_artifact, load_artifact, restore_model
 
 
 class RentalCountPredictor:
     """Predittore del numero totale di noleggi"""
     
+    # Tipi di modello supportati da initialize_model()
+    MODEL_TYPES = ('linear_regression', 'decision_tree', 'random_forest')
+    
     def __init__(self, model_type='random_forest'):
         self.model_type = model_type
         self.model = None
+        self.inference_model = None  # Versione compilata di model usata per le predizioni
+        self.validation_data = None  # (X_test, y_test) dell'ultimo training
         self.is_trained = False
 
         # Features usate per il training/predizione. 
@@ -110,6 +120,7 @@ class RentalCountPredictor:
             # Inizializzare e addestrare il modello
             self.model = self.initialize_model()
             self.model.fit(X_train, y_train)
+            self.validation_data = (X_test, y_test)
             
             # Valutazione del modello
             y_pred = self.model.predict(X_test)
@@ -129,19 +140,37 @@ class RentalCountPredictor:
             raise
 
     @classmethod
-    def predict(cls, features):
+    def infer(cls, model, X):
+        """
+        Inferenza vettorizzata su una matrice di features
+        
+        Args:
+            model: Regressore addestrato (sklearn o compilato)
+            X (np.ndarray): Matrice delle features (una riga per predizione)
+            
+        Returns:
+            list: Numero di noleggi predetto (intero non negativo) per ogni riga
+        """
+        predictions = np.maximum(0, np.round(model.predict(X)))  # Non può essere negativo
+        return [int(prediction) for prediction in predictions]
+    
+    @classmethod
+    def predict(cls, features, model_type='random_forest'):
         """
         Effettua predizione del numero di noleggi
         
         Args:
             features (dict): Dizionario con features per predizione
+            model_type (str): Tipo di modello addestrato da usare
             
         Returns:
             dict: Predizione e confidence score
         """
-        # Load il modello pre-addestrato
-        predictor = cls()
-        predictor.load_model()
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        # Modello pre-addestrato dal registro (ricaricato solo se il file è cambiato)
+        predictor = model_registry.get(cls, model_type)
 
         if not predictor.is_trained:
             raise ValueError("Modello non ancora addestrato")
@@ -150,9 +179,8 @@ class RentalCountPredictor:
             # Preparare features per predizione
             X = predictor.prepare_features_single(features)
             
-            # Effettuare predizione
-            prediction = predictor.model.predict(X)[0] # [0] per ottenere valore scalare
-            prediction = max(0, int(round(prediction)))  # Non può essere negativo
+            # Effettuare predizione (dalla cache o raggruppata con le richieste concorrenti)
+            prediction = prediction_cache.infer(predictor, X[0])
             
             return {
                 'predicted_rentals': prediction,
@@ -164,6 +192,44 @@ class RentalCountPredictor:
             predictor.logger.error(f"Errore durante la predizione: {str(e)}")
             raise
     
+    @classmethod
+    def predict_batch(cls, inputs, model_type='random_forest'):
+        """
+        Predice il numero di noleggi per più righe con una sola chiamata al modello
+        
+        Args:
+            inputs (list or dict): Lista di record o colonne {feature: [valori]}
+            model_type (str): Tipo di modello addestrato da usare
+            
+        Returns:
+            dict: Risultati nell'ordine dell'input (con 'error' per le righe non valide) e riepilogo
+        """
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        predictor = model_registry.get(cls, model_type)
+
+        if not predictor.is_trained:
+            raise ValueError("Modello non ancora addestrato")
+
+        X, valid, errors, rows = build_feature_matrix(inputs, predictor.feature_names)
+        start = time.perf_counter()
+        results = []
+        if len(valid):
+            results = [{'predicted_rentals': prediction} for prediction in prediction_cache.infer_batch(predictor, X)]
+        inference_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        return {
+            'predictions': merge_results(rows, valid, results, errors),
+            'model_type': predictor.model_type,
+            'summary': {
+                'rows': rows,
+                'predicted': int(len(valid)),
+                'errors': len(errors),
+                'inference_ms': inference_ms
+            }
+        }
+    
     def prepare_features_single(self, features):
         """
         Prepara features per una singola predizione
@@ -173,6 +239,9 @@ class RentalCountPredictor:
             
         Returns:
             np.ndarray: Array 2D con features processate
+            
+        Raises:
+            InvalidFeaturesError: Se una feature è nulla, non numerica o fuori scala
         """
         
         # Crea array con valori di default
@@ -186,7 +255,8 @@ class RentalCountPredictor:
                 self.logger.warning(f"Feature mancante: {feature}, uso valore di default 0")
                 feature_values.append(0)  # Valore di default se mancante
         
-        return np.array(feature_values).reshape(1, -1) # Array 2D
+        # Array 2D; valori nulli, non numerici o fuori scala sono un errore come nelle predizioni batch
+        return build_feature_row(dict(zip(self.feature_names, feature_values)), self.feature_names)
     
     
     def calculate_metrics(self, y_true, y_pred, X_test=None, X_train=None, y_train=None):
@@ -252,20 +322,42 @@ class RentalCountPredictor:
         
         return metrics
     
-    def save_model(self, filename=None):
-        """Salva il modello addestrato"""
+    def validation_metrics(self, model):
+        """
+        Metriche sul test set dell'ultimo training calcolate con un altro modello
+        (es. la versione compatta dell'artefatto)
+        """
+        X_test, y_test = self.validation_data
+        return self.calculate_metrics(y_test, model.predict(X_test))
+    
+    @classmethod
+    def model_path(cls, model_type, filename=None):
+        """Percorso del file del modello in machine_learning/weights/"""
+        if filename is None:
+            filename = f'rental_count_predictor_{model_type}.joblib'
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(current_dir, 'weights', filename)
+    
+    def save_model(self, filename=None, artifact_format='pickle', leaf_bits=None, prune_tolerance=0.0):
+        """
+        Salva il modello addestrato
+        
+        Args:
+            filename (str, optional): Nome del file in machine_learning/weights/
+            artifact_format (str): 'pickle' (modello sklearn), 'mmap' (array del modello compilato, condivisi tra i worker)
+                o 'compact' (array ridotti)
+            leaf_bits (int, optional): Bit dei valori delle foglie quantizzati (solo compact)
+            prune_tolerance (float): Scarto massimo dei sottoalberi collassati (solo compact)
+            
+        Returns:
+            dict: Dimensione, tempo di caricamento e, per compact, riepilogo della compattazione
+        """
         if not self.is_trained:
             raise ValueError("Nessun modello addestrato da salvare")
 
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'rental_count_predictor_{self.model_type}.joblib'
-
-            # Percorso assoluto per salvare in /progetto/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
 
             # Creare directory se non esiste
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -280,9 +372,14 @@ class RentalCountPredictor:
                 'created_at': pd.Timestamp.now().isoformat()
             }
 
-            # Salvare con joblib
-            joblib.dump(model_data, filepath)
+            # Salvare con joblib nel formato richiesto (sostituzione atomica del file)
+            evaluate = self.validation_metrics if self.validation_data is not None else None
+            report = dump_artifact(model_data, filepath, artifact_format, leaf_bits, prune_tolerance, evaluate)
+            
+            # Le predizioni successive useranno il nuovo modello
+            model_registry.invalidate(type(self), self.model_type)
             self.logger.info(f"Modello salvato in {filepath}")
+            return report
             
             
         except Exception as e:
@@ -293,17 +390,11 @@ class RentalCountPredictor:
         """Carica un modello pre-addestrato"""
         
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'rental_count_predictor_{self.model_type}.joblib'
-
-            # Percorso assoluto per salvare in /progetto/machine_learning/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
             
             # Caricare dati del modello
-            model_data = joblib.load(filepath)
+            model_data = load_artifact(filepath)
             
             # Verificare struttura dati
             required_keys = ['model', 'model_type', 'feature_names', 'is_trained']
@@ -312,7 +403,8 @@ class RentalCountPredictor:
                     raise ValueError(f"File modello corrotto: manca '{key}'")
             
             # Ripristinare stato del modello
-            self.model = model_data['model']
+            self.model, self.inference_model = restore_model(model_data)
+            self.artifact_format = model_data.get('artifact_format', 'pickle')
             self.model_type = model_data['model_type']
             self.feature_names = model_data['feature_names']
             self.training_metrics = model_data.get('training_metrics', {})
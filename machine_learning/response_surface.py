@@ -0,0 +1,154 @@
+"""
+Superficie di risposta precalcolata per il modello di impatto meteo
+
+Il modello di impatto meteo usa solo cinque input: weathersit (1-4) e temp,
+atemp, hum, windspeed normalizzati 0-1. Al training la predizione del modello
+viene calcolata una volta su una griglia regolare di questi input e salvata come
+array float32 (il reticolo). Le predizioni successive interpolano in modo
+multilineare tra i 2^5 vertici della cella che contiene la riga: poche
+operazioni NumPy indipendenti dalla dimensione del modello.
+
+Gli input fuori dalla griglia vengono riportati al bordo più vicino. Lo scarto
+dal modello reale dipende dalla densità della griglia e viene misurato al
+training (vedi interpolation_error).
+"""
+import time
+
+import numpy as np
+
+# Punti per asse delle features continue (passo 1/16 su 0-1)
+DEFAULT_LATTICE_POINTS = 17
+
+# Limiti dei punti per asse: 4 x 33^4 valori float32 sono circa 19 MB
+MIN_LATTICE_POINTS = 2
+MAX_LATTICE_POINTS = 33
+
+# Righe casuali nel dominio della griglia per la misura dello scarto
+ERROR_PROBE_ROWS = 20000
+
+
+class ResponseSurface:
+    """Reticolo regolare di predizioni con interpolazione multilineare"""
+
+    STATE = ('lows', 'steps', 'values')
+
+    def __init__(self, lows, steps, values):
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.steps = np.asarray(steps, dtype=np.float64)
+        self.values = values
+        self.n_features_in_ = values.ndim
+
+        shape = np.array(values.shape)
+        self._last = (shape - 1).astype(np.float64)
+        self._max_index = shape - 2
+        # Passo nell'array piatto per ogni asse e spiazzamento dei vertici di una cella
+        self._strides = np.array([int(np.prod(shape[axis + 1:])) for axis in range(len(shape))], dtype=np.intp)
+        self._corners = (np.arange(2 ** len(shape))[:, np.newaxis] >> np.arange(len(shape))[::-1]) & 1 == 1
+        self._corner_offsets = self._corners.astype(np.intp) @ self._strides
+        self._flat = values.reshape(-1)
+
+    @classmethod
+    def build(cls, model, axes):
+        """
+        Calcola il reticolo delle predizioni del modello
+
+        Args:
+            model: Regressore addestrato (predict su una matrice di features)
+            axes (list): (minimo, massimo, punti) per ogni feature, nell'ordine del modello
+
+        Returns:
+            ResponseSurface
+        """
+        grids = [np.linspace(low, high, points) for low, high, points in axes]
+        mesh = np.meshgrid(*grids, indexing='ij')
+        X = np.stack([axis.reshape(-1) for axis in mesh], axis=1)
+        values = np.asarray(model.predict(X), dtype=np.float64).reshape(mesh[0].shape)
+        steps = [(high - low) / (points - 1) for low, high, points in axes]
+        return cls([low for low, _, _ in axes], steps, values.astype(np.float32))
+
+    def to_arrays(self):
+        """Stato salvato nell'artefatto (memory-mapped al caricamento)"""
+        return {name: getattr(self, name) for name in self.STATE}
+
+    @classmethod
+    def from_arrays(cls, state):
+        """Superficie dallo stato di to_arrays"""
+        return cls(state['lows'], state['steps'], state['values'])
+
+    @property
+    def lattice_shape(self):
+        return tuple(int(size) for size in self.values.shape)
+
+    def predict(self, X):
+        """
+        Predizioni interpolate
+
+        Args:
+            X (array-like): Matrice delle features (una riga per predizione)
+
+        Returns:
+            np.ndarray: Predizione interpolata per ogni riga
+
+        Raises:
+            ValueError: Se X contiene NaN o infiniti (non hanno una cella nel reticolo)
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, self.n_features_in_)
+        if not np.isfinite(X).all():
+            raise ValueError("L'input contiene NaN o valori infiniti: impossibile interpolare la superficie di risposta")
+        position = np.clip((X - self.lows) / self.steps, 0.0, self._last)
+        index = np.minimum(position.astype(np.intp), self._max_index)
+        fraction = (position - index)[:, np.newaxis, :]
+        weights = np.where(self._corners, fraction, 1.0 - fraction).prod(axis=2)
+        corners = self._flat.take((index @ self._strides)[:, np.newaxis] + self._corner_offsets)
+        return (corners * weights).sum(axis=1)
+
+
+def weather_axes(lattice_points=DEFAULT_LATTICE_POINTS):
+    """Assi della griglia meteo: weathersit 1-4 e le quattro features continue su 0-1"""
+    if not MIN_LATTICE_POINTS <= lattice_points <= MAX_LATTICE_POINTS:
+        raise ValueError(f"lattice_points deve essere tra {MIN_LATTICE_POINTS} e {MAX_LATTICE_POINTS}")
+    return [(1.0, 4.0, 4)] + [(0.0, 1.0, lattice_points)] * 4
+
+
+def interpolation_error(model, surface, X_test, seed=44):
+    """
+    Scarto tra la superficie e il modello reale
+
+    Misurato sulle righe di test e su righe casuali uniformi nel dominio della
+    griglia (weathersit intero), dove cadono anche le combinazioni rare.
+
+    Returns:
+        dict: Scarto massimo e medio per insieme di righe
+    """
+    rng = np.random.default_rng(seed)
+    low = surface.lows
+    high = surface.lows + surface.steps * (np.array(surface.values.shape) - 1)
+    X_random = rng.uniform(low, high, size=(ERROR_PROBE_ROWS, len(low)))
+    X_random[:, 0] = np.rint(X_random[:, 0])
+
+    errors = {}
+    for name, X in (('test', np.asarray(X_test, dtype=np.float64)), ('random', X_random)):
+        deviation = np.abs(surface.predict(X) - np.asarray(model.predict(X), dtype=np.float64))
+        errors[name] = {'max': float(deviation.max()), 'mean': float(deviation.mean())}
+    return errors
+
+
+def build_weather_surface(model, X_test, lattice_points=DEFAULT_LATTICE_POINTS):
+    """
+    Superficie di risposta del modello meteo e metriche per training_metrics
+
+    Returns:
+        tuple: (ResponseSurface, dict con griglia, dimensione, tempi e scarti)
+    """
+    start = time.perf_counter()
+    surface = ResponseSurface.build(model, weather_axes(lattice_points))
+    build_ms = (time.perf_counter() - start) * 1000
+    errors = interpolation_error(model, surface, X_test)
+    return surface, {
+        'lattice_points': lattice_points,
+        'lattice_shape': list(surface.lattice_shape),
+        'lattice_bytes': int(surface.values.nbytes),
+        'build_ms': round(build_ms, 1),
+        'max_interpolation_error': max(error['max'] for error in errors.values()),
+        'interpolation_error': errors
+    }
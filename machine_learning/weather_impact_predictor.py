@@ -14,16 +14,28 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import os
 import logging
+import time
 
 from database.data_loader import BikeDataLoader
+from machine_learning.model_registry import model_registry
+from machine_learning.batch_features import build_feature_matrix, build_feature_row, merge_results
+from machine_learning.prediction_cache import prediction_cache
+from machine_learning.model_artifacts import dump_artifact, load_artifact, restore_model
+from machine_learning.response_surface import DEFAULT_LATTICE_POINTS, ResponseSurface, build_weather_surface
 
 
 class WeatherImpactPredictor:
     """Predittore dell'impatto meteo sui noleggi"""
     
+    # Tipi di modello supportati da initialize_model()
+    MODEL_TYPES = ('linear_regression', 'random_forest')
+    
     def __init__(self, model_type='random_forest'):
         self.model_type = model_type
         self.model = None
+        self.inference_model = None  # Versione compilata di model usata per le predizioni
+        self.validation_data = None  # (X_test, y_test) dell'ultimo training
+        self.response_surface = None  # Reticolo precalcolato delle predizioni (opzionale)
         self.baseline_model = None
         self.is_trained = False
 
@@ -52,9 +64,13 @@ class WeatherImpactPredictor:
         else:
             raise ValueError(f"Tipo di modello non supportato: {self.model_type}")
     
-    def train(self):
+    def train(self, response_surface=False, lattice_points=DEFAULT_LATTICE_POINTS):
         """
         Addestra il modello sui dati di training
+        
+        Args:
+            response_surface (bool): Precalcola il reticolo delle predizioni usato poi da predict
+            lattice_points (int): Punti per asse delle features continue del reticolo
                     
         Returns:
             dict: Metriche di training
@@ -91,11 +107,22 @@ class WeatherImpactPredictor:
             # Addestrare modello
             self.model = self.initialize_model()
             self.model.fit(X_train, y_train)
+            self.validation_data = (X_test, y_test)
             
             # Valutazione
             y_pred = self.model.predict(X_test)
             self.training_metrics = self.calculate_metrics(y_test, y_pred)
             
+            # Superficie di risposta: predizioni interpolate, con lo scarto dal modello reale nelle metriche
+            self.response_surface = None
+            if response_surface:
+                self.response_surface, surface_metrics = build_weather_surface(self.model, X_test, lattice_points)
+                self.training_metrics['response_surface'] = surface_metrics
+                self.logger.info(
+                    f"Superficie di risposta {surface_metrics['lattice_shape']}: "
+                    f"scarto massimo {surface_metrics['max_interpolation_error']:.4f}"
+                )
+            
             # Marcare come addestrato
             self.is_trained = True
             
@@ -141,18 +168,35 @@ class WeatherImpactPredictor:
             }
     
     @classmethod
-    def predict(cls, features):
+    def infer(cls, model, X):
+        """
+        Inferenza vettorizzata su una matrice di features meteo
+        
+        Args:
+            model: Regressore addestrato (sklearn o compilato)
+            X (np.ndarray): Matrice delle features meteo (una riga per predizione)
+            
+        Returns:
+            list: Impatto predetto per ogni riga
+        """
+        return [float(impact) for impact in model.predict(X)]
+    
+    @classmethod
+    def predict(cls, features, model_type='random_forest'):
         """
         Predice l'impatto meteo basato sulle features fornite
         Args:
             features (dict): Dizionario con le features necessarie
+            model_type (str): Tipo di modello addestrato da usare
         
         Returns:
             dict: Predizione e dettagli del modello
         """
-        # Carica il modello
-        predictor = cls()
-        predictor.load_model()
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        # Modello pre-addestrato dal registro (ricaricato solo se il file è cambiato)
+        predictor = model_registry.get(cls, model_type)
 
         if not predictor.is_trained:
             raise ValueError("Modello non ancora addestrato")
@@ -161,11 +205,11 @@ class WeatherImpactPredictor:
             # Prepara le features
             X = predictor.prepare_features_single(features)
 
-            # Effettua la predizione
-            y_pred = predictor.model.predict(X)
+            # Effettua la predizione (dalla cache o raggruppata con le richieste concorrenti)
+            predicted_impact = prediction_cache.infer(predictor, X[0])
             
             return {
-                'predicted_impact': y_pred[0],
+                'predicted_impact': predicted_impact,
                 'model_type': predictor.model_type,
                 'features_used': list(features.keys())
             }
@@ -174,6 +218,44 @@ class WeatherImpactPredictor:
             predictor.logger.error(f"Errore durante la predizione: {str(e)}")
             raise
     
+    @classmethod
+    def predict_batch(cls, inputs, model_type='random_forest'):
+        """
+        Predice l'impatto meteo per più righe con una sola chiamata al modello
+        
+        Args:
+            inputs (list or dict): Lista di record o colonne {feature: [valori]}
+            model_type (str): Tipo di modello addestrato da usare
+            
+        Returns:
+            dict: Risultati nell'ordine dell'input (con 'error' per le righe non valide) e riepilogo
+        """
+        if model_type not in cls.MODEL_TYPES:
+            raise ValueError(f"Tipo di modello non supportato: {model_type}")
+
+        predictor = model_registry.get(cls, model_type)
+
+        if not predictor.is_trained:
+            raise ValueError("Modello non ancora addestrato")
+
+        X, valid, errors, rows = build_feature_matrix(inputs, predictor.weather_features)
+        start = time.perf_counter()
+        results = []
+        if len(valid):
+            results = [{'predicted_impact': impact} for impact in prediction_cache.infer_batch(predictor, X)]
+        inference_ms = round((time.perf_counter() - start) * 1000, 3)
+
+        return {
+            'predictions': merge_results(rows, valid, results, errors),
+            'model_type': predictor.model_type,
+            'summary': {
+                'rows': rows,
+                'predicted': int(len(valid)),
+                'errors': len(errors),
+                'inference_ms': inference_ms
+            }
+        }
+    
     def prepare_features_single(self, features):
         """
         Prepara features per una singola predizione
@@ -183,6 +265,9 @@ class WeatherImpactPredictor:
             
         Returns:
             np.ndarray: Array 2D con features processate
+            
+        Raises:
+            InvalidFeaturesError: Se una feature è nulla, non numerica o fuori scala
         """
         
         # Crea array con valori di default
@@ -196,24 +281,47 @@ class WeatherImpactPredictor:
                 self.logger.warning(f"Feature mancante: {feature}, uso valore di default 0")
                 feature_values.append(0)  # Valore di default se mancante
         
-        return np.array(feature_values).reshape(1, -1) # Array 2D
+        # Array 2D; valori nulli, non numerici o fuori scala sono un errore come nelle predizioni batch
+        return build_feature_row(dict(zip(self.weather_features, feature_values)), self.weather_features)
     
   
 
-    def save_model(self, filename=None):
-        """Salva il modello addestrato"""
+    def validation_metrics(self, model):
+        """
+        Metriche sul test set dell'ultimo training calcolate con un altro modello
+        (es. la versione compatta dell'artefatto)
+        """
+        X_test, y_test = self.validation_data
+        return self.calculate_metrics(y_test, model.predict(X_test))
+
+    @classmethod
+    def model_path(cls, model_type, filename=None):
+        """Percorso del file del modello in machine_learning/weights/"""
+        if filename is None:
+            filename = f'weather_impact_predictor_{model_type}.joblib'
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(current_dir, 'weights', filename)
+    
+    def save_model(self, filename=None, artifact_format='pickle', leaf_bits=None, prune_tolerance=0.0):
+        """
+        Salva il modello addestrato
+        
+        Args:
+            filename (str, optional): Nome del file in machine_learning/weights/
+            artifact_format (str): 'pickle' (modello sklearn), 'mmap' (array del modello compilato, condivisi tra i worker)
+                o 'compact' (array ridotti)
+            leaf_bits (int, optional): Bit dei valori delle foglie quantizzati (solo compact)
+            prune_tolerance (float): Scarto massimo dei sottoalberi collassati (solo compact)
+            
+        Returns:
+            dict: Dimensione, tempo di caricamento e, per compact, riepilogo della compattazione
+        """
         if not self.is_trained:
             raise ValueError("Nessun modello addestrato da salvare")
 
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'weather_impact_predictor_{self.model_type}.joblib'
-            
-            # Percorso assoluto per salvare in /progetto/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
         
             # Crea directory se non esiste
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
@@ -227,14 +335,20 @@ class WeatherImpactPredictor:
                 'temporal_features': self.temporal_features,
                 'weather_baselines': self.weather_baselines,
                 'hourly_baseline': getattr(self, 'hourly_baseline', {}),
+                'response_surface': self.response_surface.to_arrays() if self.response_surface is not None else None,
                 'training_metrics': self.training_metrics,
                 'is_trained': self.is_trained,
                 'created_at': pd.Timestamp.now().isoformat()
             }
             
-            # Salvare con joblib
-            joblib.dump(model_data, filepath)
+            # Salvare con joblib nel formato richiesto (sostituzione atomica del file)
+            evaluate = self.validation_metrics if self.validation_data is not None else None
+            report = dump_artifact(model_data, filepath, artifact_format, leaf_bits, prune_tolerance, evaluate)
+            
+            # Le predizioni successive useranno il nuovo modello
+            model_registry.invalidate(type(self), self.model_type)
             self.logger.info(f"Modello impatto meteo salvato in {filepath}")
+            return report
             
         except Exception as e:
             self.logger.error(f"Errore nel salvataggio modello: {str(e)}")
@@ -244,17 +358,11 @@ class WeatherImpactPredictor:
         """Carica un modello pre-addestrato"""
         
         try:
-            # Nome file di default
-            if filename is None:
-                filename = f'weather_impact_predictor_{self.model_type}.joblib'
-            
-            # Percorso assoluto per salvare in /progetto/weights/
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            models_dir = os.path.join(current_dir, 'weights')
-            filepath = os.path.join(models_dir, filename)
+            # Percorso assoluto in /progetto/machine_learning/weights/
+            filepath = self.model_path(self.model_type, filename)
             
             # Carica modello e metadati completi
-            model_data = joblib.load(filepath)
+            model_data = load_artifact(filepath)
             
             # Verifica struttura dati
             required_keys = ['model', 'model_type', 'is_trained']
@@ -263,7 +371,14 @@ class WeatherImpactPredictor:
                     raise ValueError(f"File modello corrotto: manca '{key}'")
             
             # Ripristina stato del modello
-            self.model = model_data['model']
+            self.model, self.inference_model = restore_model(model_data)
+            self.artifact_format = model_data.get('artifact_format', 'pickle')
+            
+            # Con la superficie di risposta le predizioni interpolano il reticolo invece di usare il modello
+            self.response_surface = None
+            if model_data.get('response_surface') is not None:
+                self.response_surface = ResponseSurface.from_arrays(model_data['response_surface'])
+                self.inference_model = self.response_surface
             self.baseline_model = model_data.get('baseline_model')
             self.model_type = model_data['model_type']
             self.weather_features = model_data.get('weather_features', self.weather_features)
@@ -1,50 +1,59 @@
-from flask import Blueprint, jsonify, Response
+from flask import Blueprint, jsonify, current_app, request
 from database.data_analytics import BikeAnalytics
+from database.analytics_filters import AnalyticsFilters, InvalidFilterError
+from database.analytics_cube import AnalyticsCube
+from database.anomaly_detection import DEFAULT_THRESHOLD
+from routes.conditional import conditional_get
+from routes.coalescing import coalesced
+from routes.streaming import export_response, requested_format, UnsupportedFormatError
 import logging
-import csv
-import io
 from datetime import datetime
 
 analytics_bp = Blueprint('analytics', __name__)
 analytics_service = BikeAnalytics()
 
-def create_csv_response(data, filename, headers):
-    """Crea una risposta CSV per il download"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Scrivi gli headers
-    writer.writerow(headers)
-    
-    # Scrivi i dati
-    if isinstance(data, list):
-        for row in data:
-            if isinstance(row, dict):
-                writer.writerow([row.get(header, '') for header in headers])
-            else:
-                writer.writerow(row)
-    elif isinstance(data, dict):
-        # Se è un dizionario, converti in lista di righe
-        for key, value in data.items():
-            writer.writerow([key, value])
-    
-    output.seek(0)
-    
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={
-            'Content-Disposition': f'attachment; filename={filename}',
-            'Content-Type': 'text/csv; charset=utf-8'
-        }
-    )
+# Numero massimo di anomalie restituite per richiesta
+MAX_ANOMALIES = 1000
+
+# Ampiezza massima della finestra mobile (in periodi)
+MAX_WINDOW = 10000
+
+def is_approx():
+    """True se la richiesta chiede la stima approssimata (?approx=true)"""
+    return request.args.get('approx', 'false').lower() in ('true', '1', 'yes')
+
+def time_series_window():
+    """Finestra mobile richiesta (?window=), None per il default della frequenza"""
+    value = request.args.get('window')
+    if not value:
+        return None
+    try:
+        window = int(value)
+    except ValueError:
+        window = 0
+    if not 1 <= window <= MAX_WINDOW:
+        raise InvalidFilterError(f"'window' deve essere un intero tra 1 e {MAX_WINDOW}")
+    return window
+
+@analytics_bp.errorhandler(InvalidFilterError)
+def invalid_filter(error):
+    """Filtri non validi nella query string"""
+    return jsonify({'success': False, 'error': str(error)}), 400
+
+@analytics_bp.errorhandler(UnsupportedFormatError)
+def unsupported_format(error):
+    """Formato di export non supportato (?format=)"""
+    return jsonify({'success': False, 'error': str(error)}), 400
 
 # curl -X GET http://localhost:5001/api/analytics/mean-rental-by-hour
 @analytics_bp.route('/mean-rental-by-hour', methods=['GET']) 
+@conditional_get
 def mean_rental_by_hour():
     """Raggruppa per ora e calcola la media dei noleggi"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
     try:
-        data = analytics_service.get_hourly_rental_patterns()
+        data = coalesced(lambda: analytics_service.get_hourly_rental_patterns(filters, approx=is_approx()))
         
         if not data:
             return jsonify({
@@ -55,6 +64,7 @@ def mean_rental_by_hour():
         return jsonify({
             'success': True,
             'data': data,
+            'filters': filters.to_dict(),
             'message': 'Analisi pattern orari completata con successo'
         }), 200
         
@@ -67,10 +77,13 @@ def mean_rental_by_hour():
 
 # curl -X GET http://localhost:5001/api/analytics/weekday-vs-weekend
 @analytics_bp.route('/weekday-vs-weekend', methods=['GET'])
+@conditional_get
 def weekday_vs_weekend():
     """Confronta noleggi medi tra giorni lavorativi e weekend"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
     try:
-        data = analytics_service.get_weekday_weekend_comparison()
+        data = coalesced(lambda: analytics_service.get_weekday_weekend_comparison(filters, approx=is_approx()))
         
         if not data:
             return jsonify({
@@ -81,6 +94,7 @@ def weekday_vs_weekend():
         return jsonify({
             'success': True,
             'data': data,
+            'filters': filters.to_dict(),
             'message': 'Confronto weekday vs weekend completato con successo'
         }), 200
         
@@ -93,10 +107,13 @@ def weekday_vs_weekend():
 
 # curl -X GET http://localhost:5001/api/analytics/weather-impact
 @analytics_bp.route('/weather-impact', methods=['GET'])
+@conditional_get
 def weather_impact():
     """Analizza l'impatto delle condizioni meteo sui noleggi"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
     try:
-        data = analytics_service.get_weather_impact_analysis()
+        data = coalesced(lambda: analytics_service.get_weather_impact_analysis(filters, approx=is_approx()))
         
         if not data:
             return jsonify({
@@ -107,6 +124,7 @@ def weather_impact():
         return jsonify({
             'success': True,
             'data': data,
+            'filters': filters.to_dict(),
             'message': 'Analisi impatto meteo completata con successo'
         }), 200
         
@@ -117,13 +135,266 @@ def weather_impact():
             'error': f'Errore durante l\'analisi meteo: {str(e)}'
         }), 500
 
+# curl -X GET "http://localhost:5001/api/analytics/user-types?workingday=1"
+@analytics_bp.route('/user-types', methods=['GET'])
+@conditional_get
+def user_types():
+    """Medie di utenti casuali, registrati e totali per ora × giorno della settimana"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_user_type_analysis(filters))
+        
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'Nessun dato trovato nel database'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'filters': filters.to_dict(),
+            'message': 'Analisi tipi utenti completata con successo'
+        }), 200
+        
+    except Exception as e:
+        logging.error(f"Errore nell'analisi tipi utenti: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante l\'analisi tipi utenti: {str(e)}'
+        }), 500
+
+# curl -X GET http://localhost:5001/api/analytics/seasonal-trends
+@analytics_bp.route('/seasonal-trends', methods=['GET'])
+@conditional_get
+def seasonal_trends():
+    """Media e totale dei noleggi per stagione × mese"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_seasonal_trends(filters))
+        
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'Nessun dato trovato nel database'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'filters': filters.to_dict(),
+            'message': 'Analisi trend stagionali completata con successo'
+        }), 200
+        
+    except Exception as e:
+        logging.error(f"Errore nell'analisi trend stagionali: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante l\'analisi trend stagionali: {str(e)}'
+        }), 500
+
+# curl -X GET "http://localhost:5001/api/analytics/anomalies?start=2012-10-01&end=2012-11-30&threshold=3.5"
+@analytics_bp.route('/anomalies', methods=['GET'])
+@conditional_get
+def anomalies():
+    """Ore con noleggi anomali rispetto a ora, tipo di giorno e meteo (z-score robusti)"""
+    filters = AnalyticsFilters.from_args(request.args)
+    direction = request.args.get('direction', 'both')
+    
+    try:
+        threshold = float(request.args.get('threshold', DEFAULT_THRESHOLD))
+        if not threshold > 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': "'threshold' deve essere un numero positivo"}), 400
+    
+    try:
+        limit = int(request.args.get('limit', 100))
+        if not 1 <= limit <= MAX_ANOMALIES:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': f"'limit' deve essere un intero tra 1 e {MAX_ANOMALIES}"}), 400
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_anomalies(filters, threshold, direction, limit))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Errore nel rilevamento anomalie: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante il rilevamento anomalie: {str(e)}'
+        }), 500
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'Nessun dato trovato nel database'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': data,
+        'filters': filters.to_dict(),
+        'message': 'Rilevamento anomalie completato con successo'
+    }), 200
+
+# curl -X GET "http://localhost:5001/api/analytics/time-series?freq=day&window=7&start=2012-01-01"
+@analytics_bp.route('/time-series', methods=['GET'])
+@conditional_get
+def time_series():
+    """Serie temporale dei noleggi con medie mobili e variazioni giorno/settimana"""
+    filters = AnalyticsFilters.from_args(request.args)
+    freq = request.args.get('freq', 'day')
+    window = time_series_window()
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_time_series(freq, window, filters))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Errore nel calcolo della serie temporale: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante il calcolo della serie temporale: {str(e)}'
+        }), 500
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'Nessun dato trovato nel database'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': data,
+        'filters': filters.to_dict(),
+        'message': 'Serie temporale calcolata con successo'
+    }), 200
+
+# curl -X GET "http://localhost:5001/api/analytics/quantiles?by=hour&q=0.5,0.9,0.95,0.99"
+@analytics_bp.route('/quantiles', methods=['GET'])
+@conditional_get
+def quantiles():
+    """Quantili del numero di noleggi per ora, giorno della settimana o meteo"""
+    dimension = request.args.get('by', 'hour')
+    
+    try:
+        requested = request.args.get('q')
+        quantile_list = (
+            tuple(float(q) for q in requested.split(',')) if requested
+            else BikeAnalytics.DEFAULT_QUANTILES
+        )
+        if not all(0 <= q <= 1 for q in quantile_list):
+            raise ValueError
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': "'q' deve essere una lista di valori tra 0 e 1 separati da virgola"
+        }), 400
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_quantile_distribution(dimension, quantile_list))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Errore nel calcolo dei quantili: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante il calcolo dei quantili: {str(e)}'
+        }), 500
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'Nessun dato trovato nel database'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': data,
+        'message': 'Distribuzione quantili calcolata con successo'
+    }), 200
+
+# curl -X GET "http://localhost:5001/api/analytics/cube?dims=season,hr,workingday&measures=cnt"
+@analytics_bp.route('/cube', methods=['GET'])
+@conditional_get
+def cube():
+    """Roll-up ad hoc sulle dimensioni categoriali dal cubo precalcolato"""
+    dims = [d for d in request.args.get('dims', '').split(',') if d]
+    measures = [m for m in request.args.get('measures', ','.join(AnalyticsCube.MEASURES)).split(',') if m]
+    
+    try:
+        # Slice opzionali su qualsiasi dimensione (es. season=2,3)
+        where = {
+            dimension: [int(v) for v in request.args[dimension].split(',') if v]
+            for dimension in AnalyticsCube.DIMENSIONS if request.args.get(dimension)
+        }
+        data = coalesced(lambda: analytics_service.get_cube_rollup(dims, measures, where))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Errore nel roll-up del cubo: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante il roll-up del cubo: {str(e)}'
+        }), 500
+    
+    if not data:
+        return jsonify({
+            'success': False,
+            'error': 'Nessun dato trovato nel database'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': data,
+        'message': 'Roll-up del cubo completato con successo'
+    }), 200
+
+# curl -X GET http://localhost:5001/api/analytics/dashboard
+@analytics_bp.route('/dashboard', methods=['GET'])
+@conditional_get
+def dashboard():
+    """Restituisce tutte le analisi della dashboard in un'unica risposta"""
+    filters = AnalyticsFilters.from_args(request.args)
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_dashboard(current_app._get_current_object(), filters, approx=is_approx()))
+        
+        if not data:
+            return jsonify({
+                'success': False,
+                'error': 'Nessun dato trovato nel database'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'data': data,
+            'filters': filters.to_dict(),
+            'message': 'Dashboard calcolata con successo'
+        }), 200
+        
+    except Exception as e:
+        logging.error(f"Errore nel calcolo della dashboard: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore durante il calcolo della dashboard: {str(e)}'
+        }), 500
+
 
 # curl -X GET http://localhost:5001/api/analytics/mean-rental-by-hour/download
 @analytics_bp.route('/mean-rental-by-hour/download', methods=['GET'])
+@conditional_get
 def download_hourly_patterns_csv():
     """Download analisi pattern orari in formato CSV convenzionale"""
+    filters = AnalyticsFilters.from_args(request.args)
+    export_format = requested_format()
+    
     try:
-        data = analytics_service.get_hourly_rental_patterns()
+        data = coalesced(lambda: analytics_service.get_hourly_rental_patterns(filters, approx=is_approx()))
         
         if not data:
             return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
@@ -148,9 +419,9 @@ def download_hourly_patterns_csv():
             csv_rows.append([hour, avg_rentals, max_rentals, min_rentals, sample_count, total_rentals])
         
         headers = ['hour', 'avg_rentals', 'max_rentals', 'min_rentals', 'sample_count', 'total_rentals']
-        filename = f'hourly_patterns_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'hourly_patterns_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response(csv_rows, filename, headers)
+        return export_response(csv_rows, headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore download CSV pattern orari: {str(e)}")
@@ -159,10 +430,14 @@ def download_hourly_patterns_csv():
         
 # curl -X GET http://localhost:5001/api/analytics/weekday-vs-weekend/download
 @analytics_bp.route('/weekday-vs-weekend/download', methods=['GET'])
+@conditional_get
 def download_weekday_weekend_csv():
     """Download weekday vs weekend in CSV"""
+    filters = AnalyticsFilters.from_args(request.args)
+    export_format = requested_format()
+    
     try:
-        data = analytics_service.get_weekday_weekend_comparison()
+        data = coalesced(lambda: analytics_service.get_weekday_weekend_comparison(filters, approx=is_approx()))
         
         if not data:
             return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
@@ -186,9 +461,9 @@ def download_weekday_weekend_csv():
             csv_rows.append([week_type, avg_rentals, max_rentals, min_rentals, sample_count, total_rentals])
         
         headers = ['Week-type', 'avg_rentals', 'max_rentals', 'min_rentals', 'sample_count', 'total_rentals']
-        filename = f'weekday_weekend_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'weekday_weekend_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response(csv_rows, filename, headers)
+        return export_response(csv_rows, headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore download CSV weekday: {str(e)}")
@@ -197,10 +472,14 @@ def download_weekday_weekend_csv():
         
 # curl -X GET http://localhost:5001/api/analytics/weather-impact/download
 @analytics_bp.route('/weather-impact/download', methods=['GET'])
+@conditional_get
 def download_weather_impact_csv():
     """Download impatto meteo in CSV"""
+    filters = AnalyticsFilters.from_args(request.args)
+    export_format = requested_format()
+    
     try:
-        data = analytics_service.get_weather_impact_analysis()
+        data = coalesced(lambda: analytics_service.get_weather_impact_analysis(filters, approx=is_approx()))
         
         if not data:
             return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
@@ -236,10 +515,111 @@ def download_weather_impact_csv():
             return jsonify({'success': False, 'error': 'Nessun dato valido trovato'}), 404
         
         headers = ['weather_code', 'weather_description', 'average_rentals', 'total_records', 'min_rentals', 'max_rentals']
-        filename = f'weather_impact_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'weather_impact_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response(csv_rows, filename, headers)
+        return export_response(csv_rows, headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore download CSV meteo: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# curl -X GET "http://localhost:5001/api/analytics/user-types/download?format=ndjson"
+@analytics_bp.route('/user-types/download', methods=['GET'])
+@conditional_get
+def download_user_types_csv():
+    """Download griglia tipi utenti (ora × giorno) in CSV/NDJSON"""
+    filters = AnalyticsFilters.from_args(request.args)
+    export_format = requested_format()
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_user_type_analysis(filters))
+        
+        if not data:
+            return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
+        
+        rows = (
+            [
+                pattern['hour'],
+                pattern['weekday'],
+                analytics_service.DAY_NAMES[pattern['weekday']],
+                pattern['avg_casual'],
+                pattern['avg_registered'],
+                pattern['avg_total']
+            ]
+            for pattern in data['user_patterns']
+        )
+        
+        headers = ['hour', 'weekday', 'day_name', 'avg_casual', 'avg_registered', 'avg_total']
+        filename = f'user_types_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        
+        return export_response(rows, headers, filename, export_format)
+        
+    except Exception as e:
+        logging.error(f"Errore download CSV tipi utenti: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# curl -X GET http://localhost:5001/api/analytics/seasonal-trends/download
+@analytics_bp.route('/seasonal-trends/download', methods=['GET'])
+@conditional_get
+def download_seasonal_trends_csv():
+    """Download trend stagionali (stagione × mese) in CSV/NDJSON"""
+    filters = AnalyticsFilters.from_args(request.args)
+    export_format = requested_format()
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_seasonal_trends(filters))
+        
+        if not data:
+            return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
+        
+        rows = (
+            [
+                trend['season'],
+                trend['season_name'],
+                trend['month'],
+                trend['avg_rentals'],
+                trend['total_rentals']
+            ]
+            for trend in data['monthly_trends']
+        )
+        
+        headers = ['season', 'season_name', 'month', 'avg_rentals', 'total_rentals']
+        filename = f'seasonal_trends_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        
+        return export_response(rows, headers, filename, export_format)
+        
+    except Exception as e:
+        logging.error(f"Errore download CSV trend stagionali: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# curl -X GET "http://localhost:5001/api/analytics/time-series/download?freq=week&format=ndjson"
+@analytics_bp.route('/time-series/download', methods=['GET'])
+@conditional_get
+def download_time_series_csv():
+    """Download serie temporale con finestre mobili in CSV/NDJSON"""
+    filters = AnalyticsFilters.from_args(request.args)
+    freq = request.args.get('freq', 'day')
+    window = time_series_window()
+    export_format = requested_format()
+    
+    try:
+        data = coalesced(lambda: analytics_service.get_time_series(freq, window, filters))
+        
+        if not data:
+            return jsonify({'success': False, 'error': 'Nessun dato trovato'}), 404
+        
+        # Colonne dalla serie: un range senza periodi produce un file con la sola intestazione
+        headers = data['columns']
+        rows = ([point[header] for header in headers] for point in data['points'])
+        filename = f'time_series_{freq}_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+        
+        return export_response(rows, headers, filename, export_format)
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logging.error(f"Errore download CSV serie temporale: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
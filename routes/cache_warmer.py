@@ -0,0 +1,129 @@
+"""
+Riscaldamento delle cache dopo il caricamento dei dati
+
+Al termine di /api/data/load le analisi standard vengono calcolate su un pool di
+thread in background (popolando la cache dei risultati della nuova versione del
+dataset) e i modelli addestrati vengono caricati nel registro: le prime richieste
+degli utenti dopo un caricamento trovano risultati e modelli già pronti.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database.data_analytics import BikeAnalytics
+from database.dataset_version import get_dataset_version
+from machine_learning.model_registry import model_registry
+from machine_learning.peak_demand_predictor import PeakDemandPredictor
+from machine_learning.weather_impact_predictor import WeatherImpactPredictor
+from machine_learning.rental_count_predictor import RentalCountPredictor
+
+PREDICTOR_CLASSES = (PeakDemandPredictor, WeatherImpactPredictor, RentalCountPredictor)
+
+
+class CacheWarmer:
+    """Job di riscaldamento eseguito in background dopo ogni caricamento"""
+
+    def __init__(self, analytics=None, max_workers=4, model_loader=None):
+        self.analytics = analytics or BikeAnalytics()
+        self.max_workers = max_workers
+        # Funzione senza argomenti che carica i modelli e ne restituisce lo stato per modello
+        self.model_loader = model_loader
+        self._lock = threading.Lock()
+        self._run_id = 0
+        self._status = {'state': 'idle'}
+
+    def tasks(self):
+        """Analisi standard da precalcolare (stessi parametri delle routes senza filtri)"""
+        return {
+            'hourly_patterns': self.analytics.get_hourly_rental_patterns,
+            'weekday_weekend': self.analytics.get_weekday_weekend_comparison,
+            'weather_impact': self.analytics.get_weather_impact_analysis,
+            'seasonal_trends': self.analytics.get_seasonal_trends,
+            'user_types': self.analytics.get_user_type_analysis,
+            'dataset_statistics': self.analytics.get_dataset_statistics,
+            'anomalies': self.analytics.get_anomalies
+        }
+
+    def start(self, app):
+        """
+        Avvia il riscaldamento in un thread in background
+
+        Args:
+            app: Istanza Flask (ogni task apre il proprio app context)
+
+        Returns:
+            dict: Stato del job appena avviato
+        """
+        with self._lock:
+            self._run_id += 1
+            run_id = self._run_id
+            with app.app_context():
+                version = get_dataset_version()
+            self._status = {
+                'state': 'running',
+                'dataset_version': version,
+                'started_at': datetime.now().isoformat(),
+                'tasks': {},
+                'models': {}
+            }
+            status = dict(self._status)
+
+        thread = threading.Thread(target=self._run, args=(app, run_id), name='cache-warmer', daemon=True)
+        thread.start()
+        return status
+
+    def _run(self, app, run_id):
+        """Esegue le analisi e il caricamento dei modelli, poi aggiorna lo stato"""
+        start = time.perf_counter()
+        state = 'completed'
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='warmup') as executor:
+                futures = {
+                    name: executor.submit(self._run_task, app, task)
+                    for name, task in self.tasks().items()
+                }
+                models = executor.submit(self.model_loader) if self.model_loader else None
+                tasks = {name: future.result() for name, future in futures.items()}
+                models = models.result() if models else {}
+
+            if any(task['status'] != 'ok' for task in tasks.values()):
+                state = 'completed_with_errors'
+
+        except Exception as e:
+            logging.error(f"Errore nel riscaldamento delle cache: {str(e)}")
+            tasks, models, state = {}, {}, 'failed'
+
+        duration_ms = round((time.perf_counter() - start) * 1000, 2)
+        with self._lock:
+            # Un caricamento successivo ha già avviato un nuovo job
+            if run_id != self._run_id:
+                return
+            self._status.update({
+                'state': state,
+                'finished_at': datetime.now().isoformat(),
+                'duration_ms': duration_ms,
+                'tasks': tasks,
+                'models': models
+            })
+        logging.info(f"Riscaldamento cache {state} in {duration_ms} ms")
+
+    def _run_task(self, app, task):
+        """Esegue un'analisi nel proprio app context"""
+        start = time.perf_counter()
+        try:
+            with app.app_context():
+                status = 'ok' if task() is not None else 'empty'
+        except Exception as e:
+            logging.error(f"Errore nel riscaldamento di {task.__name__}: {str(e)}")
+            status = 'error'
+        return {'status': status, 'duration_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+    def status(self):
+        """Stato dell'ultimo job di riscaldamento"""
+        with self._lock:
+            return dict(self._status)
+
+
+cache_warmer = CacheWarmer(model_loader=lambda: model_registry.warm_up(PREDICTOR_CLASSES))
@@ -0,0 +1,35 @@
+"""
+Coalescenza delle richieste di analisi identiche e concorrenti
+
+La chiave è la stessa dell'ETag (versione del dataset + endpoint + parametri):
+richieste identiche in arrivo mentre la prima è ancora in calcolo attendono e ne
+condividono il risultato invece di ripetere le stesse query su SQLite.
+
+Con app.config['SINGLEFLIGHT_FILE_LOCK'] = True la coalescenza vale anche tra
+processi (più worker), tramite lock su file nella cartella instance/singleflight.
+"""
+import os
+from flask import current_app
+
+from database.singleflight import SingleFlight
+from routes.conditional import dataset_etag
+
+LOCK_DIRNAME = 'singleflight'
+
+request_flight = SingleFlight()
+
+
+def coalesced(function):
+    """
+    Esegue la computazione di una richiesta una sola volta tra le richieste concorrenti identiche
+
+    Args:
+        function (callable): Computazione senza argomenti (es. chiamata al servizio di analisi)
+
+    Returns:
+        Risultato della computazione, condiviso: non deve essere modificato dal chiamante
+    """
+    lock_dir = None
+    if current_app.config.get('SINGLEFLIGHT_FILE_LOCK', False):
+        lock_dir = os.path.join(current_app.instance_path, LOCK_DIRNAME)
+    return request_flight.do(dataset_etag(), function, lock_dir=lock_dir)
@@ -0,0 +1,73 @@
+"""
+Compressione negoziata delle risposte (gzip / brotli)
+
+Le risposte JSON e testuali oltre una soglia di dimensione vengono compresse
+con l'encoding migliore accettato dal client (Accept-Encoding). brotli è una
+dipendenza opzionale: senza di essa si usa solo gzip. Le risposte in streaming
+(download ed export) gestiscono la compressione da sole e non vengono toccate.
+
+Configurazione (app.config):
+    COMPRESS_MIN_SIZE: Dimensione minima in byte da comprimere (default 1024)
+    COMPRESS_GZIP_LEVEL: Livello gzip 1-9 (default 6)
+    COMPRESS_BROTLI_QUALITY: Qualità brotli 0-11 (default 5)
+"""
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain', 'text/html', 'application/x-ndjson'}
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    """Encoding disponibili in ordine di preferenza del server"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compress(data, encoding, config):
+    """Comprime i byte della risposta con l'encoding scelto"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=config.get('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY))
+    return gzip.compress(data, compresslevel=config.get('COMPRESS_GZIP_LEVEL', DEFAULT_GZIP_LEVEL), mtime=0)
+
+
+def _should_compress(response, min_size):
+    """True se la risposta è comprimibile e supera la soglia"""
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if response.is_streamed or response.direct_passthrough:
+        return False
+    if 'Content-Encoding' in response.headers:
+        return False
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return False
+    return response.content_length is not None and response.content_length >= min_size
+
+
+def init_compression(app):
+    """Registra la compressione delle risposte sull'app"""
+
+    @app.after_request
+    def compress_response(response):
+        if not _should_compress(response, app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE)):
+            return response
+
+        # La rappresentazione dipende dall'Accept-Encoding anche se non viene compressa
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(supported_encodings())
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding, app.config))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return compress_response
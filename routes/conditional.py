@@ -0,0 +1,64 @@
+"""
+GET condizionali (ETag / Last-Modified) per le risposte derivate dal dataset
+
+Le risposte delle analisi dipendono solo dalla versione del dataset e dai parametri
+della richiesta: l'ETag viene calcolato da questi due elementi leggendo il file di
+versione, quindi una richiesta con If-None-Match ancora valido riceve 304 senza
+interrogare il database né eseguire l'analisi.
+"""
+import functools
+import hashlib
+from flask import make_response, request
+
+from database.dataset_version import get_dataset_version, get_dataset_modified
+
+
+def dataset_etag():
+    """ETag della richiesta corrente: versione del dataset + path + parametri"""
+    args = sorted(request.args.items(multi=True))
+    key = repr((get_dataset_version(), request.path, args)).encode('utf-8')
+    return hashlib.sha1(key).hexdigest()
+
+
+def _not_modified(etag, last_modified):
+    """True se la copia del client è ancora valida"""
+    # If-None-Match ha la precedenza su If-Modified-Since (RFC 9110)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def _set_validators(response, etag, last_modified):
+    """Aggiunge ETag, Last-Modified e Cache-Control alla risposta"""
+    # ETag debole: il contenuto è equivalente ma non identico byte per byte (es. timings, gzip)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Il client può riusare la copia solo dopo averla rivalidata
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_get(view):
+    """
+    Decoratore per le routes GET il cui risultato dipende solo dal dataset
+
+    Risponde 304 se If-None-Match (o If-Modified-Since) corrisponde alla versione
+    corrente; altrimenti esegue la view e aggiunge i validatori alle risposte 200.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = dataset_etag()
+        last_modified = get_dataset_modified()
+
+        if _not_modified(etag, last_modified):
+            return _set_validators(make_response('', 304), etag, last_modified)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            _set_validators(response, etag, last_modified)
+        return response
+
+    return wrapper
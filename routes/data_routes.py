@@ -2,7 +2,7 @@
 Routes per accesso ai dati - Struttura semplificata
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app
 from datetime import datetime, date
 import sys
 import os
@@ -11,17 +11,51 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from database import BikeRecord, db
 from database.data_loader import BikeDataLoader
+from database.analytics_filters import AnalyticsFilters, InvalidFilterError
+from database.record_query import parse_columns, records_statement, row_to_dict
+from database.record_export import (
+    ARROW_FORMATS, DEFAULT_ROW_GROUP_SIZE, arrow_available, encode_arrow, iter_record_groups
+)
+from routes.conditional import conditional_get
+from routes.cache_warmer import cache_warmer
+from database.result_cache import analysis_cache
+from machine_learning.model_registry import model_registry
+from machine_learning.micro_batcher import micro_batchers
+from machine_learning.prediction_cache import prediction_cache
+from routes.streaming import chunked, encode_rows, gzip_stream, streaming_response
 import logging
 
 # Blueprint per routes dei dati
 data_bp = Blueprint('data', __name__)
 
+# Dimensione delle pagine di /records
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Formati di /export: mimetype ed estensione del file
+EXPORT_FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'csv.gz': ('application/gzip', 'csv.gz')
+}
+MAX_ROW_GROUP_SIZE = 500000
+
+@data_bp.errorhandler(InvalidFilterError)
+def invalid_filter(error):
+    """Parametri non validi nella query string"""
+    return jsonify({'success': False, 'error': str(error)}), 400
+
 @data_bp.route('/status', methods=['GET']) # curl http://localhost:5001/api/data/status
 def status():
-    """Endpoint di stato semplice"""
+    """Endpoint di stato con lo stato del riscaldamento delle cache"""
     return jsonify({
         'status': 'OK',
         'message': 'API dati operativa',
+        'cache_warmup': cache_warmer.status(),
+        'analysis_cache': analysis_cache.stats(),
+        'loaded_models': model_registry.loaded_models(),
+        'micro_batching': micro_batchers.stats(),
+        'prediction_cache': prediction_cache.stats()
     }), 200
 
 @data_bp.route('/load', methods=['POST']) # curl -F "file=@data/bike_sharing_sample.csv" -F "batch_size=500" http://localhost:5001/api/data/load
@@ -32,6 +66,7 @@ def load_dataset():
     Expects:
         - file: File CSV con il dataset bike sharing
         - batch_size (optional): Dimensione batch per caricamento
+        - mode (optional): 'replace' (default) sostituisce i dati, 'append' li aggiunge
     
     Returns:
         JSON con risultato del caricamento
@@ -63,17 +98,29 @@ def load_dataset():
         
         # Parametri opzionali
         batch_size = request.form.get('batch_size', 1000, type=int)
+        mode = request.form.get('mode', 'replace')
+        
+        if mode not in ('replace', 'append'):
+            return jsonify({
+                'success': False,
+                'error': 'Modalità non supportata. Usa "replace" o "append".'
+            }), 400
         
         try:
             # Inizializza loader
             loader = BikeDataLoader()
             
             # Carica dati direttamente dal file object
-            loader.load_from_file_object(file, batch_size=batch_size)
+            loader.load_from_file_object(file, batch_size=batch_size, append=(mode == 'append'))
             
             # Ottieni statistiche finali
             stats = loader.get_stats()
             
+            # Riscalda le cache per la nuova versione del dataset
+            warmup = None
+            if current_app.config.get('CACHE_WARMUP', True):
+                warmup = cache_warmer.start(current_app._get_current_object())
+            
             return jsonify({
                 'success': True,
                 'message': 'Dataset caricato con successo!',
@@ -84,7 +131,9 @@ def load_dataset():
                     'error_count': loader.error_count,
                     'success_rate': round((loader.success_count / loader.total_records * 100), 2) if loader.total_records > 0 else 0,
                     'batch_size': batch_size,
-                    'database_stats': stats
+                    'mode': mode,
+                    'database_stats': stats,
+                    'cache_warmup': warmup
                 }
             }), 200
             
@@ -100,4 +149,106 @@ def load_dataset():
         return jsonify({
             'success': False,
             'error': f'Errore del server: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@data_bp.route('/records', methods=['GET']) # curl "http://localhost:5001/api/data/records?columns=dteday,hr,cnt&weathersit=3&limit=50"
+@conditional_get
+def list_records():
+    """
+    Restituisce i record grezzi con paginazione keyset su instant
+    
+    Query params:
+        - columns (optional): Colonne da restituire, separate da virgola (default: tutte)
+        - after (optional): Cursore, restituisce i record con instant successivo (next_after della pagina precedente)
+        - limit (optional): Record per pagina (default 100, max 1000)
+        - start, end, season, workingday, weathersit, hour_from, hour_to (optional): Filtri come per le analisi
+    
+    Returns:
+        JSON con i record della pagina e il cursore della successiva
+    """
+    filters = AnalyticsFilters.from_args(request.args)
+    columns = parse_columns(request.args.get('columns'))
+    
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = int(after)
+        except ValueError:
+            raise InvalidFilterError("'after' deve essere un intero (next_after della pagina precedente)")
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise InvalidFilterError(f"'limit' deve essere tra 1 e {MAX_PAGE_SIZE}")
+    
+    try:
+        # instant serve comunque per il cursore, anche se non è tra le colonne richieste
+        selected = columns if 'instant' in columns else columns + ['instant']
+        
+        # Una riga in più per sapere se esiste una pagina successiva
+        rows = db.session.execute(records_statement(selected, filters, after=after, limit=limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'records': [row_to_dict(columns, row) for row in rows],
+                'count': len(rows),
+                'columns': columns,
+                'has_more': has_more,
+                'next_after': rows[-1].instant if has_more else None
+            },
+            'filters': filters.to_dict()
+        }), 200
+        
+    except Exception as e:
+        logging.error(f"Errore nella lettura dei record: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Errore del server: {str(e)}'
+        }), 500
+
+@data_bp.route('/export', methods=['GET']) # curl "http://localhost:5001/api/data/export?format=parquet" -o bike_records.parquet
+@conditional_get
+def export_records():
+    """
+    Export completo della tabella bike_records in streaming
+    
+    Query params:
+        - format (optional): 'parquet' (default), 'arrow' (IPC stream) o 'csv.gz'
+        - columns (optional): Colonne da esportare, separate da virgola (default: tutte)
+        - row_group_size (optional): Righe lette dal cursore e scritte per row group (default 50000)
+        - start, end, season, workingday, weathersit, hour_from, hour_to (optional): Filtri come per le analisi
+    
+    Returns:
+        File nel formato richiesto, scritto un row group alla volta
+    """
+    filters = AnalyticsFilters.from_args(request.args)
+    columns = parse_columns(request.args.get('columns'))
+    
+    export_format = request.args.get('format', 'parquet').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidFilterError(f"Formato non supportato: {export_format}. Usa {', '.join(EXPORT_FORMATS)}")
+    
+    row_group_size = request.args.get('row_group_size', DEFAULT_ROW_GROUP_SIZE, type=int)
+    if not 1 <= row_group_size <= MAX_ROW_GROUP_SIZE:
+        raise InvalidFilterError(f"'row_group_size' deve essere tra 1 e {MAX_ROW_GROUP_SIZE}")
+    
+    if export_format in ARROW_FORMATS and not arrow_available():
+        return jsonify({
+            'success': False,
+            'error': f'Export {export_format} non disponibile: installare pyarrow. Usa format=csv.gz in alternativa.'
+        }), 501
+    
+    groups = iter_record_groups(columns, filters, row_group_size)
+    if export_format in ARROW_FORMATS:
+        chunks = encode_arrow(groups, columns, export_format)
+    else:
+        rows = (row for group in groups for row in group)
+        chunks = gzip_stream(chunked(encode_rows(rows, columns, 'csv')))
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f'bike_records_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
+    # Il file è già compresso/binario: nessun Content-Encoding
+    return streaming_response(chunks, mimetype, filename=filename, compress=False)
@@ -0,0 +1,87 @@
+"""
+Serializzazione JSON delle risposte
+
+Il provider predefinito usa orjson (più veloce di json della libreria standard e
+con supporto nativo per array e scalari NumPy); se orjson non è installato si usa
+il provider di Flask esteso con la conversione dei tipi NumPy. La scelta si può
+forzare con app.config['JSON_SERIALIZER'] = 'orjson' | 'json'.
+"""
+import decimal
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dipende dall'ambiente
+    orjson = None
+
+
+def _convert(obj):
+    """Conversione dei tipi non supportati nativamente dal serializzatore"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f"Oggetto di tipo {type(obj).__name__} non serializzabile in JSON")
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    """Provider json della libreria standard con supporto per i tipi NumPy"""
+
+    sort_keys = False
+
+    @staticmethod
+    def default(obj):
+        try:
+            return _convert(obj)
+        except TypeError:
+            return DefaultJSONProvider.default(obj)
+
+
+class OrjsonProvider(NumpyJSONProvider):
+    """Provider basato su orjson: serializza direttamente in bytes"""
+
+    OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        # Opzioni specifiche del modulo json (es. indent) -> provider standard
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_convert, option=self.OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Come jsonify(), senza passare da str: i bytes di orjson vanno nella risposta"""
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_convert, option=self.OPTIONS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json_provider(app):
+    """
+    Imposta il provider JSON dell'app
+
+    Args:
+        app: App Flask (config JSON_SERIALIZER: 'orjson' default se disponibile, 'json')
+
+    Returns:
+        str: Nome del serializzatore in uso
+    """
+    serializer = app.config.get('JSON_SERIALIZER', 'orjson')
+    if serializer == 'orjson' and orjson is None:
+        serializer = 'json'
+
+    provider = OrjsonProvider if serializer == 'orjson' else NumpyJSONProvider
+    app.json_provider_class = provider
+    app.json = provider(app)
+    return serializer
@@ -1,49 +1,110 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, current_app, request, jsonify
 from machine_learning.peak_demand_predictor import PeakDemandPredictor
 from machine_learning.weather_impact_predictor import WeatherImpactPredictor
 from machine_learning.rental_count_predictor import  RentalCountPredictor
-import csv
-import io
+from machine_learning.batch_features import BatchInputError, InvalidFeaturesError, batch_size
+from machine_learning.model_artifacts import ARTIFACT_FORMATS
+from machine_learning.compact_models import LEAF_BITS
+from machine_learning.combined_prediction import predict_all
+from machine_learning.response_surface import DEFAULT_LATTICE_POINTS, MAX_LATTICE_POINTS, MIN_LATTICE_POINTS
+from machine_learning.bulk_scoring import (
+    BULK_PREDICTORS, DEFAULT_CHUNK_SIZE, SCORING_FORMATS, BulkScorer, encode_csv, encode_parquet, file_format, iter_chunks
+)
+from database.record_export import arrow_available
+from routes.streaming import export_response, requested_format, streaming_response, UnsupportedFormatError
 from datetime import datetime
 import logging
 
 prediction_bp = Blueprint('prediction', __name__)
 
-def create_csv_response(data, filename, headers):
-    """Crea una risposta CSV per il download"""
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Scrivi gli headers
-    writer.writerow(headers)
-    
-    # Scrivi i dati
-    if isinstance(data, list):
-        for row in data:
-            if isinstance(row, dict):
-                writer.writerow([row.get(header, '') for header in headers])
-            else:
-                writer.writerow(row)
-    elif isinstance(data, dict):
-        # Se è un dizionario, converti in lista di righe
-        for key, value in data.items():
-            writer.writerow([key, value])
-    
-    output.seek(0)
-    
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={
-            'Content-Disposition': f'attachment; filename={filename}',
-            'Content-Type': 'text/csv; charset=utf-8'
-        }
-    )
+# Numero massimo di righe per richiesta batch
+MAX_BATCH_ROWS = 50000
+
+# Righe massime per blocco nello scoring di file
+MAX_SCORING_CHUNK_SIZE = 500000
+
+class UnsupportedModelTypeError(ValueError):
+    """Tipo di modello non supportato dal predittore (risposta 400)"""
+
+class InvalidTrainingOptionError(ValueError):
+    """Opzione di training non valida nel body (risposta 400)"""
+
+
+def requested_model_type(predictor_class):
+    """Tipo di modello richiesto nel body JSON ("model_type", default random_forest)"""
+    body = request.get_json(silent=True) or {}
+    model_type = body.get('model_type') or 'random_forest'
+    if model_type not in predictor_class.MODEL_TYPES:
+        raise UnsupportedModelTypeError(
+            f"Tipo di modello non supportato: {model_type}. "
+            f"Valori ammessi: {', '.join(predictor_class.MODEL_TYPES)}"
+        )
+    return model_type
+
+def requested_artifact_format():
+    """Formato dell'artefatto da salvare ("artifact_format" nel body, default MODEL_ARTIFACT_FORMAT o pickle)"""
+    body = request.get_json(silent=True) or {}
+    artifact_format = body.get('artifact_format') or current_app.config.get('MODEL_ARTIFACT_FORMAT', 'pickle')
+    if artifact_format not in ARTIFACT_FORMATS:
+        raise UnsupportedFormatError(
+            f"Formato artefatto non supportato: {artifact_format}. Usa {', '.join(ARTIFACT_FORMATS)}"
+        )
+    return artifact_format
+
+def requested_compaction(artifact_format):
+    """Parametri del formato compact ("leaf_bits" e "prune_tolerance" nel body)"""
+    body = request.get_json(silent=True) or {}
+    leaf_bits = body.get('leaf_bits')
+    prune_tolerance = body.get('prune_tolerance') or 0.0
+    if (leaf_bits is not None or prune_tolerance) and artifact_format != 'compact':
+        raise UnsupportedFormatError("leaf_bits e prune_tolerance richiedono artifact_format 'compact'")
+    if leaf_bits is not None and leaf_bits not in LEAF_BITS:
+        raise UnsupportedFormatError(f"leaf_bits non supportato: {leaf_bits}. Usa {', '.join(map(str, LEAF_BITS))}")
+    if isinstance(prune_tolerance, bool) or not isinstance(prune_tolerance, (int, float)) or prune_tolerance < 0:
+        raise UnsupportedFormatError("prune_tolerance deve essere un numero >= 0")
+    return {'leaf_bits': leaf_bits, 'prune_tolerance': float(prune_tolerance)}
+
+def requested_response_surface():
+    """Superficie di risposta del modello meteo ("response_surface" e "lattice_points" nel body)"""
+    body = request.get_json(silent=True) or {}
+    response_surface = body.get('response_surface', False)
+    lattice_points = body.get('lattice_points', DEFAULT_LATTICE_POINTS)
+    if not isinstance(response_surface, bool):
+        raise InvalidTrainingOptionError("response_surface deve essere true o false")
+    if isinstance(lattice_points, bool) or not isinstance(lattice_points, int) \
+            or not MIN_LATTICE_POINTS <= lattice_points <= MAX_LATTICE_POINTS:
+        raise InvalidTrainingOptionError(
+            f"lattice_points deve essere un intero tra {MIN_LATTICE_POINTS} e {MAX_LATTICE_POINTS}"
+        )
+    return {'response_surface': response_surface, 'lattice_points': lattice_points}
+
+@prediction_bp.errorhandler(UnsupportedFormatError)
+def unsupported_format(error):
+    """Formato non supportato (?format= o artifact_format)"""
+    return jsonify({'error': str(error)}), 400
+
+@prediction_bp.errorhandler(BatchInputError)
+def invalid_batch_input(error):
+    """Payload batch non valido ("inputs")"""
+    return jsonify({'error': str(error)}), 400
+
+@prediction_bp.errorhandler(UnsupportedModelTypeError)
+def unsupported_model_type(error):
+    """Tipo di modello non supportato ("model_type" nel body)"""
+    return jsonify({'error': str(error)}), 400
+
+@prediction_bp.errorhandler(InvalidTrainingOptionError)
+def invalid_training_option(error):
+    """Opzione di training non valida (es. "lattice_points")"""
+    return jsonify({'error': str(error)}), 400
 
 # curl -X POST -H "Content-Type: application/json" -d '{"model_type": "logistic_regression"}' http://localhost:5001/api/prediction/train-peak-model
 @prediction_bp.route('/train-peak-model', methods=['POST'])
 def train_peak_model():
     """Addestra il modello ML per la previsione della domanda di picco"""
+    artifact_format = requested_artifact_format()
+    compaction = requested_compaction(artifact_format)
+
     try:
         model_type = request.json.get('model_type')
         model = PeakDemandPredictor(model_type=model_type, peak_threshold_percentile=80)
@@ -53,35 +114,43 @@ def train_peak_model():
         logging.info(f"Training completato: {result}")
 
         # Salva il modello addestrato
-        model.save_model()
-        return jsonify(result), 200
+        artifact = model.save_model(artifact_format=artifact_format, **compaction)
+        return jsonify(dict(result, artifact=artifact)), 200
     except Exception as e:
         logging.error(f"Errore nell'addestramento del modello: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-# curl -X POST -H "Content-Type: application/json" -d '{"model_type": "random_forest"}' http://localhost:5001/api/prediction/train-weather-model
+# curl -X POST -H "Content-Type: application/json" -d '{"model_type": "random_forest", "artifact_format": "compact", "leaf_bits": 16}' http://localhost:5001/api/prediction/train-weather-model
+# curl -X POST -H "Content-Type: application/json" -d '{"model_type": "random_forest", "response_surface": true, "lattice_points": 17}' http://localhost:5001/api/prediction/train-weather-model
 @prediction_bp.route('/train-weather-model', methods=['POST'])
 def train_weather_model():
     """Addestra il modello ML per l'impatto meteo"""
+    artifact_format = requested_artifact_format()
+    compaction = requested_compaction(artifact_format)
+    surface_options = requested_response_surface()
+
     try:
         model_type = request.json.get('model_type')
         model = WeatherImpactPredictor(model_type=model_type)
         
-        # Addestra il modello
-        result = model.train()
+        # Addestra il modello (e l'eventuale superficie di risposta)
+        result = model.train(**surface_options)
         logging.info(f"Training completato: {result}")
         
         # Salva il modello addestrato
-        model.save_model()
-        return jsonify(result), 200
+        artifact = model.save_model(artifact_format=artifact_format, **compaction)
+        return jsonify(dict(result, artifact=artifact)), 200
     except Exception as e:
         logging.error(f"Errore nell'addestramento del modello: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-# curl -X POST -H "Content-Type: application/json" -d '{"model_type": "random_forest"}' http://localhost:5001/api/prediction/train-rental-model
+# curl -X POST -H "Content-Type: application/json" -d '{"model_type": "random_forest", "artifact_format": "mmap"}' http://localhost:5001/api/prediction/train-rental-model
 @prediction_bp.route('/train-rental-model', methods=['POST'])
 def train_rental_model():
     """Addestra il modello ML per il conteggio noleggi"""
+    artifact_format = requested_artifact_format()
+    compaction = requested_compaction(artifact_format)
+
     try:
         model_type = request.json.get('model_type', 'linear_regression')
         model = RentalCountPredictor(model_type=model_type)
@@ -91,8 +160,8 @@ def train_rental_model():
         logging.info(f"Training completato: {result}")
         
         # Salva il modello addestrato
-        model.save_model()
-        return jsonify(result), 200
+        artifact = model.save_model(artifact_format=artifact_format, **compaction)
+        return jsonify(dict(result, artifact=artifact)), 200
     except Exception as e:
         logging.error(f"Errore nell'addestramento del modello: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -114,13 +183,19 @@ def train_rental_model():
 @prediction_bp.route('/predict-peak-demand', methods=['POST'])
 def predict_peak_demand():
     """Prevede la domanda di picco usando il modello addestrato"""
+    model_type = requested_model_type(PeakDemandPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Nessun dato di input fornito'}), 400
         
-        prediction = PeakDemandPredictor.predict(input_data)
+        prediction = PeakDemandPredictor.predict(input_data, model_type)
         return jsonify({'prediction': prediction}), 200
+    except InvalidFeaturesError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': f'Modello {model_type} non ancora addestrato'}), 404
     except Exception as e:
         logging.error(f"Errore nella previsione della domanda di picco: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -142,13 +217,19 @@ def predict_peak_demand():
 @prediction_bp.route('/predict-weather-impact', methods=['POST'])
 def predict_weather_impact():
     """Prevede l'impatto delle condizioni meteo usando il modello addestrato"""
+    model_type = requested_model_type(WeatherImpactPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Nessun dato di input fornito'}), 400
         
-        prediction = WeatherImpactPredictor.predict(input_data)
+        prediction = WeatherImpactPredictor.predict(input_data, model_type)
         return jsonify({'prediction': prediction}), 200
+    except InvalidFeaturesError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': f'Modello {model_type} non ancora addestrato'}), 404
     except Exception as e:
         logging.error(f"Errore nella previsione dell'impatto meteo: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -167,32 +248,166 @@ def predict_weather_impact():
 #     "atemp": 0.2879,
 #     "hum": 0.81,
 #     "windspeed": 0.0
-# }}' http://localhost:5001/api/prediction/predict-rental-count
+# }, "model_type": "decision_tree"}' http://localhost:5001/api/prediction/predict-rental-count
 @prediction_bp.route('/predict-rental-count', methods=['POST'])
 def predict_rental_count():
     """Prevede il conteggio dei noleggi usando il modello addestrato"""
+    model_type = requested_model_type(RentalCountPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Nessun dato di input fornito'}), 400
         
-        prediction = RentalCountPredictor.predict(input_data)
+        prediction = RentalCountPredictor.predict(input_data, model_type)
         return jsonify({'prediction': prediction}), 200
+    except InvalidFeaturesError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError:
+        return jsonify({'error': f'Modello {model_type} non ancora addestrato'}), 404
     except Exception as e:
         logging.error(f"Errore nella previsione del conteggio noleggi: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def batch_inputs():
+    """Input batch dal body JSON ("inputs": lista di record o colonne), con limite di righe"""
+    body = request.get_json(silent=True) or {}
+    inputs = body.get('inputs')
+    if inputs is None:
+        raise BatchInputError("Richiesto 'inputs': lista di record o oggetto {feature: [valori]}")
+    if batch_size(inputs) > MAX_BATCH_ROWS:
+        raise BatchInputError(f"Massimo {MAX_BATCH_ROWS} righe per richiesta")
+    return inputs
+
+def batch_prediction(predictor_class, description):
+    """Esegue una predizione batch e gestisce gli errori come le predizioni singole"""
+    model_type = requested_model_type(predictor_class)
+    inputs = batch_inputs()
+
+    try:
+        return jsonify(predictor_class.predict_batch(inputs, model_type)), 200
+    except FileNotFoundError:
+        return jsonify({'error': f'Modello {model_type} non ancora addestrato'}), 404
+    except Exception as e:
+        logging.error(f"Errore nella previsione batch {description}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# curl -X POST -H "Content-Type: application/json" -d '{"inputs": [
+#     {"season": 1, "yr": 0, "mnth": 1, "hr": 8, "holiday": 0, "weekday": 2, "workingday": 1, "weathersit": 1, "temp": 0.24, "atemp": 0.2879, "hum": 0.81, "windspeed": 0.0},
+#     {"season": 1, "yr": 0, "mnth": 1, "hr": 17, "holiday": 0, "weekday": 2, "workingday": 1, "weathersit": 2, "temp": 0.3, "atemp": 0.31, "hum": 0.6, "windspeed": 0.1}
+# ]}' http://localhost:5001/api/prediction/predict-peak-demand/batch
+@prediction_bp.route('/predict-peak-demand/batch', methods=['POST'])
+def predict_peak_demand_batch():
+    """Prevede la domanda di picco per una lista di input con una sola inferenza"""
+    return batch_prediction(PeakDemandPredictor, 'della domanda di picco')
+
+# curl -X POST -H "Content-Type: application/json" -d '{"inputs": {
+#     "weathersit": [1, 3], "temp": [0.24, 0.5], "atemp": [0.2879, 0.48], "hum": [0.81, 0.9], "windspeed": [0.0, 0.3]
+# }}' http://localhost:5001/api/prediction/predict-weather-impact/batch
+@prediction_bp.route('/predict-weather-impact/batch', methods=['POST'])
+def predict_weather_impact_batch():
+    """Prevede l'impatto meteo per una lista di input con una sola inferenza"""
+    return batch_prediction(WeatherImpactPredictor, "dell'impatto meteo")
+
+# curl -X POST -H "Content-Type: application/json" -d '{"inputs": {
+#     "season": [1, 1], "yr": [0, 0], "mnth": [1, 1], "hr": [8, 17], "holiday": [0, 0], "weekday": [2, 2],
+#     "workingday": [1, 1], "weathersit": [1, 2], "temp": [0.24, 0.3], "atemp": [0.2879, 0.31], "hum": [0.81, 0.6], "windspeed": [0.0, 0.1]
+# }, "model_type": "random_forest"}' http://localhost:5001/api/prediction/predict-rental-count/batch
+@prediction_bp.route('/predict-rental-count/batch', methods=['POST'])
+def predict_rental_count_batch():
+    """Prevede il conteggio dei noleggi per una lista di input con una sola inferenza"""
+    return batch_prediction(RentalCountPredictor, 'del conteggio noleggi')
+
+def requested_model_types():
+    """
+    {predittore: tipo di modello} per la predizione combinata
+
+    Body JSON: "predictors" (lista, default tutti), "model_type" (default random_forest)
+    e "model_types" ({predittore: tipo di modello}) per i singoli predittori
+    """
+    body = request.get_json(silent=True) or {}
+    names = body.get('predictors') or list(BULK_PREDICTORS)
+    overrides = body.get('model_types') or {}
+    if not isinstance(names, list) or not isinstance(overrides, dict):
+        raise BatchInputError("'predictors' deve essere una lista e 'model_types' un oggetto {predittore: tipo}")
+
+    unknown = [name for name in list(names) + list(overrides) if not isinstance(name, str) or name not in BULK_PREDICTORS]
+    if unknown:
+        raise BatchInputError(f"Predittori non supportati: {', '.join(map(str, unknown))}. Valori ammessi: {', '.join(BULK_PREDICTORS)}")
+
+    default_model_type = body.get('model_type') or 'random_forest'
+    model_types = {}
+    for name in names:
+        model_type = overrides.get(name) or default_model_type
+        predictor_class = BULK_PREDICTORS[name]['class']
+        if model_type not in predictor_class.MODEL_TYPES:
+            raise UnsupportedModelTypeError(
+                f"Tipo di modello non supportato da {name}: {model_type}. "
+                f"Valori ammessi: {', '.join(predictor_class.MODEL_TYPES)}"
+            )
+        model_types[name] = model_type
+    return model_types
+
+# curl -X POST -H "Content-Type: application/json" -d '{"input_data": {
+#     "season": 1, "yr": 0, "mnth": 1, "hr": 17, "holiday": 0, "weekday": 2, "workingday": 1,
+#     "weathersit": 1, "temp": 0.24, "atemp": 0.2879, "hum": 0.81, "windspeed": 0.0
+# }, "model_types": {"rental_count": "decision_tree"}}' http://localhost:5001/api/prediction/predict-all
+@prediction_bp.route('/predict-all', methods=['POST'])
+def predict_all_models():
+    """Prevede picco, noleggi e impatto meteo per un input con una sola preparazione delle features"""
+    model_types = requested_model_types()
+    body = request.get_json(silent=True) or {}
+    input_data = body.get('input_data')
+    if not input_data or not isinstance(input_data, dict):
+        return jsonify({'error': 'Nessun dato di input fornito'}), 400
+
+    try:
+        result = predict_all([input_data], model_types)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logging.error(f"Errore nella previsione combinata: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    prediction = result['predictions'][0]
+    if 'error' in prediction:
+        return jsonify({'error': prediction['error']}), 400
+    del prediction['index']
+    prediction.update(model_types=result['model_types'], peak_threshold=result['peak_threshold'])
+    return jsonify({'prediction': prediction}), 200
+
+# curl -X POST -H "Content-Type: application/json" -d '{"inputs": [
+#     {"season": 1, "yr": 0, "mnth": 1, "hr": 8, "holiday": 0, "weekday": 2, "workingday": 1, "weathersit": 1, "temp": 0.24, "atemp": 0.2879, "hum": 0.81, "windspeed": 0.0},
+#     {"season": 1, "yr": 0, "mnth": 1, "hr": 17, "holiday": 0, "weekday": 2, "workingday": 1, "weathersit": 2, "temp": 0.3, "atemp": 0.31, "hum": 0.6, "windspeed": 0.1}
+# ]}' http://localhost:5001/api/prediction/predict-all/batch
+@prediction_bp.route('/predict-all/batch', methods=['POST'])
+def predict_all_models_batch():
+    """Prevede picco, noleggi e impatto meteo per una lista di input (una matrice di features, un'inferenza per modello)"""
+    model_types = requested_model_types()
+    inputs = batch_inputs()
+
+    try:
+        return jsonify(predict_all(inputs, model_types)), 200
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logging.error(f"Errore nella previsione batch combinata: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # curl -X POST -H "Content-Type: application/json" -d '{"input_data": {"season": 1, "yr": 0, "mnth": 1, "hr": 0, "holiday": 0, "weekday": 6, "workingday": 0, "weathersit": 1, "temp": 0.24, "atemp": 0.2879, "hum": 0.81, "windspeed": 0.0}}' http://localhost:5001/api/prediction/predict-peak-demand/download
 @prediction_bp.route('/predict-peak-demand/download', methods=['POST'])
 def download_peak_demand_predictions_csv():
     """Download predizioni domanda di picco in formato CSV"""
+    export_format = requested_format()
+    model_type = requested_model_type(PeakDemandPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Richiesto input_data'}), 400
 
         try:
-            prediction = PeakDemandPredictor.predict(input_data)
+            prediction = PeakDemandPredictor.predict(input_data, model_type)
             
             print("Debug Peak Prediction", prediction)
             logging.info(f"Prediction: {prediction}")
@@ -268,9 +483,9 @@ def download_peak_demand_predictions_csv():
             'is_peak', 'peak_probability', 'peak_threshold', 'model_type', 'features_count', 'status'
         ]
         
-        filename = f'peak_demand_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'peak_demand_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response([result_row], filename, headers)
+        return export_response([result_row], headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore nel download CSV predizioni picchi: {str(e)}")
@@ -280,13 +495,16 @@ def download_peak_demand_predictions_csv():
 @prediction_bp.route('/predict-weather-impact/download', methods=['POST'])
 def download_weather_impact_predictions_csv():
     """Download predizioni impatto meteo in formato CSV"""
+    export_format = requested_format()
+    model_type = requested_model_type(WeatherImpactPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Richiesto input_data'}), 400
 
         try:
-            prediction = WeatherImpactPredictor.predict(input_data)
+            prediction = WeatherImpactPredictor.predict(input_data, model_type)
             
             logging.info(f"Prediction: {prediction}")
             
@@ -334,9 +552,9 @@ def download_weather_impact_predictions_csv():
             'predicted_impact', 'model_type', 'features_count', 'status'
         ]
         
-        filename = f'weather_impact_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'weather_impact_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response([result_row], filename, headers)
+        return export_response([result_row], headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore nel download CSV predizioni meteo: {str(e)}")
@@ -346,13 +564,16 @@ def download_weather_impact_predictions_csv():
 @prediction_bp.route('/predict-rental-count/download', methods=['POST'])
 def download_rental_count_predictions_csv():
     """Download predizioni conteggio noleggi in formato CSV"""
+    export_format = requested_format()
+    model_type = requested_model_type(RentalCountPredictor)
+
     try:
         input_data = request.json.get('input_data')
         if not input_data:
             return jsonify({'error': 'Richiesto input_data'}), 400
 
         try:
-            prediction = RentalCountPredictor.predict(input_data)
+            prediction = RentalCountPredictor.predict(input_data, model_type)
             
             logging.info(f"Prediction: {prediction}")
             
@@ -415,10 +636,83 @@ def download_rental_count_predictions_csv():
             'predicted_rentals', 'model_type', 'features_count', 'status'
         ]
         
-        filename = f'rental_count_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        filename = f'rental_count_predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
         
-        return create_csv_response([result_row], filename, headers)
+        return export_response([result_row], headers, filename, export_format)
         
     except Exception as e:
         logging.error(f"Errore nel download CSV predizioni conteggio: {str(e)}")
         return jsonify({'error': str(e)}), 500
+
+# curl -X POST -F "file=@scenari.csv" -F "predictors=peak_demand,rental_count:decision_tree" http://localhost:5001/api/prediction/score-file -o scenari_predetti.csv
+# curl -X POST -F "file=@scenari.parquet" "http://localhost:5001/api/prediction/score-file?format=csv" -o scenari_predetti.csv
+@prediction_bp.route('/score-file', methods=['POST'])
+def score_file():
+    """
+    Scoring in streaming di un file di scenari con i predittori addestrati
+    
+    Expects:
+        - file: File CSV (anche .csv.gz) o Parquet con le features degli scenari
+        - predictors (optional): Predittori separati da virgola, anche come nome:model_type
+          (default: peak_demand,rental_count,weather_impact)
+        - model_type (optional): Tipo di modello per i predittori senza model_type esplicito (default random_forest)
+        - chunk_size (optional): Righe lette e predette per blocco (default 50000)
+    
+    Query params:
+        - format (optional): 'csv' o 'parquet' (default: formato del file caricato)
+    
+    Returns:
+        Il file con le colonne originali, le predizioni e prediction_error, scritto un blocco alla volta
+    """
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'error': 'Nessun file fornito. Usa il campo "file" per l\'upload.'}), 400
+    
+    input_format = file_format(file.filename)
+    if input_format is None:
+        return jsonify({'error': 'Formato file non supportato. Usa file CSV (.csv, .csv.gz) o Parquet (.parquet).'}), 400
+    
+    output_format = request.args.get('format', input_format).lower()
+    if output_format not in SCORING_FORMATS:
+        raise UnsupportedFormatError(f"Formato non supportato: {output_format}. Usa {', '.join(SCORING_FORMATS)}")
+    
+    if 'parquet' in (input_format, output_format) and not arrow_available():
+        return jsonify({'error': 'Parquet non disponibile: installare pyarrow. Usa file CSV in alternativa.'}), 501
+    
+    # {predittore: tipo di modello}, con il model_type del form come default
+    default_model_type = request.form.get('model_type') or 'random_forest'
+    model_types = {}
+    for entry in request.form.get('predictors', ','.join(BULK_PREDICTORS)).split(','):
+        name, _, model_type = entry.strip().partition(':')
+        if name:
+            model_types[name] = model_type or default_model_type
+    
+    unknown = [name for name in model_types if name not in BULK_PREDICTORS]
+    if not model_types or unknown:
+        return jsonify({'error': f"Predittori non supportati: {', '.join(unknown) or '(nessuno)'}. Valori ammessi: {', '.join(BULK_PREDICTORS)}"}), 400
+    
+    for name, model_type in model_types.items():
+        predictor_class = BULK_PREDICTORS[name]['class']
+        if model_type not in predictor_class.MODEL_TYPES:
+            raise UnsupportedModelTypeError(
+                f"Tipo di modello non supportato da {name}: {model_type}. "
+                f"Valori ammessi: {', '.join(predictor_class.MODEL_TYPES)}"
+            )
+    
+    chunk_size = request.form.get('chunk_size', DEFAULT_CHUNK_SIZE, type=int)
+    if not 1 <= chunk_size <= MAX_SCORING_CHUNK_SIZE:
+        return jsonify({'error': f"'chunk_size' deve essere tra 1 e {MAX_SCORING_CHUNK_SIZE}"}), 400
+    
+    try:
+        scorer = BulkScorer.load(model_types)
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    
+    compression = 'gzip' if file.filename.lower().endswith('.gz') else None
+    scored = scorer.score_chunks(iter_chunks(file.stream, input_format, chunk_size, compression))
+    
+    base_name = f'predictions_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    if output_format == 'parquet':
+        # Il Parquet è già compresso: nessun Content-Encoding
+        return streaming_response(encode_parquet(scored), 'application/vnd.apache.parquet', filename=f'{base_name}.parquet', compress=False)
+    return streaming_response(encode_csv(scored), 'text/csv; charset=utf-8', filename=f'{base_name}.csv')
@@ -0,0 +1,137 @@
+"""
+Risposte di export in streaming (CSV / NDJSON) condivise dalle routes
+
+Le righe vengono prodotte da un generatore e scritte nella Response a blocchi,
+quindi la memoria usata non dipende dalla dimensione dell'export. La compressione
+gzip viene applicata al volo se il client la accetta (Accept-Encoding).
+"""
+import csv
+import json
+import zlib
+from flask import Response, request, stream_with_context
+
+# Dimensione indicativa dei blocchi inviati al client
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson')
+}
+
+
+class UnsupportedFormatError(ValueError):
+    """Formato di export non supportato (risposta 400)"""
+
+
+class _LineBuffer:
+    """Pseudo-file per csv.writer: restituisce la riga invece di scriverla"""
+
+    def write(self, value):
+        return value
+
+
+def requested_format(default='csv'):
+    """Formato di export richiesto con ?format=csv|ndjson"""
+    export_format = request.args.get('format', default).lower()
+    if export_format not in EXPORT_FORMATS:
+        raise UnsupportedFormatError(f"Formato non supportato: {export_format}. Usa {', '.join(EXPORT_FORMATS)}")
+    return export_format
+
+
+def accepts_gzip():
+    """True se il client accetta risposte compresse con gzip (qualità > 0, es. non 'gzip;q=0')"""
+    return request.accept_encodings['gzip'] > 0
+
+
+def encode_rows(rows, headers, export_format='csv'):
+    """
+    Serializza le righe una alla volta nel formato richiesto
+
+    Args:
+        rows: Iterabile di liste/tuple (nell'ordine di headers) o dict
+        headers (list): Nomi delle colonne
+        export_format (str): 'csv' o 'ndjson'
+
+    Yields:
+        str: Righe serializzate (header compreso per il CSV)
+    """
+    if export_format == 'csv':
+        writer = csv.writer(_LineBuffer())
+        yield writer.writerow(headers)
+        for row in rows:
+            if isinstance(row, dict):
+                row = [row.get(header, '') for header in headers]
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            if not isinstance(row, dict):
+                row = dict(zip(headers, row))
+            yield json.dumps(row, default=str) + '\n'
+
+
+def chunked(lines, chunk_size=CHUNK_SIZE):
+    """Raggruppa le righe in blocchi di circa chunk_size byte"""
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8') if isinstance(line, str) else line
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzip_stream(chunks, level=6):
+    """Comprime al volo un flusso di blocchi in formato gzip"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def streaming_response(chunks, mimetype, filename=None, compress=None):
+    """
+    Response chunked a partire da un generatore di blocchi di byte
+
+    Args:
+        chunks: Generatore di bytes
+        mimetype (str): Content-Type della risposta
+        filename (str, optional): Nome del file per Content-Disposition
+        compress (bool, optional): Forza/disabilita gzip (default: negoziato con il client)
+    """
+    if compress is None:
+        compress = accepts_gzip()
+
+    headers = {'Content-Type': mimetype}
+    if filename:
+        headers['Content-Disposition'] = f'attachment; filename={filename}'
+    if compress:
+        chunks = gzip_stream(chunks)
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+
+    return Response(stream_with_context(chunks), headers=headers, mimetype=mimetype)
+
+
+def export_response(rows, headers, filename, export_format=None):
+    """
+    Export in streaming delle righe in CSV o NDJSON
+
+    Args:
+        rows: Iterabile (anche generatore) di liste/tuple o dict
+        headers (list): Nomi delle colonne
+        filename (str): Nome del file senza estensione
+        export_format (str, optional): 'csv' o 'ndjson' (default: ?format=, poi csv)
+    """
+    export_format = export_format or requested_format()
+    mimetype, extension = EXPORT_FORMATS[export_format]
+
+    return streaming_response(
+        chunked(encode_rows(rows, headers, export_format)),
+        mimetype,
+        filename=f'{filename}.{extension}'
+    )
@@ -9,6 +9,10 @@ import logging
 from routes.data_routes import data_bp
 from routes.analytics_routes import analytics_bp
 from routes.prediction_routes import prediction_bp
+from routes.json_provider import init_json_provider
+from routes.compression import init_compression
+from machine_learning.micro_batcher import init_micro_batching
+from machine_learning.prediction_cache import init_prediction_cache
 
 def create_app():
     """Factory function per creare l'app Flask"""
@@ -19,6 +23,27 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = 'dev-secret-key'
     
+    # Serializzazione JSON (orjson se disponibile) e compressione gzip/brotli oltre 1 KB
+    app.config['JSON_SERIALIZER'] = 'orjson'
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    init_json_provider(app)
+    init_compression(app)
+    
+    # Micro-batching delle predizioni singole concorrenti (max 64 righe o 2 ms di attesa)
+    app.config['MICRO_BATCH_ENABLED'] = True
+    app.config['MICRO_BATCH_MAX_SIZE'] = 64
+    app.config['MICRO_BATCH_MAX_WAIT_MS'] = 2
+    app.config['MICRO_BATCH_TIMEOUT_MS'] = 1000
+    init_micro_batching(app)
+    
+    # Cache delle predizioni per vettore di features esatto (RESOLUTION > 0 per arrotondare il meteo nella chiave),
+    # 10000 voci per modello, 5 minuti
+    app.config['PREDICTION_CACHE_ENABLED'] = True
+    app.config['PREDICTION_CACHE_MAX_ENTRIES'] = 10000
+    app.config['PREDICTION_CACHE_TTL_SECONDS'] = 300
+    app.config['PREDICTION_CACHE_RESOLUTION'] = 0
+    init_prediction_cache(app)
+    
     # Setup logging
     logging.basicConfig(level=logging.INFO)
     